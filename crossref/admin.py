@@ -1,29 +1,41 @@
 from django.contrib import admin
 from django.utils.html import mark_safe
-from django.urls import path
-from .forms import CrossRefForm, DOIForm, UploadForm, WorkAdminForm, BibtexForm
+from django.urls import path, reverse
+from .forms import CrossRefForm, DOIForm, UploadForm, WorkAdminForm
 from django.shortcuts import render
 from django.utils.translation import gettext as _
 from django.shortcuts import render
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.template.defaultfilters import pluralize
-from requests.exceptions import HTTPError
-from django.db.models import Count
-from .models import Work, Author, Funder, Settings
+from requests.exceptions import RequestException
+from django.db.models import Count, Q
+from .models import Work, Author, Funder, Settings, Harvest, ImportJob
 from solo.admin import SingletonModelAdmin
 from django.contrib import messages
 from django.utils.html import mark_safe
 from io import TextIOWrapper
 import bibtexparser as bib
-from tqdm import tqdm
 from crossref.parsers import bibtex
+from crossref.importer import BibtexImporter
+from crossref.export import FORMATS, export_response
+from crossref.conf import settings
+from django.shortcuts import get_object_or_404
+
+def make_export_action(format):
+    """Return an admin action streaming the selected works in format."""
+    def export(modeladmin, request, queryset):
+        return export_response(queryset, format, context={'url': request.build_absolute_uri()})
+    export.__name__ = f'export_{format}'
+    export.short_description = _('Export selected works as %s') % FORMATS[format].name
+    return export
+
 
 class ChangeListQuickAdd():
     select2 = {}
     change_list_template = 'admin/crossref/quick_add.html'
     
     def changelist_view(self, request, extra_context={}):
-        extra_context['select2'] = self.select2
+        extra_context['select2'] = self.get_select2()
         extra_context['select'] = self.get_model_fields()
         extra_context['doi_form'] = DOIForm()
         extra_context['bibtex_import_form'] = UploadForm()
@@ -32,6 +44,9 @@ class ChangeListQuickAdd():
     def get_model_fields(self):
         return [f.name.replace('_','-') for f in self.model._meta.get_fields()]
 
+    def get_select2(self):
+        return self.select2
+
 
 class CrossRefMixin(ChangeListQuickAdd, admin.ModelAdmin):
 
@@ -71,6 +86,7 @@ class WorkAdminMixin(CrossRefMixin):
 
     list_filter = ['type', 'container_title','language',]
     search_fields = ('DOI', 'title', 'id', 'label')
+    actions = [make_export_action(format) for format in FORMATS]
     
     fieldsets = [
         ('', {'fields':[
@@ -99,6 +115,8 @@ class WorkAdminMixin(CrossRefMixin):
         return [
             path('import-bibtex/', self.admin_site.admin_view(self.import_bibtex), name='import_bibtex'),
             path('add-doi/', self.admin_site.admin_view(self.get_doi_or_query_crossref), name='add_from_crossref'),
+            path('import-jobs/<int:pk>/', self.admin_site.admin_view(self.import_job), name='import_job'),
+            path('import-jobs/<int:pk>/progress/', self.admin_site.admin_view(self.import_job_progress), name='import_job_progress'),
         ] + super().get_urls()
 
     def get_doi_or_query_crossref(self, request, *args, **kwargs):
@@ -118,7 +136,7 @@ class WorkAdminMixin(CrossRefMixin):
         try:
             # either retrieve the object from the database, or query crossref for the info
             instance, created = self.get_queryset(request).get_or_query_crossref(doi)
-        except HTTPError as e:
+        except RequestException as e:
             # Something wen't wrong during the request to crossref
             self.message_user(request, e, messages.ERROR)
             return None # return None so the calling function knows something wen't wrong
@@ -135,31 +153,47 @@ class WorkAdminMixin(CrossRefMixin):
     def import_bibtex(self, request, *args, **kwargs):
         form = UploadForm(request.POST, request.FILES)
         if form.is_valid():
-            with TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8') as f:
-                bib = bibtex.parse(f.read())
-                
-            
-            pbar = tqdm(total=len(bib))
-            for entry in bib:   
-                
-                if entry.get('doi'):
-                    # If the bibtex entry has a DOI, use it to fetch data from crossref
-                    if self._get_data_from_crossref(request, entry.get('doi')):
-                        continue
-
-                bibtex_form = BibtexForm(entry)
-                if bibtex_form.is_valid():
-                    bibtex_form.save()
-                else:
-                    # probably append to some error list and return later
-                    pass
+            upload = form.cleaned_data['file']
+            if settings.CROSSREF_BACKGROUND_IMPORTS:
+                try:
+                    source = upload.read().decode('utf-8')
+                except UnicodeDecodeError:
+                    self.message_user(request, f"{upload.name} is not a UTF-8 encoded BibTeX file", messages.ERROR)
+                    return HttpResponseRedirect('../')
+                # run by the crossref_worker command
+                job = ImportJob.objects.create(name=upload.name, source=source)
+                return HttpResponseRedirect(reverse('admin:import_job', args=[job.pk]))
 
-                pbar.update(1)
+            importer = BibtexImporter(self.model._default_manager.all())
+            with TextIOWrapper(upload.file, encoding='utf-8') as f:
+                # entries are parsed as the file is read and imported a batch at a time
+                report = importer.run(bibtex.iparse(f))
+            self.message_import_report(request, report)
+        return HttpResponseRedirect('../')
 
+    def import_job(self, request, pk):
+        job = get_object_or_404(ImportJob.objects.defer('source'), pk=pk)
+        context = dict(self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title=_('Import %s') % job,
+            job=job,
+        )
+        return render(request, 'admin/crossref/import_job.html', context)
 
-            # messages.info(request, f"Added {len(publications)} publication{pluralize(publications, ',s')}.")
-            
-        return HttpResponseRedirect('../')
+    def import_job_progress(self, request, pk):
+        """The state of an import job as JSON, polled by the job page."""
+        fields = ['status', 'total', 'processed', 'created_count', 'skipped_count', 'failed_count', 'finished']
+        progress = ImportJob.objects.filter(pk=pk).values(*fields).first()
+        if progress is None:
+            return JsonResponse({'error': 'not found'}, status=404)
+        return JsonResponse(progress)
+
+    def message_import_report(self, request, report, limit=20):
+        level = messages.WARNING if report.failed else messages.SUCCESS
+        self.message_user(request, f"BibTeX import: {report.summary()}.", level)
+        listed = [(r, messages.ERROR) for r in report.failed] + [(r, messages.INFO) for r in report.skipped]
+        for result, level in listed[:limit]:
+            self.message_user(request, f"{result.label}: {result.reason}", level)
 
     def article(self, obj):
         if obj.DOI:
@@ -179,9 +213,16 @@ class WorkAdminMixin(CrossRefMixin):
 class AuthorAdminMixin(CrossRefMixin):
 
     list_display = ['prefix','given', 'family','suffix','ORCID','authenticated_orcid','_works']
-    search_fields = ['family', 'given', 'ORCID']
+    search_fields = ['name_key', 'orcid_id']
     list_filter = ['authenticated_orcid',]
 
+    def get_search_results(self, request, queryset, search_term):
+        """Search on the start of the name key or an exact ORCID iD, which 
+        can use their indexes, rather than icontains."""
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
     def get_queryset(self, request):
         return (
         super().get_queryset(request)
@@ -196,7 +237,6 @@ class AuthorAdminMixin(CrossRefMixin):
 
 class FunderAdminMixin(CrossRefMixin):
     select2 = {
-        'endpoint': 'https://api.crossref.org/funders',
         'id': 'id',
         'text': 'name'
     }
@@ -205,7 +245,56 @@ class FunderAdminMixin(CrossRefMixin):
     search_fields = ['name', 'id',]
     list_filter = ['location',]
 
+    def get_select2(self):
+        # funders are synced from Crossref, so the quick add searches them locally
+        return {**self.select2, 'endpoint': reverse('admin:funder_search')}
+
+    def get_urls(self):
+        return [
+            path('search/', self.admin_site.admin_view(self.search), name='funder_search'),
+        ] + super().get_urls()
+
+    def search(self, request):
+        """Search the local funders, answering in the form of the Crossref 
+        /funders endpoint. Each funder links to its change page."""
+        query = request.GET.get('query', '').strip()
+        funders = []
+        if query:
+            funders = (self.get_queryset(request)
+                .filter(Q(name__icontains=query) | Q(id__iexact=query))
+                .order_by('name')[:20])
+        items = [{
+            'id': funder.id, 
+            'name': funder.name, 
+            'location': funder.location, 
+            'uri': funder.uri,
+            'admin_url': reverse('admin:crossref_funder_change', args=[funder.pk]),
+            } for funder in funders]
+        return JsonResponse({'status': 'ok', 'message': {'items': items}})
+
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status', 'processed', 'total', 'created_count', 'skipped_count', 'failed_count', 'created', 'finished']
+    list_filter = ['status']
+    exclude = ['source']
+    readonly_fields = ['name', 'status', 'total', 'processed', 'created_count', 'skipped_count', 'failed_count', 
+        'report', 'error', 'attempts', 'worker', 'heartbeat', 'created', 'finished']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('source')
+
+    def has_add_permission(self, request):
+        return False
+
+
+class HarvestAdmin(admin.ModelAdmin):
+    list_display = ['filter', 'harvested', 'total_results', 'finished', 'modified']
+    readonly_fields = ['cursor', 'harvested', 'total_results', 'finished', 'modified']
+    search_fields = ['filter']
+
+
 admin.site.register(Settings, SingletonModelAdmin)
 admin.site.register(Work, WorkAdminMixin)
 admin.site.register(Author, AuthorAdminMixin)
-admin.site.register(Funder, FunderAdminMixin)
\ No newline at end of file
+admin.site.register(Funder, FunderAdminMixin)
+admin.site.register(Harvest, HarvestAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
\ No newline at end of file
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete, m2m_changed
 
 class CrossrefConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crossref'
-    verbose_name = 'Crossref'
\ No newline at end of file
+    verbose_name = 'Crossref'
+
+    def ready(self):
+        from .client import registry
+        post_save.connect(registry.reset, sender='crossref.Settings', dispatch_uid='crossref_client_reset')
+        post_delete.connect(registry.reset, sender='crossref.Settings', dispatch_uid='crossref_client_reset_delete')
+
+        from .models import update_fingerprints
+        from .utils import get_work_model
+        m2m_changed.connect(update_fingerprints, sender=get_work_model().author.through, dispatch_uid='crossref_work_fingerprint')
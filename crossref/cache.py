@@ -0,0 +1,103 @@
+"""Local cache of raw Crossref responses, keyed by normalized DOI."""
+import hashlib
+import threading
+from collections import Counter
+from datetime import timedelta as td
+from django.core.cache import caches
+from django.utils import timezone
+from crossref.conf import settings
+
+
+class ResponseCache:
+    """Stores the `message` payload returned by Crossref for each DOI.
+
+    Entries live in the Django cache named by `CROSSREF_CACHE` and expire
+    `CROSSREF_CACHE_TTL` seconds after they were queried. Each entry keeps
+    the time it was fetched so works created from it can record the real
+    age of their data in `Work.last_queried_crossref`. Hit, miss and
+    eviction counts are kept per process and returned by `stats()`.
+    """
+
+    def __init__(self, prefix='work', ttl_setting='CROSSREF_CACHE_TTL'):
+        self.prefix = prefix
+        self.ttl_setting = ttl_setting
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def enabled(self):
+        return settings.CROSSREF_CACHE is not None
+
+    @property
+    def cache(self):
+        return caches[settings.CROSSREF_CACHE]
+
+    @property
+    def ttl(self):
+        return getattr(settings, self.ttl_setting)
+
+    def make_key(self, doi):
+        from .utils import normalize_doi
+        digest = hashlib.md5(normalize_doi(doi).encode()).hexdigest()
+        return f"crossref:{self.prefix}:{digest}"
+
+    def count(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def stats(self):
+        """Return the hit, miss and eviction counts for this process."""
+        with self._lock:
+            return {stat: self._stats[stat] for stat in ('hits', 'misses', 'evictions')}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def is_fresh(self, entry):
+        return timezone.now() - entry['queried'] < td(seconds=self.ttl)
+
+    def get(self, doi):
+        """Return the cached entry for doi, or None."""
+        return self.get_many([doi]).get(doi)
+
+    def get_many(self, dois):
+        """Return a dict of {doi: entry} for the dois found in the cache. Each
+        entry is a dict containing the `message` and the time it was
+        `queried`."""
+        if not self.enabled or not dois:
+            return {}
+        keys = {self.make_key(doi): doi for doi in dois}
+        found = self.cache.get_many(keys.keys())
+
+        # entries queried longer ago than the current ttl are treated as gone
+        expired = [key for key, entry in found.items() if not self.is_fresh(entry)]
+        if expired:
+            self.cache.delete_many(expired)
+            self.count('evictions', len(expired))
+
+        entries = {keys[key]: entry for key, entry in found.items() if key not in expired}
+        self.count('hits', len(entries))
+        self.count('misses', len(keys) - len(entries))
+        return entries
+
+    def set(self, doi, message, queried=None):
+        """Cache the message for doi and return the new entry."""
+        entry = {'message': message, 'queried': queried or timezone.now()}
+        if self.enabled:
+            self.cache.set(self.make_key(doi), entry, self.ttl)
+        return entry
+
+    def delete(self, doi):
+        if self.enabled and self.cache.delete(self.make_key(doi)):
+            self.count('evictions')
+
+
+responses = ResponseCache()
+unresolvable = ResponseCache(prefix='unresolvable', ttl_setting='CROSSREF_NEGATIVE_CACHE_TTL')
+"""DOIs that Crossref could not resolve. The `message` of each entry is the 
+error returned by Crossref."""
+projected = ResponseCache(prefix='work-select')
+"""Works fetched in batches with a `select` of the fields `WorkForm` uses. 
+These lack fields such as `language`, so they only answer bulk lookups 
+and never single DOI lookups, which are served full records."""
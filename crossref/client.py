@@ -0,0 +1,258 @@
+"""Clients for the Crossref REST API."""
+import asyncio
+import threading
+import time
+from weakref import WeakKeyDictionary
+import requests
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from requests.exceptions import HTTPError, RequestException
+from crossref import __version__
+from crossref.conf import settings
+from crossref.ratelimit import limiter, breaker, backoff
+from crossref.transport import get_adapter, get_async_transport
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def make_headers(api_key=None, mailto=None, ua_string=None):
+    """Build the request headers Crossref uses to route clients into the
+    polite (mailto) or plus (api_key) pools."""
+    ua = f"django-crossref/{__version__}"
+    if mailto:
+        ua += f" (mailto:{mailto})"
+    if ua_string:
+        ua += f" {ua_string}"
+    headers = {'User-Agent': ua, 'X-USER-AGENT': ua}
+    if api_key:
+        headers['Crossref-Plus-API-Token'] = f'Bearer {api_key}'
+    return headers
+
+
+def format_filter(filter):
+    """Return a filter given as a string, a dict or a list of (name, value) 
+    pairs as a Crossref filter string. Lists allow repeated filters such as 
+    several `doi` values."""
+    if isinstance(filter, str):
+        return filter
+    if isinstance(filter, dict):
+        filter = filter.items()
+    return ','.join(f"{name}:{value}" for name, value in filter)
+
+
+def make_params(filter=None, select=None, rows=None, cursor=None, **params):
+    """Build the query parameters for a list endpoint, see `format_filter`."""
+    if filter:
+        params['filter'] = format_filter(filter)
+    if select:
+        params['select'] = ','.join(select)
+    if rows is not None:
+        params['rows'] = rows
+    if cursor:
+        params['cursor'] = cursor
+    return params
+
+
+class Crossref:
+    """A client for the Crossref REST API.
+
+    Requests are made through a single `requests.Session` so sequential and
+    concurrent lookups reuse keep-alive connections instead of paying for a
+    new TCP/TLS handshake every time. Every request is throttled by the 
+    shared `crossref.ratelimit.limiter`. Timeouts, connection errors and the 
+    statuses in `CROSSREF_RETRY_STATUSES` are retried with backoff and 
+    requests that still fail count towards the circuit breaker.
+
+    The transport adapter is chosen by `CROSSREF_TRANSPORT`, see 
+    `crossref.transport`.
+    """
+
+    def __init__(self, base_url="https://api.crossref.org", api_key=None, mailto=None, ua_string=None, max_connections=10, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(make_headers(api_key, mailto, ua_string))
+        adapter = get_adapter(max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, path, params=None):
+        breaker.check()
+        for attempt in range(settings.CROSSREF_MAX_RETRIES + 1):
+            if attempt:
+                time.sleep(delay)
+            limiter.throttle()
+            try:
+                response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error, delay = e, backoff(attempt)
+                continue
+            limiter.update(response.headers)
+            if response.status_code not in settings.CROSSREF_RETRY_STATUSES:
+                breaker.record_success()
+                response.raise_for_status()
+                return response.json()
+            error = HTTPError(f"{response.status_code} Error: {response.reason} for url: {response.url}", response=response)
+            delay = backoff(attempt, response.headers.get('Retry-After'))
+
+        breaker.record_failure()
+        raise error
+
+    def works(self, doi):
+        """Fetch a single work by DOI."""
+        return self.request(f"/works/{doi}")
+
+    def filter_works(self, filter, select=None, rows=None, cursor=None, **params):
+        """Query the /works endpoint, see `make_params`."""
+        return self.request("/works", make_params(filter, select, rows, cursor, **params))
+
+    def funders(self, filter=None, rows=None, cursor=None, **params):
+        """Query the /funders endpoint, see `make_params`."""
+        return self.request("/funders", make_params(filter, None, rows, cursor, **params))
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncCrossref:
+    """An asyncio client for the Crossref REST API.
+
+    Requests share a pooled `httpx.AsyncClient` so concurrent lookups reuse
+    keep-alive connections. Errors are raised as `requests` exceptions so
+    callers can handle the sync and async clients in the same way. A client
+    is bound to the event loop it is first used on.
+    """
+
+    def __init__(self, base_url="https://api.crossref.org", api_key=None, mailto=None, ua_string=None, max_connections=20, timeout=10):
+        if httpx is None:
+            raise ImproperlyConfigured(
+                "The async Crossref client requires httpx. Install it with `pip install django-crossref[async]`")
+        self.base_url = base_url
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers=make_headers(api_key, mailto, ua_string),
+            transport=get_async_transport(
+                httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)),
+            timeout=timeout,
+        )
+        self._active = 0
+        self._closing = False
+
+    async def request(self, path, params=None):
+        self._active += 1
+        try:
+            return await self._request(path, params)
+        finally:
+            self._active -= 1
+            if self._closing and not self._active:
+                await self.http.aclose()
+
+    async def _request(self, path, params=None):
+        await breaker.acheck()
+        for attempt in range(settings.CROSSREF_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(delay)
+            await limiter.athrottle()
+            try:
+                response = await self.http.get(path, params=params)
+            except httpx.TransportError as e:
+                error, delay = RequestException(str(e)), backoff(attempt)
+                continue
+            await limiter.aupdate(response.headers)
+            error = HTTPError(f"{response.status_code} Error: {response.reason_phrase} for url: {response.url}", response=response)
+            if response.status_code not in settings.CROSSREF_RETRY_STATUSES:
+                await breaker.arecord_success()
+                if response.is_error:
+                    raise error
+                return response.json()
+            delay = backoff(attempt, response.headers.get('Retry-After'))
+
+        await breaker.arecord_failure()
+        raise error
+
+    async def works(self, doi):
+        """Fetch a single work by DOI."""
+        return await self.request(f"/works/{doi}")
+
+    async def filter_works(self, filter, select=None, rows=None, cursor=None, **params):
+        """Query the /works endpoint, see `make_params`."""
+        return await self.request("/works", make_params(filter, select, rows, cursor, **params))
+
+    async def funders(self, filter=None, rows=None, cursor=None, **params):
+        """Query the /funders endpoint, see `make_params`."""
+        return await self.request("/funders", make_params(filter, None, rows, cursor, **params))
+
+    async def aclose(self):
+        """Close the connections, once the requests in flight have finished."""
+        self._closing = True
+        if not self._active:
+            await self.http.aclose()
+
+
+class ClientRegistry:
+    """Process-wide registry of Crossref clients.
+
+    Clients are kept per (base_url, api_key, mailto, ua_string) so their 
+    connection pools survive between lookups. The `Settings` row is read at 
+    most once every `CROSSREF_CONFIG_TIMEOUT` seconds, or again straight 
+    after it is saved, and a new client is only built when those values 
+    actually change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._config = None
+        self._config_read = 0
+        self._clients = {}
+        self._async_clients = WeakKeyDictionary()
+        self._async_locks = WeakKeyDictionary()
+
+    def reset(self, **kwargs):
+        """Forget the cached settings. Connected to `Settings` post_save."""
+        self._config = None
+
+    def get_key(self):
+        """Return the (base_url, api_key, mailto, ua_string) for the current settings."""
+        if self._config is None or time.monotonic() - self._config_read > settings.CROSSREF_CONFIG_TIMEOUT:
+            from .utils import get_config
+            config = get_config()
+            self._config = (config.api_key, config.ua_string)
+            self._config_read = time.monotonic()
+        api_key, ua_string = self._config
+        return (settings.CROSSREF_BASE_URL, api_key, settings.CROSSREF_MAILTO, ua_string)
+
+    def get(self):
+        """Return the shared sync client for the current settings."""
+        key = self.get_key()
+        with self._lock:
+            if key not in self._clients:
+                # the settings changed, the old connections are no longer needed
+                for client in self._clients.values():
+                    client.close()
+                self._clients = {key: Crossref(*key, 
+                    max_connections=settings.CROSSREF_MAX_WORKERS, timeout=settings.CROSSREF_TIMEOUT)}
+            return self._clients[key]
+
+    async def aget(self):
+        """Return the shared async client for the current settings and the 
+        running event loop."""
+        key = await sync_to_async(self.get_key)()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._async_locks.setdefault(loop, asyncio.Lock())
+        # one coroutine at a time builds the client, the others then reuse it
+        async with lock:
+            old_key, client = self._async_clients.get(loop, (None, None))
+            if old_key != key:
+                if client is not None:
+                    await client.aclose()
+                client = AsyncCrossref(*key, 
+                    max_connections=settings.CROSSREF_ASYNC_CONCURRENCY, timeout=settings.CROSSREF_TIMEOUT)
+                self._async_clients[loop] = (key, client)
+            return client
+
+
+registry = ClientRegistry()
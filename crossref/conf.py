@@ -30,6 +30,126 @@ class CrossRefConf(AppConf):
     UA_STRING = None
 
 
+    MAX_WORKERS = 8
+    """Maximum number of concurrent Crossref requests made during bulk lookups."""
+
+
+    BATCH_SIZE = 100
+    """Number of works saved per database transaction during bulk lookups."""
+
+
+    FILTER_BATCH_SIZE = 50
+    """Number of DOIs requested per /works?filter=doi:... query during bulk lookups."""
+
+
+    ASYNC_CONCURRENCY = 20
+    """Maximum number of concurrent requests made by the async Crossref client."""
+
+
+    CACHE = 'default'
+    """Name of the Django cache used to store raw Crossref responses. Set to None to disable the response cache."""
+
+
+    CACHE_TTL = 60 * 60 * 24 * 7
+    """Seconds a cached Crossref response is served before the DOI is queried again."""
+
+
+    NEGATIVE_CACHE_TTL = 60 * 60 * 24
+    """Seconds a DOI that Crossref could not resolve is remembered before it is queried again."""
+
+
+    TIMEOUT = 10
+    """Seconds to wait for Crossref to connect or respond before a request is retried."""
+
+
+    MAX_RETRIES = 2
+    """Times a timed out request, or one answered with a RETRY_STATUSES status, is retried."""
+
+
+    RETRY_STATUSES = [429, 500, 502, 503, 504]
+    """Response statuses that are retried."""
+
+
+    RETRY_BACKOFF = 0.5
+    """Base delay in seconds for the jittered exponential backoff between retries."""
+
+
+    RETRY_MAX_DELAY = 10
+    """Longest delay in seconds between two retries, including delays requested with Retry-After."""
+
+
+    CIRCUIT_BREAKER_THRESHOLD = 5
+    """Consecutive failed requests after which requests to Crossref fail immediately. Set to None to disable the circuit breaker."""
+
+
+    CIRCUIT_BREAKER_COOLDOWN = 60
+    """Seconds requests to Crossref fail immediately once the circuit breaker has tripped."""
+
+
+    RATE_LIMIT = 50
+    """Requests allowed per RATE_LIMIT_INTERVAL until Crossref reports its own limit in the X-Rate-Limit-* headers. Set to None to disable rate limiting."""
+
+
+    RATE_LIMIT_INTERVAL = 1
+    """Length of the rate limit interval in seconds."""
+
+
+    RATE_LIMIT_CACHE = 'default'
+    """Name of the Django cache holding the rate limit, circuit breaker and DOI lookup lease state. Use a cache shared by all processes (e.g. Redis or Memcached) to limit them together."""
+
+
+    TRANSPORT = None
+    """Set to 'record' to save every response from Crossref to CROSSREF_FIXTURE_DIR, or 'replay' to answer requests from the saved responses without touching the network. Used for offline benchmarks and load tests."""
+
+
+    FIXTURE_DIR = None
+    """Directory of the responses recorded and replayed by CROSSREF_TRANSPORT and served by the crossref_standin command."""
+
+
+    REPLAY_LATENCY = 0
+    """Seconds of artificial latency added to each replayed request."""
+
+
+    LEASE_TIMEOUT = None
+    """Longest time in seconds other callers wait for a concurrent lookup of the same DOI before fetching it themselves. Defaults to the longest a lookup can take with TIMEOUT, MAX_RETRIES and RETRY_MAX_DELAY, plus one more TIMEOUT to save the work."""
+
+
+    REFRESH_AGE = 30
+    """Days after which the crossref_refresh command considers a work stale."""
+
+
+    HARVEST_ROWS = 1000
+    """Works requested per page when harvesting with cursor deep paging (at most 1000)."""
+
+
+    IMPORT_DUPLICATES = 'skip'
+    """What BibTeX imports do with entries whose fingerprint (normalized title, first author and year) matches an existing work: 'skip' them, or 'merge' them by filling in the blank fields of the existing work."""
+
+
+    BACKGROUND_IMPORTS = True
+    """Import BibTeX files uploaded in the admin as background jobs, run by the crossref_worker command. Set to False to import within the upload request instead."""
+
+
+    JOB_POLL_INTERVAL = 5
+    """Seconds the crossref_worker command waits before looking for new jobs when there are none."""
+
+
+    JOB_TIMEOUT = 300
+    """Seconds without a heartbeat after which a running job is considered abandoned, e.g. because its worker was restarted, and is resumed by another worker."""
+
+
+    JOB_MAX_ATTEMPTS = 3
+    """Number of times an abandoned job is resumed before it is marked as failed."""
+
+
+    JOB_REPORT_LIMIT = 100
+    """Number of skipped and, separately, failed entries listed in the report of an import job. The counts of the job include all of them."""
+
+
+    CONFIG_TIMEOUT = 60
+    """Seconds before the Crossref client re-reads the Settings row. The row is also re-read whenever it is saved."""
+
+
     CMS_STYLES = [
                 ('harvard', 'Harvard'),
             ]
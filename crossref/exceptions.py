@@ -0,0 +1,9 @@
+from requests.exceptions import HTTPError, RequestException
+
+
+class UnresolvableDOI(HTTPError):
+    """Raised when a DOI is malformed or Crossref has no record of it."""
+
+
+class CrossrefUnavailable(RequestException):
+    """Raised without contacting Crossref while the circuit breaker is open."""
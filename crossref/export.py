@@ -0,0 +1,196 @@
+"""Export works as BibTeX, RIS, MODS, RSS or plain text.
+
+Exports are rendered a chunk of works at a time from the templates in
+crossref/export_formats and streamed, so memory use stays the same however
+many works are exported.
+"""
+import re
+from collections import namedtuple
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template
+from crossref.conf import settings
+from crossref.utils import chunked
+
+ExportFormat = namedtuple('ExportFormat', ['name', 'template', 'content_type', 'extension'])
+
+FORMATS = {
+    'bibtex': ExportFormat('BibTeX', 'crossref/export_formats/publications.bib', 'application/x-bibtex; charset=utf-8', 'bib'),
+    'ris': ExportFormat('RIS', 'crossref/export_formats/publications.ris', 'application/x-research-info-systems; charset=utf-8', 'ris'),
+    'mods': ExportFormat('MODS', 'crossref/export_formats/publications.mods', 'application/mods+xml; charset=utf-8', 'xml'),
+    'rss': ExportFormat('RSS', 'crossref/export_formats/publications.rss', 'application/rss+xml; charset=utf-8', 'rss'),
+    'text': ExportFormat('plain text', 'crossref/export_formats/publications.txt', 'text/plain; charset=utf-8', 'txt'),
+}
+
+#: BibTeX entry types of Crossref work types, BibTeX types map to themselves
+BIBTEX_TYPES = {
+    'journal-article': 'article',
+    'book': 'book',
+    'monograph': 'book',
+    'edited-book': 'book',
+    'reference-book': 'book',
+    'book-chapter': 'incollection',
+    'book-section': 'incollection',
+    'book-part': 'incollection',
+    'reference-entry': 'incollection',
+    'proceedings-article': 'inproceedings',
+    'proceedings': 'proceedings',
+    'dissertation': 'phdthesis',
+    'report': 'techreport',
+    'posted-content': 'unpublished',
+    **{t: t for t in ['article', 'book', 'booklet', 'inbook', 'incollection', 'inproceedings', 'manual',
+        'mastersthesis', 'misc', 'phdthesis', 'proceedings', 'techreport', 'unpublished']},
+}
+
+RIS_TYPES = {
+    'article': 'JOUR',
+    'book': 'BOOK',
+    'booklet': 'PAMP',
+    'inbook': 'CHAP',
+    'incollection': 'CHAP',
+    'inproceedings': 'CPAPER',
+    'proceedings': 'CONF',
+    'manual': 'BOOK',
+    'mastersthesis': 'THES',
+    'phdthesis': 'THES',
+    'techreport': 'RPRT',
+    'unpublished': 'UNPB',
+}
+
+MODS_GENRES = {
+    'article': 'periodical',
+    'book': 'book',
+    'inbook': 'book',
+    'incollection': 'book',
+    'inproceedings': 'conference publication',
+    'proceedings': 'conference publication',
+    'mastersthesis': 'thesis',
+    'phdthesis': 'thesis',
+    'techreport': 'technical report',
+}
+
+TAGS = re.compile(r'<[^>]+>')
+
+
+def bibtex_escape(value):
+    return (value or '').replace('"', '{"}')
+
+
+class ExportedWork:
+    """A work and its authors with the values the export templates use.
+    Other attributes are read from the work."""
+
+    def __init__(self, work):
+        self.work = work
+        self.authors = list(work.author.all())
+
+    def __getattr__(self, name):
+        return getattr(self.work, name)
+
+    @property
+    def bibtex_type(self):
+        return BIBTEX_TYPES.get((self.work.type or '').lower(), 'misc')
+
+    @property
+    def ris_type(self):
+        return RIS_TYPES.get(self.bibtex_type, 'GEN')
+
+    @property
+    def mods_genre(self):
+        return MODS_GENRES.get(self.bibtex_type)
+
+    @property
+    def container_field(self):
+        """The BibTeX field of the container title."""
+        return 'booktitle' if self.bibtex_type in ('incollection', 'inproceedings', 'inbook') else 'journal'
+
+    @property
+    def container_tag(self):
+        """The RIS tag of the container title."""
+        return 'JO' if self.bibtex_type == 'article' else 'T2'
+
+    @property
+    def authors_bibtex(self):
+        return ' and '.join(bibtex_escape(f"{a.family}, {a.given}" if a.given else a.family) for a in self.authors)
+
+    @property
+    def title_bibtex(self):
+        return bibtex_escape(self.work.title)
+
+    @property
+    def container_bibtex(self):
+        return bibtex_escape(self.work.container_title)
+
+    @property
+    def pages(self):
+        return [p for p in re.split(r'-+', self.work.page or '') if p]
+
+    @property
+    def pages_bibtex(self):
+        return '--'.join(self.pages)
+
+    @property
+    def first_page(self):
+        return self.pages[0] if self.pages else ''
+
+    @property
+    def last_page(self):
+        return self.pages[-1] if len(self.pages) > 1 else ''
+
+    @property
+    def abstract_text(self):
+        """The abstract without the JATS markup Crossref abstracts come in."""
+        return ' '.join(TAGS.sub(' ', self.work.abstract or '').split())
+
+    @property
+    def authors_text(self):
+        names = [' '.join(filter(None, [a.given, a.family])) for a in self.authors]
+        if len(names) > 1:
+            return f"{', '.join(names[:-1])} and {names[-1]}"
+        return ''.join(names)
+
+    @property
+    def authors_citation(self):
+        if len(self.authors) > 2:
+            return f"{self.authors[0].family} et al."
+        return ' & '.join(a.family for a in self.authors)
+
+    @property
+    def title_ends_with_punct(self):
+        return (self.work.title or '').rstrip()[-1:] in ('.', '?', '!')
+
+    @property
+    def link(self):
+        if self.work.DOI:
+            return f"https://doi.org/{self.work.DOI}"
+        return self.work.URL or ''
+
+
+def iter_export(queryset, format='bibtex', context=None, chunk_size=None):
+    """Yield the export of the works in queryset as strings.
+
+    Works are read with `iterator()` and their authors are prefetched a
+    chunk at a time, with one query per chunk. context is passed on to the
+    template, e.g. the feed url for RSS.
+    """
+    chunk_size = chunk_size or settings.CROSSREF_BATCH_SIZE
+    template = get_template(FORMATS[format].template)
+    context = context or {}
+
+    yield template.render({**context, 'header': True, 'pubs': []})
+    # iterator() ignores prefetch_related, so authors are prefetched per chunk
+    works = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    for chunk in chunked(works, chunk_size):
+        prefetch_related_objects(chunk, 'author')
+        yield template.render({**context, 'pubs': [ExportedWork(work) for work in chunk]})
+    yield template.render({**context, 'footer': True, 'pubs': []})
+
+
+def export_response(queryset, format='bibtex', filename='works', context=None):
+    """Return a `StreamingHttpResponse` of the works in queryset in format,
+    one of the keys of `FORMATS`, as a download."""
+    export_format = FORMATS[format]
+    response = StreamingHttpResponse(iter_export(queryset, format, context), content_type=export_format.content_type)
+    if format != 'rss':
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format.extension}"'
+    return response
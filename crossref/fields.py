@@ -1,10 +1,15 @@
 from django import forms
+from django.utils.translation import gettext_lazy as _
 import datetime
 from django.core.exceptions import ValidationError
+from django.db import models
 from django.db.models import JSONField
+from django.db.models.lookups import StartsWith
 from django.core import exceptions
 from .validators import PythonTypeValidator
 from .widgets import PagesWidget
+from .utils import normalize_name
+from .parsers.names import parse_names
 
 class ObjectField(JSONField):
     default_validators = [PythonTypeValidator(dict)]
@@ -37,6 +42,20 @@ class ArrayField(JSONField):
             raise exceptions.ValidationError(errors)
 
 
+class NameKeyField(models.CharField):
+    """Holds a name normalized by `normalize_name`. Values compared to it with
+    exact, in and startswith lookups are normalized the same way."""
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return value if value is None else normalize_name(value)
+
+
+@NameKeyField.register_lookup
+class NameKeyStartsWith(StartsWith):
+    prepare_rhs = True
+
+
 class ListConcatField(forms.CharField):
 
     def to_python(self, value):
@@ -53,71 +72,49 @@ class ListConcatField(forms.CharField):
 
 
 class CrossRefAuthorField(forms.ModelMultipleChoiceField):
+    default_error_messages = {
+        'invalid_author': _('Invalid author data.'),
+    }
 
-    # def _check_values(self, value):
     def prepare_value(self, value):
         """
-        Given a list of author dicts (as returned by crossref), return a QuerySet of the corresponding objects. Values are queried on given and family name. A new object will be created if not found in the database already.
+        Given a list of author dicts (as returned by crossref), return a list of the ids of the corresponding objects in the same order, see `AuthorQuerySet.resolve`.
         """
         
         # handle the odd case where crossref entry doesn't have an author
         if not value:
             return
-        
-        authors = []
 
-        for author in value:
-            given = author.pop('given','').strip().replace(',','')
-            family = author.pop('family','').strip().replace(',','')
-            defaults = {k.replace('-','_'):v for k,v in author.items() if k.replace('-','_') in [f.name for f in self.queryset.model._meta.fields]}
+        # already resolved, e.g. a list of ids or objects
+        if not isinstance(value[0], dict):
+            return super().prepare_value(value)
 
-            try:
-                obj, _ = self.queryset.update_or_create(
-                    given=given, 
-                    family=family, 			
-                    defaults=defaults)
+        try:
+            return [obj.pk for obj in self.queryset.resolve(value)]
+        except (ValueError, TypeError):
+            raise ValidationError(
+                self.error_messages['invalid_author'],
+                code='invalid_author',
+            )
 
-            except (ValueError, TypeError):
-                raise ValidationError(
-                    self.error_messages['invalid_author'],
-                    code='invalid_author',
-                    params=author,
-                )
-            authors.append(obj.id)
-
-        # return self.queryset.filter(id__in=authors)
-        return authors
+    def _check_values(self, value):
+        """Return the authors in the order they were given rather than the 
+        default ordering of the model, so the sorted m2m keeps the author 
+        order."""
+        value = list(dict.fromkeys(value))
+        authors = {str(obj.pk): obj for obj in super()._check_values(value)}
+        return [authors[str(pk)] for pk in value]
 
 
-class BibtexAuthorField(forms.ModelMultipleChoiceField):
+class BibtexAuthorField(CrossRefAuthorField):
 
     def prepare_value(self, value):
-        if value:
-            value = value.split(' and ')
-        return super().prepare_value(value)
-
-    def _check_values(self, value):
         """
-        Given a list of author dicts (as returned by crossref), return a QuerySet of the corresponding objects. Values are queried on given and family name. A new object will be created if not found in the database already.
+        Given a BibTeX author string such as "Jennings, S. and van der Berg, J.", return a list of the ids of the corresponding objects in the same order. Names are parsed with `crossref.parsers.names.parse_names`.
         """
-  
-        authors = []
-        for a in value:
-            
-            # this is not a very good way but oh well
-            author = {k:v.strip().replace(',','') for k, v in zip(['family','given',], a.split(' '))}
-
-            try:
-                obj, _ = self.queryset.get_or_create(**author)
-            except (ValueError, TypeError):
-                raise ValidationError(
-                    self.error_messages['invalid_author'],
-                    code='invalid_author',
-                    params=author,
-                )
-            authors.append(obj.id)
-
-        return authors
+        if isinstance(value, str):
+            value = parse_names(value)
+        return super().prepare_value(value)
 
 
 class DatePartsField(forms.DateField):
@@ -1,9 +1,12 @@
+import datetime
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from .fields import ListConcatField, CrossRefAuthorField, DatePartsField, BibtexAuthorField, PageField
 from django.forms import Textarea, Select
 from .widgets import CrossRefWorkWidget, CrossRefFunderWidget, PagesWidget
 from . import utils
+from django.db import IntegrityError, transaction
+from .labels import LabelAllocator, make_label_base
 
 Work = utils.get_work_model()
 
@@ -20,6 +23,46 @@ class UploadForm(forms.Form):
         )
 
 
+class LabelMixin:
+    """Gives works saved without a label one built from the family name of 
+    the first author and the year of publication, e.g. Smith2019, then 
+    Smith2019a, Smith2019b and so on. Pass a shared `LabelAllocator` as 
+    label_allocator when saving a batch of works. If another process takes 
+    the label before the work is saved, a new one is allocated and the 
+    save retried."""
+
+    #: attempts at saving with a freshly allocated label
+    label_retries = 5
+
+    def __init__(self, *args, label_allocator=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label_allocator = label_allocator or LabelAllocator(self._meta.model._default_manager.all())
+        self.label_base = None
+
+    def clean(self):
+        authors = self.cleaned_data.get('author')
+        published = self.cleaned_data.get('published')
+        # existing works keep their label, only new ones need one allocated
+        if authors and published and not self.cleaned_data.get('label') and self.instance.pk is None:
+            self.label_base = make_label_base(authors[0].family, published.year)
+            self.cleaned_data['label'] = self.label_allocator.allocate(self.label_base)
+        return super().clean()
+
+    def save(self, commit=True):
+        if not commit or self.label_base is None:
+            return super().save(commit)
+        for attempt in range(self.label_retries):
+            try:
+                with transaction.atomic():
+                    return super().save(commit)
+            except IntegrityError:
+                label_taken = self._meta.model._default_manager.filter(label=self.instance.label).exists()
+                if not label_taken or attempt == self.label_retries - 1:
+                    raise
+                self.instance.label = self.cleaned_data['label'] = self.label_allocator.allocate(
+                    self.label_base, refresh=True)
+
+
 class WorkAdminForm(forms.ModelForm):
     
     class Meta:
@@ -29,7 +72,7 @@ class WorkAdminForm(forms.ModelForm):
             'page': PageField,
         }
 
-class WorkForm(forms.ModelForm):
+class WorkForm(LabelMixin, forms.ModelForm):
 
     class Meta:
         model = Work
@@ -45,42 +88,6 @@ class WorkForm(forms.ModelForm):
         self.data = {k.replace('-','_'):v for k,v in self.data.items()}
         return super().full_clean()
 
-    def clean(self):
-        Author = utils.get_author_model()
-        
-        letters = 'abcdefghijklmnop'
-        authors = self.cleaned_data['author']
-        
-        # if a label wasn't supplied with the bibtex file
-        if authors and not self.cleaned_data.get('label'):
-            # build a label from first author's last name and year
-            # of publication
-            first_author = Author.objects.get(id=self.cleaned_data['author'][0].id)
-            year_published = self.cleaned_data['published'].year
-            label = f"{first_author.family}{year_published}"
-
-            # We don't want label clashes so find how many labels already
-            # in the database start with our new label then append the 
-            # appropriate letter.
-            count = self._meta.model.objects.filter(label__contains=label).count()
-            if count:
-                label += letters[count+1]
-            self.cleaned_data['label'] = label
-    
-        return super().clean()
-
-    # def append_letter(self, value):
-    #     """If the given query returns matches in the database. A letter will be 
-    #     appended to maintain uniqueness.
-
-    #     Args:
-    #         query (_type_): _description_
-    #     """
-    #     letters = 'abcdefghijklmnop'
-    #     count = self._meta.model.objects.filter(label__contains=label).count()
-    #     if count:
-    #         label += letters[count+1]
-
 
 class CrossRefForm(forms.Form):
     DOI = forms.ChoiceField()
@@ -102,7 +109,28 @@ class DOIForm(forms.ModelForm):
         fields = ['DOI']
             
 
-class BibtexForm(forms.ModelForm):
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+
+def bibtex_date(year, month=None):
+    """Return the first day of a BibTeX year and month, the month given as 
+    e.g. aug, August or 8. Returns None if the year isn't a number."""
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        return None
+    month = str(month or '').strip().lower()
+    if month.isdigit():
+        month = int(month)
+    else:
+        month = MONTHS.index(month[:3]) + 1 if month[:3] in MONTHS else 1
+    try:
+        return datetime.date(year, month, 1)
+    except ValueError:
+        return datetime.date(year, 1, 1)
+
+
+class BibtexForm(LabelMixin, forms.ModelForm):
 
     class Meta:
         model = Work
@@ -130,37 +158,14 @@ class BibtexForm(forms.ModelForm):
                 data[self.Meta.mapping[k]] = v
             else:
                 data[k] = v
+
+        if not data.get('published') and data.get('year'):
+            data['published'] = bibtex_date(data['year'], data.get('month'))
         
         self.data = data
         
         return super().full_clean()
 
-    def clean(self):
-        Author = utils.get_author_model()
-        
-        letters = 'abcdefghijklmnop'
-        authors = self.cleaned_data['author']
-        
-        # if a label wasn't supplied with the bibtex file
-        if authors and not self.cleaned_data.get('label'):
-
-            # build a label from first author's last name and year
-            # of publication
-            first_author = Author.objects.get(id=self.cleaned_data['author'][0])
-            year_published = self.cleaned_data['published'].year
-            label = f"{first_author.family}{year_published}"
-
-            # We don't want label clashes so find how many labels already
-            # in the database start with our new label then append the 
-            # appropriate letter.
-
-            count = self._meta.model.objects.filter(label__contains=label).count()
-            if count:
-                label += letters[count+1]
-            self.cleaned_data['label'] = label
-    
-        return super().clean()
-
 
 # from pprint import pprint
 
@@ -0,0 +1,105 @@
+"""Harvest works and funders from Crossref with cursor based deep paging."""
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+from requests.exceptions import HTTPError
+from crossref.client import format_filter
+from crossref.conf import settings
+from crossref.utils import get_crossref_client, get_work_model, get_work_selects
+
+
+def iter_pages(client, filter, rows=None, cursor='*', select=None):
+    """Yield (message, next_cursor) for each page of a deep paged /works query.
+
+    Only one page is held in memory at a time, however many results the
+    query has."""
+    rows = rows or settings.CROSSREF_HARVEST_ROWS
+    while True:
+        message = client.filter_works(filter, select=select, rows=rows, cursor=cursor)['message']
+        next_cursor = message.get('next-cursor')
+        yield message, next_cursor
+        if not message['items'] or not next_cursor:
+            return
+        cursor = next_cursor
+
+
+def harvest_works(filter, rows=None, restart=False):
+    """Harvest every work matching filter into the database.
+
+    filter is a Crossref filter such as 'orcid:0000-0003-3762-7336',
+    'issn:0956-540X', 'member:286' or 'from-pub-date:2020-01-01', given as a
+    string, dict or list of (name, value) pairs. Each page is upserted as it
+    arrives and the cursor is saved to a `Harvest` checkpoint afterwards, so
+    an interrupted harvest resumes from the last saved page. Crossref
+    expires cursors after a few minutes of inactivity; a harvest resumed
+    after that starts over from the first page, which is safe because the
+    upserts are idempotent.
+
+    Yields (harvest, results) after each page, where results is the dict
+    returned by `WorkQuerySet.upsert_from_crossref`.
+    """
+    Harvest = apps.get_model('crossref.Harvest')
+    Work = get_work_model()
+    client = get_crossref_client()
+    filter = format_filter(filter)
+
+    harvest, created = Harvest.objects.get_or_create(filter=filter)
+    if restart or harvest.finished:
+        harvest.cursor, harvest.harvested, harvest.finished = '*', 0, None
+
+    pages = iter_pages(client, filter, rows, harvest.cursor, get_work_selects())
+    try:
+        message, next_cursor = next(pages)
+    except HTTPError:
+        if harvest.cursor == '*':
+            raise
+        # the saved cursor has expired
+        harvest.cursor, harvest.harvested = '*', 0
+        pages = iter_pages(client, filter, rows, harvest.cursor, get_work_selects())
+        message, next_cursor = next(pages)
+
+    while True:
+        with transaction.atomic():
+            results = Work.objects.upsert_from_crossref(message['items'])
+            harvest.total_results = message.get('total-results')
+            harvest.harvested += len(message['items'])
+            if not message['items'] or not next_cursor:
+                harvest.finished = timezone.now()
+            else:
+                harvest.cursor = next_cursor
+            harvest.save()
+        yield harvest, results
+
+        try:
+            message, next_cursor = next(pages)
+        except StopIteration:
+            return
+
+
+def harvest_funders(rows=None):
+    """Sync the complete Crossref funder registry into the `Funder` table.
+
+    The registry is paged with a cursor (falling back to offsets should 
+    Crossref not return one) and each page is upserted as it arrives, 
+    writing only new and changed funders. Yields the counts returned by 
+    `FunderQuerySet.upsert_from_crossref` for each page, with the size of 
+    the registry added under 'total-results'.
+    """
+    Funder = apps.get_model('crossref.Funder')
+    client = get_crossref_client()
+    rows = rows or settings.CROSSREF_HARVEST_ROWS
+    params = {'cursor': '*'}
+    synced = 0
+    while True:
+        message = client.funders(rows=rows, **params)['message']
+        counts = Funder.objects.upsert_from_crossref(message['items'])
+        counts['total-results'] = message.get('total-results')
+        yield counts
+
+        synced += len(message['items'])
+        if not message['items'] or synced >= (message.get('total-results') or 0):
+            return
+        if message.get('next-cursor'):
+            params = {'cursor': message['next-cursor']}
+        else:
+            params = {'offset': synced}
@@ -0,0 +1,355 @@
+"""Import BibTeX entries in bulk.
+
+`BibtexImporter` maps, deduplicates and validates a batch of parsed entries
+in memory, then writes the new works with `bulk_create` in one transaction
+per batch. Each outcome is collected in an `ImportReport`.
+"""
+from collections import defaultdict, namedtuple
+from django.db import IntegrityError, transaction
+from crossref.conf import settings
+from crossref.forms import BibtexForm
+from crossref.labels import LabelAllocator, make_label_base
+from crossref.managers import CREATED, FAILED
+from crossref.parsers.names import parse_names
+from crossref.utils import chunked, normalize_doi, get_work_model, get_author_model
+
+SKIPPED = 'skipped'
+
+ImportResult = namedtuple('ImportResult', ['status', 'label', 'instance', 'reason'])
+ImportResult.__doc__ = """Outcome of importing a single BibTeX entry.
+
+status is one of 'created', 'skipped' or 'failed' and label is the citation
+key of the entry in the file. instance is the work created or found (None
+when failed) and reason explains a skip or failure, or why a created work
+got another label."""
+
+
+class ImportReport:
+    """The created, skipped and failed entries of an import."""
+
+    def __init__(self):
+        self.created = []
+        self.skipped = []
+        self.failed = []
+
+    def __len__(self):
+        return len(self.created) + len(self.skipped) + len(self.failed)
+
+    def add(self, result):
+        {CREATED: self.created, SKIPPED: self.skipped, FAILED: self.failed}[result.status].append(result)
+
+    def as_dict(self):
+        """Return the report as JSON serializable data: counts, and the
+        label and reason of every skipped and failed entry."""
+        return {
+            'created': len(self.created),
+            'skipped': [{'label': r.label, 'reason': r.reason} for r in self.skipped],
+            'failed': [{'label': r.label, 'reason': r.reason} for r in self.failed],
+        }
+
+    def summary(self):
+        return (f"{len(self.created)} created, {len(self.skipped)} skipped "
+                f"and {len(self.failed)} failed")
+
+
+class ImportForm(BibtexForm):
+    """Validates the fields of an entry without touching the database.
+    Authors are resolved for the whole batch and uniqueness is checked by
+    the importer."""
+
+    class Meta(BibtexForm.Meta):
+        exclude = ['author']
+
+    def validate_unique(self):
+        pass
+
+
+class BibtexImporter:
+    """Imports parsed BibTeX entries, such as those yielded by
+    `crossref.parsers.bibtex.iparse`, a batch at a time.
+
+    Entries with a DOI are looked up with `bulk_get_or_query_crossref`,
+    falling back to the BibTeX data when Crossref has no record of them.
+    Entries repeating a DOI or citation key seen earlier in the file, or
+    matching the DOI or URL of an existing work, are skipped. So are
+    entries with the fingerprint of an existing work or an earlier entry;
+    with duplicates='merge' (see `CROSSREF_IMPORT_DUPLICATES`) their data
+    first fills in the blank fields of the existing work. The rest are
+    written with `bulk_create`; if that fails, the batch is saved entry by
+    entry, each in its own savepoint, so a single bad entry only fails
+    itself. Entries whose citation key is the label of another existing
+    work are given a new label.
+    """
+
+    #: fields never filled in when merging a duplicate into an existing work
+    unmerged_fields = ['id', 'label', 'fingerprint', 'source', 'last_queried_crossref']
+
+    def __init__(self, queryset=None, batch_size=None, lookup_dois=True, duplicates=None):
+        self.queryset = queryset if queryset is not None else get_work_model()._default_manager.all()
+        self.batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        self.lookup_dois = lookup_dois
+        self.duplicates = duplicates or settings.CROSSREF_IMPORT_DUPLICATES
+        self.labels = LabelAllocator(self.queryset)
+        self.report = ImportReport()
+        self._seen_dois = set()
+        self._seen_labels = set()
+        self._seen_fingerprints = {}
+
+        field = self.queryset.model._meta.get_field('author')
+        self.through = field.remote_field.through
+        self.work_name = field.m2m_field_name()
+        self.author_name = field.m2m_reverse_field_name()
+        self.sort_name = field.sort_value_field_name
+
+    def run(self, entries, callback=None):
+        """Import an iterable of entries and return the `ImportReport`.
+        callback, if given, is called with the report and the entries of 
+        the batch after each batch."""
+        for batch in chunked(entries, self.batch_size):
+            self.import_batch(batch)
+            if callback is not None:
+                callback(self.report, batch)
+        return self.report
+
+    def import_batch(self, entries):
+        for entry in entries:
+            if entry.get('doi'):
+                entry['doi'] = normalize_doi(entry['doi'])
+        entries = self.deduplicate(entries)
+        if self.lookup_dois:
+            entries = self.lookup_crossref(entries)
+        entries = self.skip_existing(entries)
+        pending = self.allocate_labels([item for item in (self.validate(entry) for entry in entries) if item])
+        self.write(*self.skip_duplicates(pending))
+
+    def resume(self, entries):
+        """Remember the DOIs and citation keys of entries imported before, 
+        e.g. by an interrupted job, so repeats of them are still skipped."""
+        for entry in entries:
+            self._seen_dois.add(normalize_doi(entry['doi']) if entry.get('doi') else None)
+            self._seen_labels.add(entry.get('label'))
+
+    def deduplicate(self, entries):
+        """Skip entries that repeat a DOI or label seen earlier in the file."""
+        unique = []
+        for entry in entries:
+            doi, label = entry.get('doi'), entry.get('label')
+            if doi and doi in self._seen_dois:
+                self.skip(entry, f"repeats the DOI {doi}")
+            elif label and label in self._seen_labels:
+                self.skip(entry, f"repeats the citation key {label}")
+            else:
+                self._seen_dois.add(doi)
+                self._seen_labels.add(label)
+                unique.append(entry)
+        return unique
+
+    def lookup_crossref(self, entries):
+        """Get or create the works of entries with a DOI from Crossref and
+        return the entries left to import from their BibTeX data."""
+        dois = [entry['doi'] for entry in entries if entry.get('doi')]
+        if not dois:
+            return entries
+        results = self.queryset.bulk_get_or_query_crossref(dois, self.batch_size)
+        remaining = []
+        for entry in entries:
+            result = results.get(entry.get('doi'))
+            if result is None or result.status == FAILED:
+                remaining.append(entry)
+            elif result.status == CREATED:
+                self.report.add(ImportResult(CREATED, entry.get('label'), result.instance, None))
+            else:
+                self.report.add(ImportResult(SKIPPED, entry.get('label'), result.instance,
+                    f"a work with the DOI {entry['doi']} already exists"))
+        return remaining
+
+    def skip_existing(self, entries):
+        """Skip entries matching the DOI or URL of an existing work, with one
+        query per field."""
+        for key, field in (('doi', 'DOI'), ('url', 'URL')):
+            values = {entry[key] for entry in entries if entry.get(key)}
+            if not values:
+                continue
+            existing = set(self.queryset.filter(**{f'{field}__in': values}).values_list(field, flat=True))
+            remaining = []
+            for entry in entries:
+                if entry.get(key) in existing:
+                    self.skip(entry, f"a work with the {field} {entry[key]} already exists")
+                else:
+                    remaining.append(entry)
+            entries = remaining
+        return entries
+
+    def validate(self, entry):
+        """Return the entry, its unsaved work and parsed author names, or None 
+        if the entry is invalid. Authors are only resolved for the works that
+        are written."""
+        authors = parse_names(entry.pop('author', None) or '')
+        family = authors[0]['family'] if authors else ''
+        form = ImportForm(entry)
+        if not form.is_valid():
+            self.fail(entry, form.errors.as_text())
+            return None
+        work = form.instance
+        if not work.label and not (authors and work.published):
+            self.fail(entry, "no citation key, and no author and year to make one from")
+            return None
+        work.update_fingerprint(family)
+        return entry, work, authors
+
+    def allocate_labels(self, pending):
+        """Give the works without a citation key, or whose key is the label
+        of an existing work, a new label. A matching label doesn't make the 
+        work a duplicate, those are found by `skip_duplicates`. The labels 
+        taken for the whole batch are read in one query."""
+        keys = [work.label for entry, work, authors in pending if work.label]
+        taken = set(self.queryset.filter(label__in=keys).values_list('label', flat=True)) if keys else set()
+        remaining, bases = [], []
+        for item in pending:
+            entry, work, authors = item
+            if work.label in taken:
+                if not (authors and work.published):
+                    self.fail(entry, f"the citation key {work.label} is taken by another work, "
+                        "and there is no author and year to make a new one from")
+                    continue
+                work.label = ''
+            if not work.label:
+                bases.append((work, make_label_base(authors[0]['family'], work.published.year)))
+            remaining.append(item)
+        self.labels.prefetch(base for work, base in bases)
+        for work, base in bases:
+            work.label = self.labels.allocate(base)
+        return remaining
+
+    def skip_duplicates(self, pending):
+        """Skip, or merge, the validated works whose fingerprint matches an
+        existing work or an earlier entry, checking the whole batch in one
+        query. Returns the works left to create and the (entry, existing 
+        work, filled in fields) of the merges, which are saved by `write`."""
+        fingerprints = {work.fingerprint for entry, work, authors in pending if work.fingerprint}
+        existing = {}
+        for work in self.queryset.filter(fingerprint__in=fingerprints).order_by('pk'):
+            existing.setdefault(work.fingerprint, work)
+
+        remaining, merges = [], []
+        for item in pending:
+            entry, work, authors = item
+            if work.fingerprint in self._seen_fingerprints:
+                self.skip(entry, f"duplicate of {self._seen_fingerprints[work.fingerprint]} earlier in the file")
+            elif work.fingerprint in existing:
+                original = existing[work.fingerprint]
+                reason = f"duplicate of the existing work {original.label}"
+                filled = self.merge(original, work) if self.duplicates == 'merge' else []
+                if filled:
+                    merges.append((entry, original, filled))
+                else:
+                    self.skip(entry, reason)
+            else:
+                if work.fingerprint:
+                    self._seen_fingerprints[work.fingerprint] = work.label
+                remaining.append(item)
+
+        return remaining, merges
+
+    def merge(self, original, work):
+        """Copy the fields that are blank in original from work, returning
+        their names."""
+        filled = []
+        for field in original._meta.concrete_fields:
+            if field.name in self.unmerged_fields:
+                continue
+            if getattr(original, field.attname) in (None, '') and getattr(work, field.attname) not in (None, ''):
+                setattr(original, field.attname, getattr(work, field.attname))
+                filled.append(field.name)
+        return filled
+
+    def write(self, pending, merges=()):
+        """Save the works and merges of a batch in one transaction."""
+        if not pending and not merges:
+            return
+        db = self.queryset.db
+        with transaction.atomic(using=db):
+            if merges:
+                self.write_merges(merges)
+            if pending:
+                self.write_works(pending)
+
+    def write_merges(self, merges):
+        """Save the fields filled in existing works. If that fails, e.g. 
+        because two entries filled in the same unique URL, each work is saved
+        in its own savepoint."""
+        db = self.queryset.db
+        fields = defaultdict(set)
+        originals = {}
+        for entry, original, filled in merges:
+            originals[original.pk] = original
+            fields[original.pk].update(filled)
+
+        failed = {}
+        try:
+            with transaction.atomic(using=db):
+                self.queryset.bulk_update(originals.values(), sorted(set().union(*fields.values())))
+        except IntegrityError:
+            for pk, original in originals.items():
+                try:
+                    with transaction.atomic(using=db):
+                        self.queryset.bulk_update([original], sorted(fields[pk]))
+                except IntegrityError as e:
+                    failed[pk] = e
+
+        for entry, original, filled in merges:
+            reason = f"duplicate of the existing work {original.label}"
+            if original.pk in failed:
+                reason += f", could not fill in {', '.join(filled)}: {failed[original.pk]}"
+            else:
+                reason += f", filled in {', '.join(filled)}"
+            self.skip(entry, reason)
+
+    def write_works(self, pending):
+        """Create the works of a batch, with their authors."""
+        db = self.queryset.db
+        try:
+            with transaction.atomic(using=db):
+                created = self.queryset.bulk_create([work for entry, work, authors in pending])
+                saved = list(zip(pending, created))
+        except IntegrityError:
+            saved = []
+            for item in pending:
+                entry, work, authors = item
+                try:
+                    with transaction.atomic(using=db):
+                        self.queryset.bulk_create([work])
+                except IntegrityError as e:
+                    work.pk = None
+                    self.fail(entry, str(e))
+                else:
+                    saved.append((item, work))
+
+        # backends that can't return ids from bulk inserts
+        missing = [work.label for item, work in saved if work.pk is None]
+        if missing:
+            pks = dict(self.queryset.filter(label__in=missing).values_list('label', 'pk'))
+            for item, work in saved:
+                if work.pk is None:
+                    work.pk = pks[work.label]
+
+        # resolve the authors of the saved works only, in the same transaction
+        resolved = iter(get_author_model()._default_manager.using(db).resolve(
+            [name for (entry, _, authors), work in saved for name in authors]))
+        author_ids = [[next(resolved).pk for name in authors] for (entry, _, authors), work in saved]
+        self.through._default_manager.using(db).bulk_create([
+            self.through(**{f'{self.work_name}_id': work.pk, f'{self.author_name}_id': author_id, self.sort_name: position})
+            for (item, work), ids in zip(saved, author_ids)
+            for position, author_id in enumerate(dict.fromkeys(ids), 1)
+        ])
+
+        for (entry, _, authors), work in saved:
+            key = entry.get('label')
+            reason = f"the citation key is taken, labelled {work.label}" if key and key != work.label else None
+            self.report.add(ImportResult(CREATED, key or work.label, work, reason))
+
+    def skip(self, entry, reason):
+        self.report.add(ImportResult(SKIPPED, entry.get('label'), None, reason))
+
+    def fail(self, entry, reason):
+        self.report.add(ImportResult(FAILED, entry.get('label'), None, reason))
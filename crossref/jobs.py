@@ -0,0 +1,171 @@
+"""Run BibTeX imports in the background from a job table in the database.
+
+The admin saves each uploaded file as an `ImportJob` and the
+crossref_worker command claims and runs pending jobs, so no message broker
+is needed. Progress is saved after every batch, and a heartbeat is sent from a
+background thread while a batch runs, however long its DOI lookups take.
+A job whose worker stops sending heartbeats for `CROSSREF_JOB_TIMEOUT`
+seconds, e.g. because the worker was restarted, is claimed again and
+resumes after the last saved batch.
+"""
+import io
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from itertools import islice
+from django.apps import apps
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils import timezone
+from crossref.conf import settings
+from crossref.importer import BibtexImporter, ImportReport
+from crossref.parsers import bibtex
+
+
+class JobLost(Exception):
+    """The job was claimed by another worker."""
+
+
+def get_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_job(worker=None):
+    """Claim the oldest pending or abandoned job for worker and return it,
+    or None if there is nothing to do.
+
+    A job is claimed with a conditional update on its attempts, so two
+    workers never run the same job. Abandoned jobs that used up
+    `CROSSREF_JOB_MAX_ATTEMPTS` are marked as failed instead.
+    """
+    ImportJob = apps.get_model('crossref.ImportJob')
+    worker = worker or get_worker_name()
+    now = timezone.now()
+    abandoned = Q(status=ImportJob.RUNNING, heartbeat__lt=now - timedelta(seconds=settings.CROSSREF_JOB_TIMEOUT))
+
+    ImportJob.objects.filter(abandoned, attempts__gte=settings.CROSSREF_JOB_MAX_ATTEMPTS).update(
+        status=ImportJob.FAILED, finished=now,
+        error=f"Abandoned by its worker {settings.CROSSREF_JOB_MAX_ATTEMPTS} times")
+
+    candidates = (ImportJob.objects.filter(Q(status=ImportJob.PENDING) | abandoned)
+        .order_by('created').values_list('pk', 'attempts'))
+    for pk, attempts in candidates[:10]:
+        claimed = ImportJob.objects.filter(pk=pk, attempts=attempts).update(
+            status=ImportJob.RUNNING, worker=worker, heartbeat=now, attempts=attempts + 1)
+        if claimed:
+            return ImportJob.objects.get(pk=pk)
+    return None
+
+
+class Heartbeat:
+    """Updates the heartbeat of a running job every interval seconds (by 
+    default a third of `CROSSREF_JOB_TIMEOUT`) from a background thread, 
+    for as long as the block runs."""
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = interval or settings.CROSSREF_JOB_TIMEOUT / 3
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+    def run(self):
+        ImportJob = type(self.job)
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    ImportJob.objects.filter(pk=self.job.pk, attempts=self.job.attempts).update(
+                        heartbeat=timezone.now())
+                except DatabaseError:
+                    # a missed heartbeat is made up for by the next one
+                    pass
+        finally:
+            connection.close()
+
+
+def count_entries(source):
+    return sum(1 for type, body in bibtex.iter_raw_entries(io.StringIO(source))
+        if type not in bibtex.SKIPPED_TYPES)
+
+
+def run_job(job, batch_size=None):
+    """Import the entries of a claimed job, after those already processed,
+    and mark it finished or failed."""
+    ImportJob = type(job)
+    try:
+        if job.total is None:
+            job.total = count_entries(job.source)
+            save_progress(job, ImportReport(), 0)
+
+        importer = BibtexImporter(batch_size=batch_size)
+        entries = bibtex.iparse(io.StringIO(job.source))
+        importer.resume(islice(entries, job.processed))
+        with Heartbeat(job):
+            importer.run(entries, callback=lambda report, batch: save_progress(job, report, len(batch)))
+        status, error = ImportJob.FINISHED, ''
+    except JobLost:
+        return job
+    except Exception:
+        status, error = ImportJob.FAILED, traceback.format_exc()
+
+    job.status, job.error, job.finished = status, error, timezone.now()
+    ImportJob.objects.filter(pk=job.pk, attempts=job.attempts).update(
+        status=status, error=error, finished=job.finished)
+    return job
+
+
+def save_progress(job, report, processed):
+    """Add the report of the last batch to the job and send a heartbeat.
+    Only the first `CROSSREF_JOB_REPORT_LIMIT` skipped and failed entries
+    are kept, and the report is only written while it grows. The report 
+    is emptied for the next batch."""
+    ImportJob = type(job)
+    job.processed += processed
+    job.created_count += len(report.created)
+    job.skipped_count += len(report.skipped)
+    job.failed_count += len(report.failed)
+    fields = dict(total=job.total, processed=job.processed, created_count=job.created_count,
+        skipped_count=job.skipped_count, failed_count=job.failed_count)
+    for key in ('skipped', 'failed'):
+        listed = job.report.setdefault(key, [])
+        room = settings.CROSSREF_JOB_REPORT_LIMIT - len(listed)
+        results = getattr(report, key)[:max(room, 0)]
+        if results:
+            listed.extend({'label': r.label, 'reason': r.reason} for r in results)
+            fields['report'] = job.report
+    job.heartbeat = fields['heartbeat'] = timezone.now()
+
+    updated = ImportJob.objects.filter(pk=job.pk, attempts=job.attempts).update(**fields)
+    if not updated:
+        raise JobLost(job.pk)
+    report.created, report.skipped, report.failed = [], [], []
+
+
+def run_worker(worker=None, once=False, poll_interval=None, batch_size=None, log=None):
+    """Claim and run jobs until interrupted, or until there are none left
+    when once is True."""
+    worker = worker or get_worker_name()
+    poll_interval = settings.CROSSREF_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    while True:
+        job = claim_job(worker)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        if log:
+            log(f"Running {job} ({job.processed}/{job.total or '?'} entries done)")
+        run_job(job, batch_size)
+        if log:
+            log(f"{job}: {job.status}, {job.created_count} created, "
+                f"{job.skipped_count} skipped, {job.failed_count} failed")
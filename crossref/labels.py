@@ -0,0 +1,76 @@
+"""Allocation of unique citation labels such as Smith2019, Smith2019a."""
+from functools import reduce
+from itertools import count
+from operator import or_
+from django.db.models import Q
+
+
+def make_suffix(n):
+    """Return the suffix for the nth work sharing a label: '', 'a' ... 'z',
+    'aa', 'ab' and so on."""
+    suffix = ''
+    while n > 0:
+        n, remainder = divmod(n - 1, 26)
+        suffix = chr(ord('a') + remainder) + suffix
+    return suffix
+
+
+def make_label_base(family, year):
+    """Return the label before any suffix, from the family name of the first
+    author and the year of publication."""
+    return f"{family.strip().replace(',', '')}{year}"
+
+
+def crossref_label_base(message):
+    """Return the label base for a Crossref work message, or None."""
+    try:
+        family = message['author'][0]['family']
+        year = message['published']['date-parts'][0][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return make_label_base(family, year)
+
+
+class LabelAllocator:
+    """Hands out labels that aren't taken yet.
+
+    The labels taken for a base are read once with a prefix query on the
+    unique (and so indexed) label column and kept, so labels for a whole
+    batch of new works cost one query per batch when their bases are
+    loaded up front with `prefetch`. Allocated labels are remembered, so
+    works in the same batch never get the same label. Another process may
+    still take a label first; forms then call `allocate` again with
+    `refresh=True` to re-read the taken labels.
+    """
+
+    #: bases loaded per query by prefetch
+    batch_size = 100
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._taken = {}
+
+    def prefetch(self, bases):
+        """Load the labels taken for all the given bases."""
+        bases = sorted({base for base in bases if base and base not in self._taken})
+        for i in range(0, len(bases), self.batch_size):
+            batch = bases[i:i + self.batch_size]
+            for base in batch:
+                self._taken[base] = set()
+            lookup = reduce(or_, (Q(label__startswith=base) for base in batch))
+            for label in self.queryset.filter(lookup).values_list('label', flat=True).iterator():
+                for base in batch:
+                    if label.startswith(base):
+                        self._taken[base].add(label)
+
+    def allocate(self, base, refresh=False):
+        """Return the first free label for base and reserve it."""
+        if refresh:
+            # keep the labels already handed out by this allocator
+            self._taken.setdefault(base, set()).update(
+                self.queryset.filter(label__startswith=base).values_list('label', flat=True))
+        self.prefetch([base])
+        taken = self._taken[base]
+        label = next(base + make_suffix(n) for n in count() if base + make_suffix(n) not in taken)
+        taken.add(label)
+        return label
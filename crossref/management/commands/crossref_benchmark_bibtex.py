@@ -0,0 +1,64 @@
+import io
+import re
+import timeit
+from django.core.management.base import BaseCommand
+from crossref.parsers import bibtex
+
+ENTRY = r"""@article{M{\"u}ller%(n)d,
+  author = {M{\"u}ller, J{\"o}rg and Fran{\c{c}}ois, B. and {\AA}berg, S{\o}ren},
+  title = {{Thermal} conductivity of plutonic rocks, part %(n)d},
+  journal = {Geophysical Journal International},
+  abstract = {Thermal conductivity is a physical parameter crucial to accurately estimating temperature and modelling thermally related processes within the lithosphere. Direct measurements are often impractical due to the high cost of comprehensive sampling or inaccessibility and thereby require indirect estimates.},
+  year = {2019},
+  pages = {%(n)d--%(m)d},
+  doi = {10.1000/bench.%(n)d}
+}
+
+"""
+
+
+def replace_special_chars_loop(string):
+    """The previous implementation, one str.replace per special character."""
+    for key, value in bibtex.special_chars:
+        string = string.replace(key, value)
+    return re.sub(r'\\[cuHvs]{?([a-zA-Z])}?', r'\1', string)
+
+
+class Command(BaseCommand):
+    help = ("Time the replacement of LaTeX special characters and the parsing "
+            "of a .bib file, comparing the single pass translator with the "
+            "previous replace loop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?',
+            help="BibTeX file to benchmark with. A synthetic file is generated when omitted.")
+        parser.add_argument('--entries', type=int, default=5000,
+            help="Number of entries in the synthetic file.")
+        parser.add_argument('--repeat', type=int, default=5,
+            help="Runs of each benchmark, the best is reported.")
+        parser.add_argument('--workers', type=int, default=0,
+            help="Processes used by pparse, 0 for one per CPU.")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as f:
+                source = f.read()
+        else:
+            source = ''.join(ENTRY % {'n': n, 'm': n + 9} for n in range(options['entries']))
+        self.stdout.write(f"{len(source) / 1e6:.1f} MB of BibTeX")
+
+        loop = self.time(replace_special_chars_loop, source, options['repeat'])
+        single = self.time(bibtex.replace_special_chars, source, options['repeat'])
+        self.stdout.write(f"special characters, replace loop: {loop:.3f}s")
+        self.stdout.write(f"special characters, single pass:  {single:.3f}s ({loop / single:.1f}x)")
+
+        parse = self.time(bibtex.parse, source, options['repeat'])
+        iparse = self.time(lambda s: list(bibtex.iparse(io.StringIO(s))), source, options['repeat'])
+        self.stdout.write(f"parse:  {parse:.3f}s")
+        self.stdout.write(f"iparse: {iparse:.3f}s")
+        pparse = self.time(lambda s: list(bibtex.pparse(io.StringIO(s), options['workers'] or None)),
+            source, options['repeat'])
+        self.stdout.write(f"pparse: {pparse:.3f}s ({iparse / pparse:.1f}x)")
+
+    def time(self, func, source, repeat):
+        return min(timeit.repeat(lambda: func(source), number=1, repeat=repeat))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from crossref.utils import get_work_model
+
+
+class Command(BaseCommand):
+    help = ("Fill in the fingerprint used to detect duplicate works on import. "
+            "Run once after adding the column to an existing database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+            help="Works updated per query. Defaults to CROSSREF_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        updated = get_work_model().objects.fill_fingerprints(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{updated} fingerprints filled in"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from crossref.harvest import harvest_works
+from crossref.managers import CREATED, UPDATED, FAILED
+
+
+class Command(BaseCommand):
+    help = ("Harvest every Crossref work matching the given filters, e.g. "
+            "--filter orcid:0000-0003-3762-7336 --filter from-pub-date:2020. "
+            "Interrupted harvests resume from the last saved page.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filter', action='append', required=True,
+            help="Crossref filter as name:value. Can be given more than once.")
+        parser.add_argument('--rows', type=int,
+            help="Works per page. Defaults to CROSSREF_HARVEST_ROWS.")
+        parser.add_argument('--restart', action='store_true',
+            help="Ignore the saved cursor and start from the first page.")
+
+    def handle(self, *args, **options):
+        totals = {CREATED: 0, UPDATED: 0, FAILED: 0}
+        harvest = None
+        for harvest, results in harvest_works(','.join(options['filter']), options['rows'], options['restart']):
+            for result in results.values():
+                if result.status in totals:
+                    totals[result.status] += 1
+            self.stdout.write(f"{harvest.harvested}/{harvest.total_results} works harvested")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals[CREATED]} created, {totals[UPDATED]} updated, {totals[FAILED]} failed"))
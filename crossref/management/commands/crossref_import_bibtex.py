@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from crossref.importer import BibtexImporter
+from crossref.parsers import bibtex
+
+
+class Command(BaseCommand):
+    help = ("Import the works of a .bib file. Use --workers to parse large "
+            "files in several processes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="BibTeX file to import.")
+        parser.add_argument('--workers', type=int, default=1,
+            help="Processes parsing the file, 0 for one per CPU. Defaults to 1.")
+        parser.add_argument('--batch-size', type=int,
+            help="Entries imported per transaction. Defaults to CROSSREF_BATCH_SIZE.")
+        parser.add_argument('--no-lookup', action='store_true',
+            help="Import entries from their BibTeX data without looking up their DOIs on Crossref.")
+        parser.add_argument('--duplicates', choices=['skip', 'merge'],
+            help="What to do with duplicates of existing works. Defaults to CROSSREF_IMPORT_DUPLICATES.")
+
+    def handle(self, *args, **options):
+        importer = BibtexImporter(batch_size=options['batch_size'],
+            lookup_dois=not options['no_lookup'], duplicates=options['duplicates'])
+        with open(options['file'], encoding='utf-8') as f:
+            entries = bibtex.pparse(f, workers=options['workers'] or None)
+            report = importer.run(entries, callback=self.progress if options['verbosity'] > 1 else None)
+
+        for result in report.failed:
+            self.stderr.write(f"{result.label}: {result.reason}")
+        self.stdout.write(self.style.SUCCESS(report.summary()))
+
+    def progress(self, report, batch):
+        self.stdout.write(f"{len(report)} entries done")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from crossref.utils import get_author_model
+
+
+class Command(BaseCommand):
+    help = ("Merge authors that share an ORCID iD and fill in the orcid_id, "
+            "name_key and given_key columns of existing authors. Run once after adding "
+            "those columns to an existing database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+            help="ORCID iDs merged per transaction. Defaults to CROSSREF_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        Author = get_author_model()
+        counts = Author.objects.merge_orcid_duplicates(options['batch_size'])
+        names = Author.objects.fill_lookup_keys(['name_key', 'given_key'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['merged']} duplicate authors merged, {counts['updated']} ORCID iDs "
+            f"and {names} name keys filled in"))
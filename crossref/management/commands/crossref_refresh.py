@@ -0,0 +1,86 @@
+import re
+from datetime import timedelta as td
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from crossref.conf import settings
+from crossref.managers import UPDATED, UNCHANGED, FAILED
+from crossref.utils import get_work_model
+
+DURATION = re.compile(r'^(\d+)([dhm])$')
+UNITS = {'d': 'days', 'h': 'hours', 'm': 'minutes'}
+
+
+def parse_since(value):
+    """Parse an age such as '30d', '12h' or '90m', or an ISO date/datetime,
+    into an aware datetime."""
+    match = DURATION.match(value)
+    if match:
+        return timezone.now() - td(**{UNITS[match[2]]: int(match[1])})
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(f"Invalid --since value: {value}")
+        since = timezone.datetime.combine(date, timezone.datetime.min.time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+class Command(BaseCommand):
+    help = "Re-fetch stale works from Crossref and update the fields that changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since',
+            help="Refresh works not queried since this age (e.g. 30d, 12h) or ISO date. "
+                 "Defaults to CROSSREF_REFRESH_AGE days.")
+        parser.add_argument('--limit', type=int,
+            help="Maximum number of works to refresh.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+            help="Number of works loaded from the database at a time.")
+        parser.add_argument('--workers', type=int,
+            help="Number of concurrent Crossref requests. Defaults to CROSSREF_MAX_WORKERS.")
+        parser.add_argument('--dry-run', action='store_true',
+            help="Report the changes without saving them.")
+
+    def handle(self, *args, **options):
+        if options['since']:
+            since = parse_since(options['since'])
+        else:
+            since = timezone.now() - td(days=settings.CROSSREF_REFRESH_AGE)
+
+        Work = get_work_model()
+        stale = (Work.objects
+            .filter(DOI__isnull=False)
+            .exclude(DOI='')
+            .filter(Q(last_queried_crossref__lt=since) | Q(last_queried_crossref__isnull=True))
+            .order_by('pk'))
+
+        limit = options['limit']
+        totals = {UPDATED: 0, UNCHANGED: 0, FAILED: 0}
+        last_pk = 0
+        while limit is None or sum(totals.values()) < limit:
+            size = options['chunk_size']
+            if limit is not None:
+                size = min(size, limit - sum(totals.values()))
+            # page on the primary key so each chunk is a single indexed range scan
+            chunk = stale.filter(pk__gt=last_pk)[:size]
+            pks = list(chunk.values_list('pk', flat=True))
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            results = Work.objects.filter(pk__in=pks).refresh_from_crossref(
+                max_workers=options['workers'], dry_run=options['dry_run'])
+            for doi, result in results.items():
+                totals[result.status] += 1
+                if result.status == UPDATED:
+                    self.stdout.write(f"{doi}: {', '.join(result.changed)}")
+                elif result.status == FAILED and options['verbosity'] > 1:
+                    self.stderr.write(f"{doi}: {result.reason}")
+
+        prefix = "[dry run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{totals[UPDATED]} updated, {totals[UNCHANGED]} unchanged, {totals[FAILED]} failed"))
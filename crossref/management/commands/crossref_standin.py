@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from crossref.conf import settings
+from crossref.transport import FixtureStore, StandInServer
+
+
+class Command(BaseCommand):
+    help = ("Serve recorded Crossref responses from a local stand-in for the "
+            "/works and /funders endpoints. Set CROSSREF_BASE_URL to the "
+            "printed url to benchmark without the network.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', default=settings.CROSSREF_FIXTURE_DIR,
+            help="Directory of recorded responses. Defaults to CROSSREF_FIXTURE_DIR.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=settings.CROSSREF_REPLAY_LATENCY,
+            help="Mean seconds of latency added to each request.")
+        parser.add_argument('--rate-limit', type=int, default=50,
+            help="Requests per second advertised in the X-Rate-Limit headers.")
+        parser.add_argument('--synthesize', action='store_true',
+            help="Answer unrecorded DOIs with a copy of a recorded work.")
+
+    def handle(self, *args, **options):
+        store = FixtureStore(options['fixtures'], synthesize=options['synthesize'])
+        server = StandInServer(store, (options['host'], options['port']),
+            latency=options['latency'], rate_limit=options['rate_limit'],
+            verbose=options['verbosity'] > 1)
+        self.stdout.write(f"Serving {store.path} at {server.url}, quit with CONTROL-C.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from crossref.harvest import harvest_funders
+
+
+class Command(BaseCommand):
+    help = "Sync the Crossref funder registry into the local Funder table, writing only new and changed funders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int,
+            help="Funders per page. Defaults to CROSSREF_HARVEST_ROWS.")
+
+    def handle(self, *args, **options):
+        totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+        for counts in harvest_funders(options['rows']):
+            for key in totals:
+                totals[key] += counts[key]
+            self.stdout.write(f"{sum(totals.values())}/{counts['total-results']} funders synced")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['created']} created, {totals['updated']} updated, {totals['unchanged']} unchanged"))
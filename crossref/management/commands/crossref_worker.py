@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from crossref.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = ("Run the BibTeX import jobs uploaded in the admin. Jobs left "
+            "unfinished by a stopped worker are resumed after CROSSREF_JOB_TIMEOUT "
+            "seconds. Run one or more workers alongside the web server.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+            help="Exit when there are no jobs left instead of waiting for new ones.")
+        parser.add_argument('--poll-interval', type=float,
+            help="Seconds between looking for new jobs. Defaults to CROSSREF_JOB_POLL_INTERVAL.")
+        parser.add_argument('--batch-size', type=int,
+            help="Entries imported per transaction. Defaults to CROSSREF_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        try:
+            run_worker(once=options['once'], poll_interval=options['poll_interval'],
+                batch_size=options['batch_size'], log=self.stdout.write)
+        except KeyboardInterrupt:
+            pass
@@ -1,47 +1,607 @@
 from xml.dom import ValidationErr
+import asyncio
+import copy
+import re
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from asgiref.sync import sync_to_async
 from django.db import IntegrityError, transaction
-from crossref.utils import query_and_clean_crossref
+from django.utils import timezone
+from crossref.conf import settings
+from crossref.labels import LabelAllocator, crossref_label_base
+from crossref.ratelimit import single_flight, asingle_flight
+from crossref.utils import (
+    query_and_clean_crossref,
+    clean_crossref_response,
+    get_crossref_client,
+    aquery_crossref_for_doi,
+    get_async_crossref_client,
+    normalize_doi,
+    get_cached_responses,
+    fetch_works,
+    afetch_works,
+    chunked,
+    normalize_orcid,
+    make_name_key,
+    get_work_model,
+)
 from django.forms import ValidationError
 
+EXISTING = 'existing'
+CREATED = 'created'
+FAILED = 'failed'
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+
+#: part of an ORCID iD, such as 3762 or 3762-7336
+ORCID_PART = re.compile(r'^[\dX-]{4,19}$', re.IGNORECASE)
+
+CrossrefResult = namedtuple('CrossrefResult', ['status', 'instance', 'reason'])
+CrossrefResult.__doc__ = """Outcome of a bulk lookup for a single DOI.
+
+status is one of 'existing', 'created' or 'failed'. instance is the saved
+work (None when failed) and reason explains a failure."""
+
+RefreshResult = namedtuple('RefreshResult', ['status', 'instance', 'changed', 'reason'])
+RefreshResult.__doc__ = """Outcome of refreshing a single work from Crossref.
+
+status is one of 'updated', 'unchanged' or 'failed'. changed lists the
+fields that were (or in a dry run would have been) updated."""
+
+
+async def _afetch_works(client, dois, semaphore):
+    async with semaphore:
+        return await afetch_works(client, dois)
+
+
 class WorkQuerySet(QuerySet):
 
     def get_or_query_crossref(self, doi, **kwargs):
         
         self._for_write = True
         try:
-            # changing to lower case because doi is case insensitive
-            return self.get(DOI=doi.lower()), False
+            return self.get(DOI=normalize_doi(doi)), False
+        except self.model.DoesNotExist:
+            # only one caller fetches a DOI at a time, the others wait and 
+            # reuse the work it saved
+            with single_flight(normalize_doi(doi)) as leader:
+                if not leader:
+                    try:
+                        return self.get(DOI=normalize_doi(doi)), False
+                    except self.model.DoesNotExist:
+                        pass
+                # Try to fetch data from the crossref database
+                validated_form = query_and_clean_crossref(doi,kwargs.pop('request',None))
+                return self._save_validated_form(doi, validated_form)
+
+    async def aget_or_query_crossref(self, doi=None, **kwargs):
+        """Async version of `get_or_query_crossref`. 
+
+        The Crossref request is made on the event loop using the pooled async 
+        client, only the database reads and writes run in a worker thread.
+        """
+        self._for_write = True
+        try:
+            return await sync_to_async(self.get)(DOI=normalize_doi(doi)), False
         except self.model.DoesNotExist:
-            # Try to fetch data from the crossref database
-            validated_form = query_and_clean_crossref(doi,kwargs.pop('request',None))
-            if validated_form.errors:
-                doi_errors = validated_form.errors.get('DOI')
-                if doi_errors:
-                    if doi_errors.data[0].code == 'unique':
-                        try:
-                            return self.get(DOI=validated_form.data['DOI']), False
-                        except:
-                            pass
-                # raise ValidationError(f'An error occured validating {doi}') 
+            async with asingle_flight(normalize_doi(doi)) as leader:
+                if not leader:
+                    try:
+                        return await sync_to_async(self.get)(DOI=normalize_doi(doi)), False
+                    except self.model.DoesNotExist:
+                        pass
+                response = await aquery_crossref_for_doi(doi)
+                return await sync_to_async(self._save_crossref_response)(doi, response)
+
+    def _save_crossref_response(self, doi, response):
+        return self._save_validated_form(doi, clean_crossref_response(response))
+
+    def _save_validated_form(self, doi, validated_form):
+        if validated_form.errors:
+            doi_errors = validated_form.errors.get('DOI')
+            if doi_errors:
+                if doi_errors.data[0].code == 'unique':
+                    try:
+                        return self.get(DOI=validated_form.data['DOI']), False
+                    except:
+                        pass
+            # raise ValidationError(f'An error occured validating {doi}') 
+        try:
+            with transaction.atomic(using=self.db):
+                return validated_form.save(), True
+                # return self.create(**cleaned_data), True
+        except IntegrityError:
+            try:
+                return self.get(DOI=doi), False
+            except self.model.DoesNotExist:
+                pass
+            raise
+
+    def bulk_get_or_query_crossref(self, dois, batch_size=None, max_workers=None):
+        """Get or create works for many DOIs at once.
+
+        Existing works are found with a single query, missing DOIs are fetched 
+        from Crossref concurrently in groups of `CROSSREF_FILTER_BATCH_SIZE` 
+        per request and the results are saved in batched transactions. Returns a dict mapping each given DOI to a 
+        `CrossrefResult`.
+        """
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        max_workers = max_workers or settings.CROSSREF_MAX_WORKERS
+        self._for_write = True
+
+        requested, results, missing = self._split_requested(dois)
+        fetched = get_cached_responses(missing, projected=True)
+        to_fetch = [doi for doi in missing if doi not in fetched]
+        if to_fetch:
+            client = get_crossref_client()
+            chunks = chunked(to_fetch, settings.CROSSREF_FILTER_BATCH_SIZE)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for found in executor.map(lambda dois: fetch_works(client, dois), chunks):
+                    fetched.update(found)
+        results.update(self._save_crossref_responses(fetched, batch_size))
+
+        return {doi: results[normalized] for doi, normalized in requested.items()}
+
+    async def abulk_get_or_query_crossref(self, dois, batch_size=None, concurrency=None):
+        """Async version of `bulk_get_or_query_crossref`.
+
+        Missing DOIs are fetched with `asyncio.gather`, at most `concurrency` 
+        requests (default `CROSSREF_ASYNC_CONCURRENCY`) being in flight at 
+        any one time.
+        """
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        semaphore = asyncio.Semaphore(concurrency or settings.CROSSREF_ASYNC_CONCURRENCY)
+        self._for_write = True
+
+        requested, results, missing = await sync_to_async(self._split_requested)(dois)
+        fetched = await sync_to_async(get_cached_responses)(missing, projected=True)
+        to_fetch = [doi for doi in missing if doi not in fetched]
+        if to_fetch:
+            client = await get_async_crossref_client()
+            chunks = chunked(to_fetch, settings.CROSSREF_FILTER_BATCH_SIZE)
+            for found in await asyncio.gather(*(_afetch_works(client, dois, semaphore) for dois in chunks)):
+                fetched.update(found)
+        results.update(await sync_to_async(self._save_crossref_responses)(fetched, batch_size))
+
+        return {doi: results[normalized] for doi, normalized in requested.items()}
+
+    def refresh_from_crossref(self, max_workers=None, dry_run=False):
+        """Re-fetch every work in the queryset from Crossref, bypassing the 
+        response cache, and save the fields that changed.
+
+        Works are requested in groups of `CROSSREF_FILTER_BATCH_SIZE` DOIs, 
+        `max_workers` groups at a time, and stamped with 
+        `last_queried_crossref`. Works Crossref has no record of, or an 
+        invalid one, are stamped too so they are not requested again on 
+        every run; works whose request failed are left to be retried. With 
+        dry_run nothing is written to the database. Returns a dict mapping 
+        each work's DOI to a `RefreshResult`.
+        """
+        from .cache import unresolvable
+        max_workers = max_workers or settings.CROSSREF_MAX_WORKERS
+        self._for_write = True
+        works = {work.DOI: work for work in self if work.DOI}
+
+        client = get_crossref_client()
+        chunks = chunked(works, settings.CROSSREF_FILTER_BATCH_SIZE)
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for found in executor.map(lambda dois: fetch_works(client, dois), chunks):
+                fetched.update(found)
+
+        queried = timezone.now()
+        failed = [doi for doi, (response, error) in fetched.items() if error is not None]
+        not_found = [works[doi].pk for doi in unresolvable.get_many(failed)]
+        if not_found and not dry_run:
+            self.model._default_manager.using(self.db).filter(pk__in=not_found).update(last_queried_crossref=queried)
+
+        results = {}
+        for doi, (response, error) in fetched.items():
+            if error is not None:
+                results[doi] = RefreshResult(FAILED, works[doi], [], error)
+                continue
+            with transaction.atomic(using=self.db):
+                results[doi] = self._update_from_crossref(works[doi], response)
+                if dry_run:
+                    transaction.set_rollback(True)
+        return results
+
+    def _update_from_crossref(self, work, response):
+        """Validate response against work and save only the fields that 
+        changed."""
+        from .forms import WorkForm
+
+        form = WorkForm(response['message'], instance=copy.copy(work))
+        if not form.is_valid():
+            work.last_queried_crossref = response['queried']
+            work.save(update_fields=['last_queried_crossref'])
+            return RefreshResult(FAILED, work, [], form.errors.as_text())
+
+        # only compare fields Crossref sent, the DOI and label identify the work
+        fields = [name for name in form.fields if name in form.data and name not in ('DOI', 'label', 'author')]
+        changed = [name for name in fields if getattr(form.instance, name) != getattr(work, name)]
+        for name in changed:
+            setattr(work, name, getattr(form.instance, name))
+        work.last_queried_crossref = response['queried']
+        work.save(update_fields=changed + ['last_queried_crossref'])
+
+        if 'author' in form.data:
+            authors = list(form.cleaned_data['author'])
+            if authors != list(work.author.all()):
+                work.author.set(authors)
+                changed.append('author')
+
+        return RefreshResult(UPDATED if changed else UNCHANGED, work, changed, None)
+
+    def upsert_from_crossref(self, messages, batch_size=None):
+        """Create or update works from a list of Crossref work messages, such 
+        as a page of /works results. Existing works are found with a single 
+        query and only their changed fields are saved. Returns a dict mapping 
+        each DOI to a `CrossrefResult` (new works) or `RefreshResult`."""
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        self._for_write = True
+
+        queried = timezone.now()
+        entries = {normalize_doi(m['DOI']): {'message': m, 'queried': queried} for m in messages}
+        existing = {w.DOI.lower(): w for w in self.filter(DOI__in=entries)}
+
+        results = self._save_crossref_responses(
+            {doi: (entry, None) for doi, entry in entries.items() if doi not in existing}, batch_size)
+        for doi, work in existing.items():
             try:
                 with transaction.atomic(using=self.db):
-                    return validated_form.save(), True
-                    # return self.create(**cleaned_data), True
-            except IntegrityError:
-                try:
-                    return self.get(DOI=doi), False
-                except self.model.DoesNotExist:
-                    pass
-                raise
+                    results[doi] = self._update_from_crossref(work, entries[doi])
+            except IntegrityError as e:
+                results[doi] = RefreshResult(FAILED, work, [], str(e))
+        return results
 
-    async def aget_or_query_crossref(self, doi=None, **kwargs):
-        return await sync_to_async(self.get_or_query_crossref)(
-            doi=doi,
-            **kwargs,
-        )
-        
-        
+    def fill_fingerprints(self, batch_size=None):
+        """Recompute the fingerprint of every work and save the ones that 
+        changed, reading the first authors of each batch of works in one 
+        query. Returns the number of works updated."""
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        field = self.model._meta.get_field('author')
+        through = field.remote_field.through
+        work_name, author_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+        updated, last_pk = 0, 0
+        while True:
+            works = list(self.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not works:
+                return updated
+            last_pk = works[-1].pk
+            families = {}
+            links = (through.objects.filter(**{f'{work_name}__in': works})
+                .order_by(f'-{field.sort_value_field_name}')
+                .values_list(f'{work_name}_id', f'{author_name}__family'))
+            for work_id, family in links:
+                # ordered last to first, so the first author is kept
+                families[work_id] = family
+            changed = []
+            for work in works:
+                old = work.fingerprint
+                work.update_fingerprint(families.get(work.pk, ''))
+                if work.fingerprint != old:
+                    changed.append(work)
+            self.bulk_update(changed, ['fingerprint'])
+            updated += len(changed)
+
+    def _split_requested(self, dois):
+        """Normalize the requested DOIs and find those already in the database 
+        with a single query. Returns the normalized DOIs, results for the 
+        existing works and the DOIs still to be fetched."""
+        requested = {doi: normalize_doi(doi) for doi in dois if doi}
+        existing = {w.DOI.lower(): w for w in self.filter(DOI__in=set(requested.values()))}
+        results = {doi: CrossrefResult(EXISTING, work, None) for doi, work in existing.items()}
+        missing = [doi for doi in dict.fromkeys(requested.values()) if doi not in existing]
+        return requested, results, missing
+
+    def _save_crossref_responses(self, fetched, batch_size):
+        """Validate and save a dict of {doi: (response, error)} in batched 
+        transactions. Each work is saved within its own savepoint so a single 
+        failure does not abort the rest of the batch."""
+        fetched = list(fetched.items())
+        results = {}
+        labels = LabelAllocator(self.model._default_manager.using(self.db))
+        for i in range(0, len(fetched), batch_size):
+            batch = fetched[i:i + batch_size]
+            # read the labels taken by the whole batch in one go
+            labels.prefetch(crossref_label_base(response['message']) for doi, (response, error) in batch if error is None)
+            with transaction.atomic(using=self.db):
+                for doi, (response, error) in batch:
+                    if error is not None:
+                        results[doi] = CrossrefResult(FAILED, None, error)
+                        continue
+                    results[doi] = self._create_from_crossref(doi, response, labels)
+        return results
+
+    def _create_from_crossref(self, doi, response, label_allocator=None):
+        try:
+            with transaction.atomic(using=self.db):
+                form = clean_crossref_response(response, label_allocator)
+                if not form.errors:
+                    return CrossrefResult(CREATED, form.save(), None)
+                # roll back any authors created while validating
+                transaction.set_rollback(True)
+        except IntegrityError as e:
+            form, error = None, str(e)
+        else:
+            error = form.errors.as_text()
+
+        # the work may have been saved by another process in the meantime
+        try:
+            return CrossrefResult(EXISTING, self.get(DOI=doi), None)
+        except self.model.DoesNotExist:
+            return CrossrefResult(FAILED, None, error)
+
+
+class FunderQuerySet(QuerySet):
+
+    #: Funder fields and the Crossref keys they are read from
+    crossref_fields = {
+        'location': 'location',
+        'name': 'name',
+        'uri': 'uri',
+        'alt_names': 'alt-names',
+        'replaces': 'replaces',
+        'replaced_by': 'replaced-by',
+        'tokens': 'tokens',
+    }
+
+    def upsert_from_crossref(self, items, batch_size=None):
+        """Create or update funders from a list of Crossref funder records.
+
+        Existing funders are loaded with a single query, new ones are 
+        inserted with `bulk_create` and only funders whose data changed are 
+        written with `bulk_update`. Returns a dict of created, updated and 
+        unchanged counts.
+        """
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        self._for_write = True
+        items = {item['id']: item for item in items}
+        existing = self.in_bulk(list(items))
+
+        new, changed = [], []
+        for pk, item in items.items():
+            values = {field: item.get(key) for field, key in self.crossref_fields.items()}
+            values['alt_names'] = values['alt_names'] or []
+            values['tokens'] = values['tokens'] or []
+            for field in ('location', 'name', 'uri'):
+                values[field] = values[field] or ''
+            funder = existing.get(pk)
+            if funder is None:
+                new.append(self.model(id=pk, **values))
+            elif any(getattr(funder, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(funder, field, value)
+                changed.append(funder)
+
+        if new or changed:
+            with transaction.atomic(using=self.db):
+                self.bulk_create(new, batch_size=batch_size)
+                self.bulk_update(changed, list(self.crossref_fields), batch_size=batch_size)
+
+        return {'created': len(new), 'updated': len(changed), 'unchanged': len(items) - len(new) - len(changed)}
+
+
+class AuthorQuerySet(QuerySet):
+
+    def with_lookup_keys(self, fields):
+        """Return fields plus the lookup keys derived from any of them."""
+        fields = list(fields)
+        for key, sources in self.model.lookup_keys.items():
+            if key not in fields and set(sources) & set(fields):
+                fields.append(key)
+        return fields
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Create authors, filling in their lookup keys as `Author.save` does."""
+        objs = list(objs)
+        for obj in objs:
+            obj.update_lookup_keys()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """Update authors, also updating the lookup keys derived from fields."""
+        objs = list(objs)
+        if self.with_lookup_keys(fields) != list(fields):
+            fields = self.with_lookup_keys(fields)
+            for obj in objs:
+                obj.update_lookup_keys()
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def resolve(self, authors):
+        """Return the authors matching a list of author dicts (as returned by 
+        Crossref), in the same order, creating the missing ones.
+
+        Authors are matched on their ORCID iD when they have one and on 
+        their name key (see `make_name_key`) otherwise. All authors are 
+        looked up at once, missing authors are created with `bulk_create` 
+        and only attributes that changed are written with `bulk_update`, so 
+        the authors of a whole import batch can be resolved together.
+        """
+        field_names = {f.name for f in self.model._meta.fields} - {self.model._meta.pk.name, 'given', 'family'}
+
+        # authors are keyed on their ORCID iD or their name key
+        keys, names, defaults = [], {}, {}
+        for author in authors:
+            given = (author.get('given') or '').strip().replace(',','')
+            family = (author.get('family') or '').strip().replace(',','')
+            key = normalize_orcid(author.get('ORCID')) or ('name', make_name_key(given, family))
+            keys.append(key)
+            names.setdefault(key, (given, family))
+            defaults.setdefault(key, {}).update(
+                {k.replace('-','_'):v for k,v in author.items() if k.replace('-','_') in field_names})
+
+        found = self._lookup(names)
+
+        changed, fields = [], set()
+        for key, obj in found.items():
+            diff = {k: v for k, v in defaults[key].items() if getattr(obj, k) != v}
+            if diff:
+                for k, v in diff.items():
+                    setattr(obj, k, v)
+                fields.update(diff)
+                changed.append(obj)
+        if changed:
+            self.bulk_update(changed, sorted(fields))
+
+        missing = {key: names[key] for key in names if key not in found}
+        if missing:
+            # conflicts are authors created concurrently with the same ORCID iD
+            created = self.bulk_create(
+                [self.model(given=given, family=family, **defaults[key]) for key, (given, family) in missing.items()],
+                ignore_conflicts=True)
+            for key, obj in zip(missing, created):
+                if obj.pk is not None:
+                    found[key] = obj
+            # backends that don't return the new ids: look them up again, 
+            # skipping the authors already taken by other keys
+            missing = {key: name for key, name in missing.items() if key not in found}
+            if missing:
+                found.update(self._lookup(missing, exclude={obj.pk for obj in found.values()}))
+
+        return [found[key] for key in keys]
+
+    def _lookup(self, names, exclude=()):
+        """Return a dict of {key: author} for the authors found in the database.
+
+        names maps each key, an ORCID iD or a ('name', name key) pair, to 
+        the (given, family) of the author. Authors with an ORCID iD are 
+        matched on it first, then on the name key of an author that doesn't 
+        have an ORCID iD yet. Each author is matched to one key at most, and 
+        authors whose pk is in exclude are not matched at all.
+        """
+        orcids = [key for key in names if isinstance(key, str)]
+        name_keys = sorted({make_name_key(*name) for name in names.values()})
+        rows = {}
+        # batches keep the number of query parameters within database limits
+        for i in range(0, max(len(orcids), len(name_keys)), 400):
+            lookup = Q(orcid_id__in=orcids[i:i + 400]) | Q(name_key__in=name_keys[i:i + 400])
+            rows.update((obj.pk, obj) for obj in self.filter(lookup).exclude(pk__in=exclude))
+
+        # the oldest author comes first when several share a name
+        found, by_name, without_orcid = {}, defaultdict(list), defaultdict(list)
+        for pk in sorted(rows):
+            obj = rows[pk]
+            if obj.orcid_id in names:
+                found[obj.orcid_id] = obj
+            by_name[obj.name_key].append(obj)
+            if obj.orcid_id is None:
+                without_orcid[obj.name_key].append(obj)
+
+        remaining = {key: make_name_key(*name) for key, name in names.items() if key not in found}
+        claimed = {obj.pk for obj in found.values()}
+        for key, name_key in remaining.items():
+            candidates = (without_orcid if isinstance(key, str) else by_name)[name_key]
+            obj = next((obj for obj in candidates if obj.pk not in claimed), None)
+            if obj is not None:
+                found[key] = obj
+                claimed.add(obj.pk)
+        return found
+
+    def search(self, term):
+        """Return the authors whose ORCID iD is term, or whose name starts 
+        with term either family or given name first, so searches can use the 
+        indexes on the iD and name keys. Terms made of ORCID digits match 
+        any part of an ORCID iD."""
+        orcid_id = normalize_orcid(term)
+        if orcid_id:
+            return self.filter(orcid_id=orcid_id)
+        names = Q(name_key__startswith=term) | Q(given_key__startswith=term)
+        if ORCID_PART.match(term.strip()):
+            return self.filter(names | Q(orcid_id__contains=term.strip().upper()))
+        return self.filter(names)
+
+    def fill_lookup_keys(self, fields=None, batch_size=None):
+        """Recompute the lookup keys of every author, or only those in fields, 
+        and save the ones that changed. Returns the number of authors updated."""
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        fields = fields or list(self.model.lookup_keys)
+        updated, last_pk = 0, 0
+        while True:
+            authors = list(self.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not authors:
+                return updated
+            last_pk = authors[-1].pk
+            changed = []
+            for author in authors:
+                old = [getattr(author, name) for name in fields]
+                author.update_lookup_keys()
+                if old != [getattr(author, name) for name in fields]:
+                    changed.append(author)
+            # save only the keys asked for, without recomputing them
+            super().bulk_update(changed, fields)
+            updated += len(changed)
+
+    def merge_orcid_duplicates(self, batch_size=None):
+        """Merge authors sharing an ORCID iD into the oldest of them and fill 
+        in `orcid_id` for every author with an ORCID.
+
+        Works linked to a duplicate are moved to the author that is kept, 
+        keeping their position, and blank fields of that author are filled 
+        in from its duplicates. Each batch of ORCID iDs is merged in its own 
+        transaction. Returns a dict with the number of authors merged away 
+        and the number of ORCID iDs filled in.
+        """
+        batch_size = batch_size or settings.CROSSREF_BATCH_SIZE
+        groups = defaultdict(list)
+        current = {}
+        authors = (self.exclude(ORCID__isnull=True).exclude(ORCID='')
+            .order_by('pk').values_list('pk', 'ORCID', 'orcid_id'))
+        for pk, orcid, orcid_id in authors.iterator():
+            if normalize_orcid(orcid):
+                groups[normalize_orcid(orcid)].append(pk)
+                current[pk] = orcid_id
+
+        field = get_work_model()._meta.get_field('author')
+        through = field.remote_field.through
+        work_name, author_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+        sort_name = field.sort_value_field_name
+
+        merged = updated = 0
+        for batch in chunked(groups.items(), batch_size):
+            with transaction.atomic(using=self.db):
+                duplicates = {pk: pks[0] for orcid_id, pks in batch for pk in pks[1:]}
+                if duplicates:
+                    self._merge_authors(duplicates, through, work_name, author_name, sort_name)
+                    merged += len(duplicates)
+                changed = [self.model(pk=pks[0], orcid_id=orcid_id) 
+                    for orcid_id, pks in batch if current[pks[0]] != orcid_id]
+                self.bulk_update(changed, ['orcid_id'])
+                updated += len(changed)
+
+        return {'merged': merged, 'updated': updated}
+
+    def _merge_authors(self, duplicates, through, work_name, author_name, sort_name):
+        """Merge the authors in duplicates, a dict of {duplicate pk: pk kept}."""
+        kept = self.in_bulk(set(duplicates.values()))
+        blank_fields = [f.name for f in self.model._meta.fields 
+            if f.name not in ('id', 'ORCID', *self.model.lookup_keys)]
+        for duplicate in self.filter(pk__in=duplicates).order_by('pk'):
+            author = kept[duplicates[duplicate.pk]]
+            for name in blank_fields:
+                if getattr(author, name) in (None, '') and getattr(duplicate, name) not in (None, ''):
+                    setattr(author, name, getattr(duplicate, name))
+        self.bulk_update(kept.values(), blank_fields)
 
-        
\ No newline at end of file
+        # each work keeps the first of its links to any author of a group
+        links = (through.objects
+            .filter(**{f'{author_name}__in': [*duplicates, *kept]})
+            .order_by(sort_name)
+            .values_list('pk', f'{work_name}_id', f'{author_name}_id'))
+        seen, delete, move = set(), [], defaultdict(list)
+        for pk, work_id, author_id in links:
+            keep_id = duplicates.get(author_id, author_id)
+            if (work_id, keep_id) in seen:
+                delete.append(pk)
+                continue
+            seen.add((work_id, keep_id))
+            if keep_id != author_id:
+                move[keep_id].append(pk)
+        through.objects.filter(pk__in=delete).delete()
+        for keep_id, pks in move.items():
+            through.objects.filter(pk__in=pks).update(**{author_name: keep_id})
+        self.filter(pk__in=duplicates).delete()
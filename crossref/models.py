@@ -11,13 +11,14 @@ from django.utils.html import mark_safe
 from django.urls import reverse
 from django.db.models import F
 
-from .fields import ArrayField
+from .fields import ArrayField, NameKeyField
 from . import validators
 from solo.models import SingletonModel
 from crossref.conf import settings
 from .choices import STYLE_CHOICES
 from django.template.loader import render_to_string
-from .managers import WorkQuerySet
+from .managers import WorkQuerySet, FunderQuerySet, AuthorQuerySet
+from .utils import normalize_orcid, make_name_key, make_given_key, make_work_fingerprint
 
 class Settings(SingletonModel):
     
@@ -43,21 +44,60 @@ class Settings(SingletonModel):
 
 
 class Author(models.Model):
+    objects = AuthorQuerySet.as_manager()
+
     prefix = models.CharField(max_length=32, blank=True, null=True)
     given = models.CharField(max_length=64, blank=True, null=True)
     family = models.CharField(max_length=64, blank=True)
     suffix = models.CharField(max_length=32, blank=True, null=True)
     ORCID = models.CharField(max_length=64, blank=True, null=True)
     authenticated_orcid = models.BooleanField(null=True, default=None)
+    orcid_id = models.CharField(_('ORCID iD'),
+        help_text=_('The bare ORCID iD, derived from ORCID and used to match authors'),
+        max_length=19, 
+        blank=True, null=True, editable=False)
+    name_key = NameKeyField(_('name key'),
+        help_text=_('Family and given name, case folded and stripped of accents and punctuation, used to match and search authors'),
+        max_length=129, 
+        blank=True, editable=False, db_index=True)
+    given_key = NameKeyField(_('given name key'),
+        help_text=_('Given and family name, normalized like the name key, used to search authors by given name'),
+        max_length=129, 
+        blank=True, editable=False, db_index=True)
+
+    #: columns derived from other fields and the fields they are derived from
+    lookup_keys = {
+        'orcid_id': ['ORCID'],
+        'name_key': ['given', 'family'],
+        'given_key': ['given', 'family'],
+    }
     
     class Meta:
         db_table='work_author'
         verbose_name = _('author')
         verbose_name_plural =  _('authors')
         ordering = ['family']
+        constraints = [
+            models.UniqueConstraint(fields=['orcid_id'], 
+                condition=models.Q(orcid_id__isnull=False), 
+                name='unique_author_orcid_id'),
+        ]
         
     def __str__(self):
         return self.name()
+
+    def save(self, *args, **kwargs):
+        self.update_lookup_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = self._meta.model.objects.with_lookup_keys(update_fields)
+        super().save(*args, **kwargs)
+
+    def update_lookup_keys(self):
+        """Recompute the columns in `lookup_keys`."""
+        self.orcid_id = normalize_orcid(self.ORCID)
+        self.name_key = make_name_key(self.given, self.family)
+        self.given_key = make_given_key(self.given, self.family)
     
     @property
     def reverse(self):
@@ -72,7 +112,7 @@ class Author(models.Model):
 
     @staticmethod
     def autocomplete_search_fields():
-        return ("family__icontains", "given__icontains",)
+        return ("name_key__startswith", "given_key__startswith", "orcid_id__startswith")
 
     def name(self):
         """Returns John Smith"""
@@ -160,7 +200,11 @@ class Work(models.Model):
         blank=True)
 
     last_queried_crossref = models.DateTimeField(_('last Crossref query'), 
-                                                 blank=True, null=True, editable=False)
+                                                 blank=True, null=True, editable=False, db_index=True)
+    fingerprint = models.CharField(_('fingerprint'),
+        help_text=_('Hash of the normalized title, first author family name and year, used to find duplicates'),
+        max_length=40, 
+        blank=True, null=True, editable=False, db_index=True)
 
     class Meta:
         verbose_name = _('work')
@@ -171,6 +215,30 @@ class Work(models.Model):
     def __str__(self):
         return self.label
 
+    #: fields the fingerprint is made from, besides the first author
+    fingerprint_fields = {'title', 'published'}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.update_fingerprint()
+        elif self.fingerprint_fields & set(update_fields):
+            self.update_fingerprint()
+            if 'fingerprint' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'fingerprint']
+        super().save(*args, **kwargs)
+
+    def update_fingerprint(self, family=None):
+        """Recompute the fingerprint. The family name of the first author is 
+        read from prefetched authors or the database unless given."""
+        if family is None and self.pk:
+            if 'author' in getattr(self, '_prefetched_objects_cache', {}):
+                first = next(iter(self.author.all()), None)
+                family = first.family if first else None
+            else:
+                family = self.author.values_list('family', flat=True).first()
+        self.fingerprint = make_work_fingerprint(self.title, family, self.year)
+
     @staticmethod
     def autocomplete_search_fields():
         return ("title__icontains", "author__family__icontains", "label__icontains",)
@@ -206,7 +274,7 @@ class Work(models.Model):
             return ' & '.join(authors)
 
     def can_update_from_crossref(self):
-        if self.crossref_last_queried and (timezone.now() - td(hours=24)) < self.crossref_last_queried: 
+        if self.last_queried_crossref and (timezone.now() - td(hours=24)) < self.last_queried_crossref: 
             return False
         return True
 
@@ -215,7 +283,22 @@ class Work(models.Model):
         return render_to_string(f"crossref/styles/{style}/bibliography.html", {'pub': self})
    
     
+def update_fingerprints(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Recompute `Work.fingerprint` when the authors of works change. 
+    Connected to m2m_changed of Work.author."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        works = model._default_manager.filter(pk__in=pk_set or [])
+    else:
+        works = [instance]
+    for work in works:
+        work.update_fingerprint()
+        type(work)._default_manager.filter(pk=work.pk).update(fingerprint=work.fingerprint)
+
+    
 class Funder(models.Model):
+    objects = FunderQuerySet.as_manager()
 
     id = models.CharField(max_length=255, primary_key=True)
     location = models.CharField(max_length=255)
@@ -236,3 +319,84 @@ class Funder(models.Model):
     @staticmethod
     def autocomplete_search_fields():
         return ("name__icontains", "id__iexact", )
+
+
+class Harvest(models.Model):
+    """Checkpoint of a cursor deep-paged harvest of Crossref works."""
+
+    filter = models.CharField(_('filter'), 
+        help_text=_('Crossref filter of the harvest, e.g. orcid:0000-0003-3762-7336'),
+        max_length=255, 
+        unique=True)
+    cursor = models.TextField(_('cursor'), default='*')
+    total_results = models.PositiveIntegerField(_('total results'), 
+        blank=True, null=True)
+    harvested = models.PositiveIntegerField(_('harvested'), default=0)
+    finished = models.DateTimeField(_('finished'), 
+        blank=True, null=True)
+    modified = models.DateTimeField(_('last modified'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('harvest')
+        verbose_name_plural = _('harvests')
+
+    def __str__(self):
+        return self.filter
+
+
+class ImportJob(models.Model):
+    """A BibTeX file imported in the background by the crossref_worker 
+    command, see `crossref.jobs`."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _('pending')),
+        (RUNNING, _('running')),
+        (FINISHED, _('finished')),
+        (FAILED, _('failed')),
+    ]
+
+    name = models.CharField(_('file name'), max_length=255, blank=True)
+    source = models.TextField(_('BibTeX source'))
+    status = models.CharField(_('status'), 
+        max_length=16, 
+        choices=STATUS_CHOICES, 
+        default=PENDING, 
+        db_index=True)
+    total = models.PositiveIntegerField(_('entries'), 
+        blank=True, null=True)
+    processed = models.PositiveIntegerField(_('processed'), default=0)
+    created_count = models.PositiveIntegerField(_('created'), default=0)
+    skipped_count = models.PositiveIntegerField(_('skipped'), default=0)
+    failed_count = models.PositiveIntegerField(_('failed'), default=0)
+    report = models.JSONField(_('report'), 
+        help_text=_('Citation keys and reasons of the skipped and failed entries'),
+        default=dict, blank=True)
+    error = models.TextField(_('error'), blank=True)
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    worker = models.CharField(_('worker'), max_length=255, blank=True)
+    heartbeat = models.DateTimeField(_('last heartbeat'), 
+        blank=True, null=True)
+    created = models.DateTimeField(_('created'), auto_now_add=True)
+    finished = models.DateTimeField(_('finished'), 
+        blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('import job')
+        verbose_name_plural = _('import jobs')
+        ordering = ['-created']
+
+    def __str__(self):
+        return self.name or f"{_('import job')} {self.pk}"
+
+    def report_sections(self):
+        """Return the (key, listed results, number not listed) of the 
+        skipped and failed entries."""
+        sections = []
+        for key, count in (('skipped', self.skipped_count), ('failed', self.failed_count)):
+            listed = self.report.get(key, [])
+            sections.append((key, listed, count - len(listed)))
+        return sections
@@ -6,7 +6,11 @@ __author__ = 'Lucas Theis <lucas@theis.io>'
 __docformat__ = 'epytext'
 __version__ = '1.2.0'
 
+import io
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # special character mapping
 special_chars = (
@@ -42,6 +46,86 @@ special_chars = (
 	(r'{\i}', 'ı'), (r'\.{I}', 'İ'), ('\\u{g}', 'ğ'), ('\\u{G}', 'Ğ'), (r'\c{s}', 'ş'), (r'\c{S}', 'Ş'))  # turkish
 
 
+special_chars_map = dict(special_chars)
+# the H{a} style keys are meant for the Hungarian umlaut, \H{a}
+special_chars_map.update(('\\' + key, value) for key, value in special_chars if key.startswith('H{'))
+
+
+def _trie_pattern(keys):
+	"""
+	Builds a regular expression matching any of the keys, nested by common
+	prefix so that each position of the string is rejected after a single
+	character in most cases.
+	@type  keys: iterable
+	@param keys: literal strings to match
+	@rtype: string
+	"""
+	trie = {}
+	for key in keys:
+		node = trie
+		for char in key:
+			node = node.setdefault(char, {})
+		node[''] = {}
+
+	def build(node):
+		branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+		if not branches:
+			return ''
+		pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+		# a key ending here is shorter than those continuing, so try it last
+		return '(?:' + pattern + ')?' if '' in node else pattern
+
+	return build(trie)
+
+
+# all the escapes in one expression, followed by the generic rule that drops
+# other accents
+special_chars_pattern = re.compile(
+	_trie_pattern(special_chars_map) + r'|\\[cuHvs]{?([a-zA-Z])}?')
+
+
+def _replace_special_char(match):
+	if match.lastindex:
+		return match.group(1)
+	return special_chars_map[match.group(0)]
+
+
+def replace_special_chars(string):
+	"""
+	Replaces LaTeX escapes of special characters with the characters, in a
+	single pass over the string.
+	@type  string: string
+	@param string: BibTex source
+	@rtype: string
+	"""
+	return special_chars_pattern.sub(_replace_special_char, string)
+
+
+def clean_value(key, value):
+	"""
+	Strips the quotes or braces around a field value and normalizes it.
+	@type  key: string
+	@param key: lower case field name
+	@type  value: string
+	@param value: raw field value
+	@rtype: string
+	"""
+	if value and value[0] == '"' and value[-1] == '"':
+		value = value[1:-1]
+	if value and value[0] == '{' and value[-1] == '}':
+		value = value[1:-1]
+	if key not in ['booktitle', 'title']:
+		value = value.replace('}', '').replace('{', '')
+	if key in ['pages']:
+		value = value.replace(" ","").replace("--","-")
+	else:
+		if value.startswith('{') and value.endswith('}'):
+			value = value[1:]
+			value = value[:-1]
+	value = value.strip()
+	return re.sub(r'\s+', ' ', value)
+
+
 def parse(string):
 	"""
 	Takes a string in BibTex format and returns a list of BibTex entries, where
@@ -56,9 +140,7 @@ def parse(string):
 	bib = []
 
 	# replace special characters
-	for key, value in special_chars:
-		string = string.replace(key, value)
-	string = re.sub(r'\\[cuHvs]{?([a-zA-Z])}?', r'\1', string)
+	string = replace_special_chars(string)
 
 	# split into BibTex entries
 	entries = re.findall(
@@ -73,24 +155,208 @@ def parse(string):
 		bib.append({'type': entry[0].lower(), 'label': entry[1]})
 
 		for key, value in pairs:
-			# post-process key and value
+			# store pair in bibliography
 			key = key.lower()
-			if value and value[0] == '"' and value[-1] == '"':
-				value = value[1:-1]
-			if value and value[0] == '{' and value[-1] == '}':
-				value = value[1:-1]
-			if key not in ['booktitle', 'title']:
-				value = value.replace('}', '').replace('{', '')
-			if key in ['pages']:
-				value = value.replace(" ","").replace("--","-")
-			else:
-				if value.startswith('{') and value.endswith('}'):
-					value = value[1:]
-					value = value[:-1]
-			value = value.strip()
-			value = re.sub(r'\s+', ' ', value)
+			bib[-1][key] = clean_value(key, value)
 
-			# store pair in bibliography
-			bib[-1][key] = value
+	return bib
+
+
+# entry types that hold no bibliographic data
+SKIPPED_TYPES = ('comment', 'preamble', 'string')
+
+ENTRY_START = re.compile(r'@[ \t]*(\w+)[ \t]*([{(])')
+DELIMITERS = re.compile(r'[{}()]')
+
+
+def iter_raw_entries(f, chunk_size=65536):
+	"""
+	Reads BibTex from a file object in chunks and yields the type and body of
+	each entry, by tracking the depth of braces rather than matching the
+	whole file with one regex. Only the entry being read is held in memory.
+	@type  f: file
+	@param f: text file object
+	@type  chunk_size: int
+	@param chunk_size: number of characters read at a time
+	@rtype: generator
+	@return: (type, body) pairs, where body is the text between the delimiters
+	"""
+	buf = ''
+	while True:
+		match = ENTRY_START.search(buf)
+		if match is None:
+			chunk = f.read(chunk_size)
+			if not chunk:
+				return
+			# keep a possible partial entry header
+			start = buf.rfind('@')
+			buf = (buf[start:] if start >= 0 else '') + chunk
+			continue
+
+		closing = '}' if match.group(2) == '{' else ')'
+		depth, pos = 0, match.end()
+		while True:
+			delimiter = DELIMITERS.search(buf, pos)
+			if delimiter is None:
+				chunk = f.read(chunk_size)
+				if not chunk:
+					# unterminated entry at the end of the file
+					return
+				pos = len(buf)
+				buf += chunk
+				continue
+			char, pos = delimiter.group(), delimiter.end()
+			if char == closing and depth == 0:
+				break
+			if char == '{':
+				depth += 1
+			elif char == '}':
+				depth = max(depth - 1, 0)
+
+		entry_type, body = match.group(1).lower(), buf[match.end():pos - 1]
+		buf = buf[pos:]
+		if entry_type not in SKIPPED_TYPES:
+			yield entry_type, body
+
+
+def split_fields(body):
+	"""
+	Splits the body of an entry into its label and (key, value) pairs,
+	keeping braced and quoted values together.
+	@type  body: string
+	@param body: text between the delimiters of an entry
+	@rtype: tuple
+	@return: the label and a list of (key, raw value) pairs
+	"""
+	label, sep, rest = body.partition(',')
+	if not sep:
+		return body.strip(), []
+	pairs = []
+	i, n = 0, len(rest)
+	while i < n:
+		eq = rest.find('=', i)
+		if eq < 0:
+			break
+		key = rest[i:eq].strip(' \t\r\n,')
+		i = eq + 1
+		while i < n and rest[i].isspace():
+			i += 1
+		start, depth, quoted = i, 0, False
+		while i < n:
+			char = rest[i]
+			if char == '{':
+				depth += 1
+			elif char == '}':
+				depth -= 1
+			elif char == '"' and depth == 0:
+				quoted = not quoted
+			elif char == ',' and depth == 0 and not quoted:
+				break
+			i += 1
+		pairs.append((key, rest[start:i].strip()))
+		i += 1
+	return label.strip(), [(key, value) for key, value in pairs if key]
+
+
+def iparse(f, chunk_size=65536):
+	"""
+	Reads BibTex from a file object and yields its entries one at a time, as
+	dictionaries in the same form as returned by L{parse}. Memory use does
+	not grow with the size of the file, and the first entry is yielded as
+	soon as it has been read.
+	@type  f: file
+	@param f: text file object
+	@type  chunk_size: int
+	@param chunk_size: number of characters read at a time
+	@rtype: generator
+	@return: dictionaries representing BibTex entries
+	"""
+	for entry_type, body in iter_raw_entries(f, chunk_size):
+		label, pairs = split_fields(replace_special_chars(body))
+		entry = {'type': entry_type, 'label': label}
+		for key, value in pairs:
+			key = key.lower()
+			entry[key] = clean_value(key, value)
+		yield entry
+
+
+def _find_boundary(text):
+	"""
+	Returns the position of the last line of text starting with an entry
+	header outside of any braces, or -1 if there is none.
+	@type  text: string
+	@param text: BibTex source
+	@rtype: int
+	"""
+	# depth of braces at end, walking back one candidate line at a time
+	end = len(text)
+	depth = text.count('{') - text.count('}')
+	while True:
+		pos = text.rfind('\n@', 0, end)
+		if pos < 0:
+			return -1
+		depth -= text.count('{', pos, end) - text.count('}', pos, end)
+		if depth == 0 and ENTRY_START.match(text, pos + 1):
+			return pos + 1
+		end = pos
+
+
+def split_chunks(f, chunk_size=4194304):
+	"""
+	Reads BibTex from a file object and yields pieces of roughly chunk_size
+	characters, split only at the start of an entry, so that each piece can
+	be parsed on its own. A line starting with @ inside a braced value is
+	not taken for the start of an entry.
+	@type  f: file
+	@param f: text file object
+	@type  chunk_size: int
+	@param chunk_size: number of characters read at a time
+	@rtype: generator
+	@return: strings of whole BibTex entries
+	"""
+	buf = ''
+	while True:
+		chunk = f.read(chunk_size)
+		if not chunk:
+			if buf.strip():
+				yield buf
+			return
+		buf += chunk
+		boundary = _find_boundary(buf)
+		if boundary > 0:
+			yield buf[:boundary]
+			buf = buf[boundary:]
+
+
+def _parse_chunk(string):
+	return list(iparse(io.StringIO(string)))
+
+
+def pparse(f, workers=None, chunk_size=4194304):
+	"""
+	Reads BibTex from a file object and yields its entries as L{iparse} does,
+	parsing pieces of the file in a pool of worker processes. Entries are
+	yielded in the order of the file, and at most two pieces per worker are
+	held in memory at a time.
+	@type  f: file
+	@param f: text file object
+	@type  workers: int
+	@param workers: number of processes, defaults to the number of CPUs
+	@type  chunk_size: int
+	@param chunk_size: number of characters parsed by a worker at a time
+	@rtype: generator
+	@return: dictionaries representing BibTex entries
+	"""
+	workers = workers or os.cpu_count() or 1
+	if workers == 1:
+		yield from iparse(f)
+		return
 
-	return bib
\ No newline at end of file
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		pending = deque()
+		for chunk in split_chunks(f, chunk_size):
+			pending.append(executor.submit(_parse_chunk, chunk))
+			if len(pending) >= 2 * workers:
+				yield from pending.popleft().result()
+		while pending:
+			yield from pending.popleft().result()
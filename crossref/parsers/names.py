@@ -0,0 +1,108 @@
+"""Parse BibTeX author and editor fields into names.
+
+Follows the rules of BibTeX itself: names are separated by 'and' and each
+name is written as "First von Last", "von Last, First" or
+"von Last, Jr, First". Text in braces is kept together and is never
+treated as a separator or a lower case "von" particle.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+AND = re.compile(r'\s+and\s+', re.IGNORECASE)
+COMMA = re.compile(r',')
+WHITESPACE = re.compile(r'[\s~]+')
+
+BibtexName = namedtuple('BibtexName', ['first', 'von', 'last', 'jr'])
+BibtexName.__doc__ = """The four parts of a BibTeX name, each a string."""
+
+
+def split_top_level(value, separator):
+    """Split value on the regex separator, ignoring matches inside braces."""
+    parts, depth, start = [], 0, 0
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            match = separator.match(value, i)
+            if match and match.end() > i:
+                parts.append(value[start:i])
+                start = i = match.end()
+                continue
+        i += 1
+    parts.append(value[start:])
+    return parts
+
+
+def is_von(token):
+    """A token is part of the von particle if its first letter outside
+    braces is lower case, e.g. 'van', 'de' or 'von'."""
+    depth = 0
+    for char in token:
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif depth == 0 and char.isalpha():
+            return char.islower()
+    return False
+
+
+def strip_braces(value):
+    return ' '.join(value.replace('{', '').replace('}', '').split())
+
+
+@lru_cache(maxsize=4096)
+def parse_name(name):
+    """Return the `BibtexName` for a single name. Cached, as the same names
+    repeat throughout a bibliography."""
+    parts = [split_top_level(part.strip(), WHITESPACE) for part in split_top_level(name.strip(), COMMA)]
+    parts = [[token for token in part if token] for part in parts]
+
+    if len(parts) == 1:
+        # First von Last
+        tokens = parts[0]
+        if not tokens:
+            return BibtexName('', '', '', '')
+        last = [tokens.pop()]
+        von_positions = [i for i, token in enumerate(tokens) if is_von(token)]
+        if von_positions:
+            first = tokens[:von_positions[0]]
+            von = tokens[von_positions[0]:von_positions[-1] + 1]
+            last = tokens[von_positions[-1] + 1:] + last
+        else:
+            first, von = tokens, []
+        jr = []
+    else:
+        # von Last, First or von Last, Jr, First
+        tokens = parts[0]
+        first = parts[-1]
+        jr = parts[1] if len(parts) > 2 else []
+        von = []
+        # the last token is always part of Last
+        while len(tokens) > 1 and is_von(tokens[0]):
+            von.append(tokens.pop(0))
+        last = tokens
+
+    return BibtexName(*(strip_braces(' '.join(part)) for part in (first, von, last, jr)))
+
+
+def parse_names(value):
+    """Return a list of author dicts, with given, family and suffix, from a
+    BibTeX name list such as "Jennings, S. and van der Berg, J.". The von
+    particle is kept as part of the family name, as Crossref does."""
+    authors = []
+    for name in split_top_level(value.strip(), AND):
+        name = parse_name(name)
+        family = ' '.join(part for part in (name.von, name.last) if part)
+        if not family:
+            continue
+        author = {'given': name.first, 'family': family}
+        if name.jr:
+            author['suffix'] = name.jr
+        authors.append(author)
+    return authors
@@ -0,0 +1,276 @@
+"""Rate limiting, retries, circuit breaking and request coalescing shared by 
+every process that talks to Crossref."""
+import asyncio
+import hashlib
+import random
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from crossref.conf import settings
+from crossref.exceptions import CrossrefUnavailable
+
+
+def parse_interval(value):
+    """Convert an X-Rate-Limit-Interval header such as '1s' to seconds."""
+    value = value.strip().lower()
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    for unit in sorted(units, key=len, reverse=True):
+        if value.endswith(unit):
+            return float(value[:-len(unit)]) * units[unit]
+    return float(value)
+
+
+class RateLimiter:
+    """A token bucket shared through the Django cache.
+
+    Each process takes a token before every request to Crossref, so
+    gunicorn workers and import jobs that share a cache (e.g. Redis or
+    Memcached) also share a single allowance. The bucket holds
+    `CROSSREF_RATE_LIMIT` tokens and is refilled every
+    `CROSSREF_RATE_LIMIT_INTERVAL` seconds. Those defaults are replaced by
+    the X-Rate-Limit-Limit and X-Rate-Limit-Interval headers as soon as
+    Crossref sends them.
+
+    Django's cache API has no compare-and-set, so the bucket is refilled in
+    one go at the start of each interval: tokens are counted with the atomic
+    `incr` on a key for the current interval.
+    """
+
+    policy_key = 'crossref:ratelimit:policy'
+
+    @property
+    def enabled(self):
+        return settings.CROSSREF_RATE_LIMIT is not None
+
+    @property
+    def cache(self):
+        return caches[settings.CROSSREF_RATE_LIMIT_CACHE]
+
+    def get_policy(self):
+        """Return the current (limit, interval)."""
+        return self.cache.get(self.policy_key) or (settings.CROSSREF_RATE_LIMIT, settings.CROSSREF_RATE_LIMIT_INTERVAL)
+
+    def update(self, headers):
+        """Adopt the rate limit advertised in the headers of a Crossref response."""
+        if not self.enabled:
+            return
+        try:
+            policy = (int(headers['X-Rate-Limit-Limit']), parse_interval(headers['X-Rate-Limit-Interval']))
+        except (KeyError, ValueError):
+            return
+        if policy != self.get_policy():
+            self.cache.set(self.policy_key, policy, None)
+
+    def take(self):
+        """Take a token, returning 0 on success or the number of seconds to
+        wait before trying again."""
+        if not self.enabled:
+            return 0
+        limit, interval = self.get_policy()
+        now = time.time()
+        window = int(now // interval)
+        key = f'crossref:ratelimit:{window}'
+        self.cache.add(key, 0, int(interval) + 1)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # the key expired between add and incr
+            self.cache.add(key, 1, int(interval) + 1)
+            count = 1
+        if count <= limit:
+            return 0
+        return (window + 1) * interval - now
+
+    def throttle(self):
+        """Block until a token is available."""
+        while (delay := self.take()) > 0:
+            time.sleep(delay)
+
+    async def athrottle(self):
+        """Async version of `throttle`. Tokens are taken from a thread, as
+        cache backends such as the database are sync only."""
+        while (delay := await sync_to_async(self.take)()) > 0:
+            await asyncio.sleep(delay)
+
+    async def aupdate(self, headers):
+        """Async version of `update`."""
+        await sync_to_async(self.update)(headers)
+
+
+def backoff(attempt, retry_after=None):
+    """Return the seconds to wait before retry number attempt (starting at 0).
+
+    Uses exponential backoff with full jitter, or the Retry-After header 
+    when Crossref sends one. Never waits longer than `CROSSREF_RETRY_MAX_DELAY`.
+    """
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = random.uniform(0, settings.CROSSREF_RETRY_BACKOFF * 2 ** attempt)
+    return min(delay, settings.CROSSREF_RETRY_MAX_DELAY)
+
+
+class CircuitBreaker:
+    """Stops requests to Crossref for a while after repeated failures.
+
+    After `CROSSREF_CIRCUIT_BREAKER_THRESHOLD` consecutive failed requests 
+    the circuit opens and every request raises `CrossrefUnavailable` 
+    straight away for `CROSSREF_CIRCUIT_BREAKER_COOLDOWN` seconds. The next 
+    request after the cooldown is let through; a single further failure 
+    opens the circuit again, a success closes it. State is kept in the same 
+    cache as the rate limiter so all processes trip together.
+    """
+
+    failures_key = 'crossref:circuit:failures'
+    open_key = 'crossref:circuit:open'
+
+    @property
+    def enabled(self):
+        return settings.CROSSREF_CIRCUIT_BREAKER_THRESHOLD is not None
+
+    @property
+    def cache(self):
+        return caches[settings.CROSSREF_RATE_LIMIT_CACHE]
+
+    def check(self):
+        """Raise CrossrefUnavailable if the circuit is open."""
+        if self.enabled and self.cache.get(self.open_key):
+            raise CrossrefUnavailable(
+                "Crossref is unavailable after repeated failures, try again later")
+
+    def record_success(self):
+        if self.enabled and self.cache.get(self.failures_key):
+            self.cache.delete(self.failures_key)
+
+    def record_failure(self):
+        if not self.enabled:
+            return
+        threshold = settings.CROSSREF_CIRCUIT_BREAKER_THRESHOLD
+        cooldown = settings.CROSSREF_CIRCUIT_BREAKER_COOLDOWN
+        self.cache.add(self.failures_key, 0, cooldown * 2)
+        try:
+            failures = self.cache.incr(self.failures_key)
+        except ValueError:
+            self.cache.add(self.failures_key, 1, cooldown * 2)
+            failures = 1
+        if failures >= threshold:
+            self.cache.set(self.open_key, True, cooldown)
+            # one more failure after the cooldown opens the circuit again
+            self.cache.set(self.failures_key, threshold - 1, cooldown * 2)
+
+    async def acheck(self):
+        """Async version of `check`. The cache is read from a thread, as 
+        cache backends such as the database are sync only."""
+        await sync_to_async(self.check)()
+
+    async def arecord_success(self):
+        await sync_to_async(self.record_success)()
+
+    async def arecord_failure(self):
+        await sync_to_async(self.record_failure)()
+
+
+def get_lease_timeout():
+    """Return `CROSSREF_LEASE_TIMEOUT`, or by default the longest a lookup 
+    can take: every attempt timing out after the longest delay between 
+    retries, plus one more timeout to save the result."""
+    if settings.CROSSREF_LEASE_TIMEOUT is not None:
+        return settings.CROSSREF_LEASE_TIMEOUT
+    retries = settings.CROSSREF_MAX_RETRIES
+    return settings.CROSSREF_TIMEOUT * (retries + 2) + settings.CROSSREF_RETRY_MAX_DELAY * retries
+
+
+class Lease:
+    """A lease on a key held in the shared cache, used to make sure only one
+    caller across all processes does a piece of work at a time."""
+
+    def __init__(self, key, timeout=None):
+        self.key = f"crossref:lease:{hashlib.md5(key.encode()).hexdigest()}"
+        self.timeout = timeout or get_lease_timeout()
+        self.token = uuid.uuid4().hex
+
+    @property
+    def cache(self):
+        return caches[settings.CROSSREF_RATE_LIMIT_CACHE]
+
+    def acquire(self):
+        """Try to take the lease, returning True on success."""
+        return self.cache.add(self.key, self.token, self.timeout)
+
+    def release(self):
+        # don't release a lease that timed out and was taken by someone else
+        if self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+
+    def is_held(self):
+        return self.cache.get(self.key) is not None
+
+    def waits(self):
+        """Yield the delays to sleep for while the lease is held elsewhere, 
+        giving up once it should have timed out."""
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while self.is_held() and time.monotonic() < deadline:
+            yield delay
+            delay = min(delay * 2, 1)
+
+    async def aacquire(self):
+        """Async version of `acquire`. The async versions use the cache from 
+        a thread, as cache backends such as the database are sync only."""
+        return await sync_to_async(self.acquire)()
+
+    async def arelease(self):
+        await sync_to_async(self.release)()
+
+    async def await_release(self):
+        """Wait while the lease is held elsewhere, as `waits` does."""
+        deadline = time.monotonic() + self.timeout
+        delay = 0.05
+        while await sync_to_async(self.is_held)() and time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1)
+
+
+@contextmanager
+def single_flight(key, timeout=None):
+    """Coalesce concurrent work on key.
+
+    The first caller takes a lease on key and the block runs with True. Any
+    other caller waits for the lease to be released (or to time out after
+    `CROSSREF_LEASE_TIMEOUT` seconds) and the block then runs with False,
+    so it can reuse what the first caller produced::
+
+        with single_flight(doi) as leader:
+            if not leader:
+                ... # look for the result of the leader
+    """
+    lease = Lease(key, timeout)
+    if lease.acquire():
+        try:
+            yield True
+        finally:
+            lease.release()
+    else:
+        for delay in lease.waits():
+            time.sleep(delay)
+        yield False
+
+
+@asynccontextmanager
+async def asingle_flight(key, timeout=None):
+    """Async version of `single_flight`."""
+    lease = Lease(key, timeout)
+    if await lease.aacquire():
+        try:
+            yield True
+        finally:
+            await lease.arelease()
+    else:
+        await lease.await_release()
+        yield False
+
+
+limiter = RateLimiter()
+breaker = CircuitBreaker()
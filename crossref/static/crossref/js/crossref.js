@@ -30,6 +30,12 @@ function build_reference(item) {
 }
 
 function post_to_url() {
+  const item = $(this).select2('data')[0];
+  // local results, such as synced funders, already exist
+  if (item.admin_url) {
+    window.location = item.admin_url;
+    return;
+  }
   $.post({
     url: $(this).data()['post-Url'], 
     data: parseJSON($(this).select2('data')[0]),
@@ -5,7 +5,7 @@ from django.urls import reverse
 from django.db import transaction
 from django.template import Template, RequestContext
 from django.http import HttpRequest
-from crossref.models import Work
+from crossref.models import Work, Funder
 
 
 User = get_user_model()
@@ -1042,3 +1042,13 @@ class Tests(TestCase):
 
 	def test_import_bibtex_url(self):
 		self.assertEqual(self.client.get('/admin/crossref/work/import-bibtex', follow=True).status_code, 200)
+
+	def test_funder_search_is_local(self):
+		Funder.objects.upsert_from_crossref([self.funder_data])
+		response = self.client.get(reverse('admin:funder_search'), {'query': 'geoforschung'})
+		items = response.json()['message']['items']
+		self.assertEqual([item['id'] for item in items], ['501100010956'])
+		self.assertEqual(items[0]['admin_url'], reverse('admin:crossref_funder_change', args=['501100010956']))
+
+		response = self.client.get(reverse('admin:crossref_funder_changelist'))
+		self.assertContains(response, f'data-ajax--url="{reverse("admin:funder_search")}"')
@@ -0,0 +1,191 @@
+from copy import deepcopy
+from datetime import date
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from crossref.fields import CrossRefAuthorField
+from crossref.forms import WorkForm, BibtexForm
+from crossref.importer import BibtexImporter
+from crossref.models import Author, Work
+from crossref.parsers.names import parse_name, parse_names
+from .data import WORK
+
+
+class TestCrossRefAuthorField(TestCase):
+
+    def setUp(self):
+        self.field = CrossRefAuthorField(queryset=Author.objects.all())
+
+    def test_authors_keep_their_order(self):
+        form = WorkForm(deepcopy(WORK))
+        self.assertTrue(form.is_valid(), form.errors)
+        work = form.save()
+        self.assertEqual([a.family for a in work.author.all()], ['Jennings', 'Hasterok', 'Payne'])
+        self.assertEqual(work.label, 'Jennings2019')
+
+    def test_authors_are_resolved_in_bulk(self):
+        # one lookup, one insert, one lookup for the new primary keys and 
+        # the final check of the choices
+        with self.assertNumQueries(4):
+            self.field.clean(deepcopy(WORK['author']))
+        self.assertEqual(Author.objects.count(), 3)
+
+        # existing authors are only looked up
+        with self.assertNumQueries(2):
+            self.field.clean(deepcopy(WORK['author']))
+        self.assertEqual(Author.objects.count(), 3)
+
+    def test_only_changed_authors_are_updated(self):
+        self.field.clean(deepcopy(WORK['author']))
+        authors = deepcopy(WORK['author'])
+        authors[1]['ORCID'] = 'http://orcid.org/0000-0002-0000-0000'
+        with self.assertNumQueries(3):
+            cleaned = self.field.clean(authors)
+        self.assertEqual(cleaned[1].ORCID, 'http://orcid.org/0000-0002-0000-0000')
+        self.assertEqual(Author.objects.get(family='Jennings').ORCID, WORK['author'][0]['ORCID'])
+
+
+class TestOrcidMatching(TestCase):
+
+    def setUp(self):
+        self.field = CrossRefAuthorField(queryset=Author.objects.all())
+
+    def test_authors_are_matched_on_orcid(self):
+        author = Author.objects.create(given='John', family='Smith', ORCID='https://orcid.org/0000-0002-1825-0097')
+        self.assertEqual(author.orcid_id, '0000-0002-1825-0097')
+
+        cleaned = self.field.clean([{'given': 'J.', 'family': 'Smith', 'ORCID': 'http://orcid.org/0000-0002-1825-0097'}])
+        self.assertEqual(cleaned, [author])
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_names_only_match_authors_without_another_orcid(self):
+        other = Author.objects.create(given='J', family='Smith', ORCID='0000-0001-5109-3700')
+        cleaned = self.field.clean([{'given': 'J', 'family': 'Smith', 'ORCID': '0000-0002-1825-0097'}])
+        self.assertNotEqual(cleaned, [other])
+
+        # authors without an ORCID still match on their name
+        self.assertEqual(self.field.clean([{'given': 'J', 'family': 'Smith'}]), [other])
+
+    def test_same_name_with_and_without_orcid(self):
+        authors = Author.objects.resolve([
+            {'given': 'J', 'family': 'Smith', 'ORCID': '0000-0002-1825-0097'},
+            {'given': 'J', 'family': 'Smith'}])
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertNotEqual(authors[0], authors[1])
+        self.assertEqual([a.orcid_id for a in authors], ['0000-0002-1825-0097', None])
+
+    def test_same_name_with_and_without_orcid_of_an_existing_author(self):
+        existing = Author.objects.create(given='J', family='Smith')
+        authors = Author.objects.resolve([
+            {'given': 'J', 'family': 'Smith', 'ORCID': '0000-0002-1825-0097'},
+            {'given': 'J', 'family': 'Smith'}])
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(authors[0], existing)
+        self.assertNotEqual(authors[1], existing)
+
+    def test_merge_orcid_duplicates(self):
+        keep = Author.objects.create(given='John', family='Smith', ORCID='0000-0002-1825-0097')
+        duplicate = Author.objects.create(given='J.', family='Smith', prefix='Dr')
+        Author.objects.filter(pk__in=[keep.pk, duplicate.pk]).update(
+            ORCID='http://orcid.org/0000-0002-1825-0097', orcid_id=None)
+        coauthor = Author.objects.create(family='Jones')
+
+        both = Work.objects.create(label='Smith2020', published=date(2020, 1, 1))
+        both.author.set([coauthor, duplicate, keep])
+        one = Work.objects.create(label='Smith2021', published=date(2021, 1, 1))
+        one.author.set([duplicate, coauthor])
+
+        counts = Author.objects.merge_orcid_duplicates()
+        self.assertEqual(counts, {'merged': 1, 'updated': 1})
+
+        keep.refresh_from_db()
+        self.assertEqual(keep.orcid_id, '0000-0002-1825-0097')
+        self.assertEqual(keep.prefix, 'Dr')
+        self.assertFalse(Author.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(list(both.author.all()), [coauthor, keep])
+        self.assertEqual(list(one.author.all()), [keep, coauthor])
+
+
+class TestNameKey(TestCase):
+
+    def test_name_key_is_kept_up_to_date(self):
+        author = Author.objects.create(given='José  A.', family='Müller-Lüdenscheidt')
+        self.assertEqual(author.name_key, 'muller ludenscheidt jose a')
+
+        author.given = 'J.'
+        author.save(update_fields=['given'])
+        self.assertEqual(Author.objects.get().name_key, 'muller ludenscheidt j')
+
+        author.family = 'Meyer'
+        Author.objects.bulk_update([author], ['family'])
+        self.assertEqual(Author.objects.get().name_key, 'meyer j')
+
+    def test_names_are_matched_on_their_key(self):
+        author = Author.objects.create(given='J', family='Müller')
+        field = CrossRefAuthorField(queryset=Author.objects.all())
+        self.assertEqual(field.clean([{'given': 'J.', 'family': 'MULLER'}]), [author])
+
+    def test_prefix_search(self):
+        author = Author.objects.create(given='José', family='Müller')
+        Author.objects.create(given='Jane', family='Miller')
+        self.assertEqual(list(Author.objects.filter(name_key__startswith='Mül')), [author])
+        self.assertEqual(list(Author.objects.search('MULLER, jo')), [author])
+
+    def test_search_by_given_name_and_orcid(self):
+        author = Author.objects.create(given='John', family='Smith', ORCID='https://orcid.org/0000-0003-3762-7336')
+        Author.objects.create(given='Jane', family='Johnson')
+        # the given name of Smith and the family name of Johnson
+        self.assertEqual([a.family for a in Author.objects.search('john')], ['Johnson', 'Smith'])
+        self.assertEqual(list(Author.objects.search('John Sm')), [author])
+        self.assertEqual(list(Author.objects.search('3762-7336')), [author])
+
+    def test_fill_lookup_keys(self):
+        author = Author.objects.create(given='José', family='Müller')
+        Author.objects.update(name_key='', given_key='')
+        self.assertEqual(Author.objects.fill_lookup_keys(['name_key', 'given_key']), 1)
+        self.assertEqual(Author.objects.get(pk=author.pk).name_key, 'muller jose')
+        self.assertEqual(Author.objects.get(pk=author.pk).given_key, 'jose muller')
+
+
+class TestBibtexNames(TestCase):
+
+    def test_parse_names(self):
+        self.assertEqual(parse_names("Jennings, S. and van der Berg, Jr., J. P. and Donald E. Knuth"), [
+            {'given': 'S.', 'family': 'Jennings'},
+            {'given': 'J. P.', 'family': 'van der Berg', 'suffix': 'Jr.'},
+            {'given': 'Donald E.', 'family': 'Knuth'},
+        ])
+
+    def test_braces_are_kept_together(self):
+        self.assertEqual(parse_names("{Barnes and Noble} and Jean de la Fontaine"), [
+            {'given': '', 'family': 'Barnes and Noble'},
+            {'given': 'Jean', 'family': 'de la Fontaine'},
+        ])
+        self.assertEqual(parse_name("{von Neumann}, John").last, 'von Neumann')
+
+    def test_authors_of_a_batch_are_resolved_together(self):
+        existing = Author.objects.create(given='S.', family='Jennings')
+        entries = [
+            {'label': 'Jennings2019', 'ENTRYTYPE': 'misc', 'title': 'One', 'year': '2019', 'author': 'Jennings, S. and Hasterok, D.'},
+            {'label': 'Hasterok2019', 'ENTRYTYPE': 'misc', 'title': 'Two', 'year': '2019', 'author': 'Hasterok, D. and Payne, J.'},
+            {'label': 'Anon2019', 'ENTRYTYPE': 'misc', 'title': 'No authors', 'year': '2019'},
+        ]
+        importer = BibtexImporter(lookup_dois=False)
+        pending = [importer.validate(entry) for entry in entries]
+        with CaptureQueriesContext(connection) as queries:
+            importer.write(pending)
+        # one lookup, one insert and one lookup for the new primary keys
+        table = Author._meta.db_table
+        self.assertEqual(len([q for q in queries if f'"{table}"' in q['sql'].split(' WHERE ')[0]]), 3)
+
+        works = {work.label: [a.family for a in work.author.all()] for work in Work.objects.all()}
+        self.assertEqual(works, {'Jennings2019': ['Jennings', 'Hasterok'], 
+            'Hasterok2019': ['Hasterok', 'Payne'], 'Anon2019': []})
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Work.objects.get(label='Jennings2019').author.first(), existing)
+
+    def test_bibtex_form_keeps_author_order(self):
+        form = BibtexForm({'ID': 'Payne2019', 'author': 'Payne, J. and Hasterok, D.', 
+            'title': 'A title', 'published': '2019-01-01'})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual([a.family for a in form.save().author.all()], ['Payne', 'Hasterok'])
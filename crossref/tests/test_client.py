@@ -0,0 +1,140 @@
+import asyncio
+from json import JSONEncoder
+from unittest import mock
+import httpx
+import requests
+from requests import Response
+from requests.exceptions import HTTPError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, SimpleTestCase, override_settings
+from crossref.client import AsyncCrossref, ClientRegistry, Crossref, registry, make_headers
+from crossref.exceptions import CrossrefUnavailable
+from crossref.models import Settings
+
+
+class TestClientRegistry(TestCase):
+
+    def setUp(self):
+        registry.reset()
+
+    def test_client_is_reused(self):
+        self.assertIs(registry.get(), registry.get())
+
+    def test_client_is_rebuilt_when_settings_change(self):
+        client = registry.get()
+        config = Settings.get_solo()
+        config.ua_string = 'my-app/1.0'
+        config.save()
+
+        new_client = registry.get()
+        self.assertIsNot(client, new_client)
+        self.assertIn('my-app/1.0', new_client.session.headers['User-Agent'])
+
+    def test_settings_are_not_reread(self):
+        registry = ClientRegistry()
+        registry.get()
+        with self.assertNumQueries(0):
+            registry.get()
+
+    def test_make_headers(self):
+        headers = make_headers(api_key='secret', mailto='test@example.com')
+        self.assertIn('(mailto:test@example.com)', headers['User-Agent'])
+        self.assertEqual(headers['Crossref-Plus-API-Token'], 'Bearer secret')
+
+
+class TestAsyncClientRegistry(TestCase):
+
+    async def test_concurrent_coroutines_share_one_client(self):
+        registry = ClientRegistry()
+        old_client = await registry.aget()
+        registry._config = ('secret', '')
+        clients = await asyncio.gather(*(registry.aget() for i in range(10)))
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIsNot(clients[0], old_client)
+        self.assertTrue(old_client.http.is_closed)
+        await clients[0].aclose()
+
+    async def test_replaced_client_is_closed_after_requests_in_flight(self):
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def handler(request):
+            started.set()
+            await release.wait()
+            return httpx.Response(200, json={'message': {}})
+
+        client = AsyncCrossref()
+        client.http = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+        request = asyncio.ensure_future(client.works('10.1000/x'))
+        await started.wait()
+        await client.aclose()
+        self.assertFalse(client.http.is_closed)
+
+        release.set()
+        self.assertEqual(await request, {'message': {}})
+        self.assertTrue(client.http.is_closed)
+
+
+def make_response(status_code, json=None, headers=None):
+    response = Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = JSONEncoder().encode(json or {}).encode()
+    return response
+
+
+@override_settings(CROSSREF_RETRY_BACKOFF=0, CROSSREF_MAX_RETRIES=2, CROSSREF_CIRCUIT_BREAKER_THRESHOLD=2)
+class TestRetries(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Crossref()
+
+    def test_retryable_statuses_are_retried(self):
+        with mock.patch.object(self.client.session, 'get', side_effect=[
+                make_response(503), requests.Timeout(), make_response(200, {'message': {}})]) as get:
+            self.assertEqual(self.client.works('10.1000/x'), {'message': {}})
+        self.assertEqual(get.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        with mock.patch.object(self.client.session, 'get', return_value=make_response(404)) as get:
+            self.assertRaises(HTTPError, self.client.works, '10.1000/x')
+        self.assertEqual(get.call_count, 1)
+
+    def test_circuit_breaker_fails_fast(self):
+        with mock.patch.object(self.client.session, 'get', return_value=make_response(503)) as get:
+            for i in range(2):
+                self.assertRaises(HTTPError, self.client.works, '10.1000/x')
+            self.assertRaises(CrossrefUnavailable, self.client.works, '10.1000/x')
+        self.assertEqual(get.call_count, 6)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'crossref': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'crossref_test_cache'},
+    },
+    CROSSREF_RATE_LIMIT_CACHE='crossref', CROSSREF_RETRY_BACKOFF=0, CROSSREF_MAX_RETRIES=1,
+    CROSSREF_CIRCUIT_BREAKER_THRESHOLD=1,
+)
+class TestAsyncRetries(TestCase):
+    """The async client reaches sync only cache backends from a thread."""
+
+    def setUp(self):
+        call_command('createcachetable', 'crossref_test_cache')
+
+    async def test_circuit_breaker_fails_fast(self):
+        sent = []
+
+        async def handler(request):
+            sent.append(request)
+            return httpx.Response(503)
+
+        client = AsyncCrossref()
+        client.http = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+        with self.assertRaises(HTTPError):
+            await client.works('10.1000/x')
+        with self.assertRaises(CrossrefUnavailable):
+            await client.works('10.1000/x')
+        self.assertEqual(len(sent), 2)
+        await client.aclose()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from crossref.models import Work
+from .data import WORK
+from .test_managers import FakeClient
+from .test_parsers import BIBTEX
+
+
+class TestCrossrefRefresh(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = FakeClient()
+        for target in ('crossref.utils.get_crossref_client', 'crossref.managers.get_crossref_client'):
+            patcher = mock.patch(target, return_value=self.client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        Work.objects.bulk_get_or_query_crossref([WORK['DOI']])
+        Work.objects.update(title='Old title', volume='1', last_queried_crossref=None)
+
+    def refresh(self, *args):
+        out = StringIO()
+        call_command('crossref_refresh', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_does_not_save(self):
+        output = self.refresh('--dry-run')
+        self.assertIn('title, volume', output)
+        self.assertEqual(Work.objects.get().title, 'Old title')
+
+    def test_changed_fields_are_updated(self):
+        output = self.refresh()
+        self.assertIn('1 updated', output)
+
+        work = Work.objects.get()
+        self.assertEqual(work.title, WORK['title'][0])
+        self.assertIsNotNone(work.last_queried_crossref)
+
+        # the work is no longer stale
+        self.assertIn('0 updated, 0 unchanged', self.refresh('--since', '1d'))
+
+    def test_works_not_found_are_not_requeried(self):
+        Work.objects.create(label='Missing2020', DOI='10.0000/missing')
+        self.client.queried.clear()
+        self.assertIn('1 failed', self.refresh())
+        self.assertIsNotNone(Work.objects.get(label='Missing2020').last_queried_crossref)
+
+        self.client.queried.clear()
+        self.refresh('--since', '1d')
+        self.assertEqual(self.client.queried, [])
+
+    def test_labels_are_not_allocated(self):
+        with mock.patch('crossref.labels.LabelAllocator.allocate') as allocate:
+            self.assertIn('1 updated', self.refresh())
+        allocate.assert_not_called()
+
+
+class TestCrossrefImportBibtex(TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bib')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(BIBTEX)
+        self.addCleanup(os.remove, self.path)
+
+    def test_import_with_workers(self):
+        out = StringIO()
+        call_command('crossref_import_bibtex', self.path, '--workers', '2', '--no-lookup', stdout=out)
+        self.assertIn('3 created', out.getvalue())
+        self.assertEqual(sorted(Work.objects.values_list('label', flat=True)),
+            ['Jennings2019', 'Knuth1984', 'Mueller2020'])
@@ -0,0 +1,89 @@
+import datetime
+from xml.etree import ElementTree
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from crossref.export import iter_export
+from crossref.models import Work, Author
+
+
+class TestExport(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [Author.objects.create(given=given, family=family) 
+            for given, family in [('S', 'Jennings'), ('D', 'Hasterok'), ('J', 'Payne')]]
+        for i in range(5):
+            work = Work.objects.create(label=f'Jennings2019{"abcde"[i]}', type='journal-article', 
+                title=f'A "new" model <{i}>', container_title='Geophysical Journal International',
+                published=datetime.date(2019, 8, 1), page='1377-1394', DOI=f'10.1093/gji/{i}',
+                abstract='<jats:p>Thermal conductivity</jats:p>')
+            work.author.set(authors[::-1] if i % 2 else authors)
+
+    def export(self, format, **kwargs):
+        return ''.join(iter_export(Work.objects.order_by('label'), format, **kwargs))
+
+    def test_bibtex(self):
+        bib = self.export('bibtex')
+        self.assertEqual(bib.count('@article{'), 5)
+        self.assertIn('author = "Jennings, S and Hasterok, D and Payne, J"', bib)
+        self.assertIn('author = "Payne, J and Hasterok, D and Jennings, S"', bib)
+        self.assertIn('title = "A {"}new{"} model <0>"', bib)
+        self.assertIn('pages = "1377--1394"', bib)
+
+    def test_ris(self):
+        ris = self.export('ris')
+        self.assertEqual(ris.count('TY  - JOUR'), 5)
+        self.assertIn('AU  - Jennings, S\nAU  - Hasterok, D\nAU  - Payne, J', ris)
+        self.assertIn('SP  - 1377\nEP  - 1394', ris)
+        self.assertIn('AB  - Thermal conductivity', ris)
+
+    def test_xml_formats(self):
+        mods = ElementTree.fromstring(self.export('mods'))
+        self.assertEqual(len(mods), 5)
+        ns = {'mods': 'http://www.loc.gov/mods/v3'}
+        self.assertEqual(mods.find('mods:mods/mods:titleInfo/mods:title', ns).text, 'A "new" model <0>')
+
+        rss = ElementTree.fromstring(self.export('rss', context={'url': 'http://testserver/export/rss/'}))
+        items = rss.findall('channel/item')
+        self.assertEqual(len(items), 5)
+        self.assertEqual(items[0].find('link').text, 'https://doi.org/10.1093/gji/0')
+        self.assertEqual(items[0].find('title').text, 'A "new" model <0>, Jennings et al., 2019')
+
+    def test_text(self):
+        lines = self.export('text').splitlines()
+        self.assertEqual(lines[0], 'S Jennings, D Hasterok and J Payne. A "new" model <0>. '
+            'Geophysical Journal International, pages 1377-1394, 2019. https://doi.org/10.1093/gji/0')
+
+    def test_authors_are_prefetched_per_chunk(self):
+        # one query for the works and one for the authors of each chunk
+        with self.assertNumQueries(4):
+            self.export('bibtex', chunk_size=2)
+
+
+class TestExportViews(TestCase):
+
+    def setUp(self):
+        self.work = Work.objects.create(label='Knuth1984', title='The TeXbook', type='book')
+        self.work.author.set([Author.objects.create(given='Donald', family='Knuth')])
+
+    def test_url(self):
+        response = self.client.get(reverse('crossref:work_export', args=['bibtex']))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="works.bib"')
+        self.assertIn('@book{Knuth1984,', b''.join(response.streaming_content).decode())
+
+        response = self.client.get(reverse('crossref:work_export', args=['rss']), {'author': 0})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('crossref:work_export', args=['rss']), {'author': 'abc'})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('crossref:work_export', args=['doc']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_action(self):
+        get_user_model().objects.create_superuser('admin', 'admin@test.de', 'admin')
+        self.client.login(username='admin', password='admin')
+        response = self.client.post(reverse('admin:crossref_work_changelist'), 
+            {'action': 'export_ris', '_selected_action': [self.work.pk]})
+        self.assertEqual(response['Content-Type'], 'application/x-research-info-systems; charset=utf-8')
+        self.assertIn('TY  - BOOK\nT1  - The TeXbook\nAU  - Knuth, Donald', b''.join(response.streaming_content).decode())
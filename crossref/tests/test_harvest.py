@@ -0,0 +1,103 @@
+from copy import deepcopy
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from crossref.harvest import harvest_works, harvest_funders
+from crossref.managers import CREATED, UNCHANGED
+from crossref.models import Work, Harvest, Funder
+from .data import WORK, FUNDER
+
+
+class PagingClient:
+    """Serves a copy of WORK with a different DOI on each page."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.cursors = []
+
+    def filter_works(self, filter, select=None, rows=None, cursor=None):
+        self.cursors.append(cursor)
+        page = 0 if cursor == '*' else int(cursor)
+        items = []
+        if page < self.pages:
+            item = deepcopy(WORK)
+            item['DOI'] = f"10.1093/page{page}"
+            item.pop('URL', None)
+            items.append(item)
+        return {'message': {'items': items, 'total-results': self.pages, 'next-cursor': str(page + 1)}}
+
+
+class TestHarvest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = PagingClient(pages=3)
+        patcher = mock.patch('crossref.harvest.get_crossref_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_harvest_all_pages(self):
+        pages = list(harvest_works({'orcid': '0000-0003-3762-7336'}))
+
+        self.assertEqual(Work.objects.count(), 3)
+        harvest = Harvest.objects.get(filter='orcid:0000-0003-3762-7336')
+        self.assertEqual(harvest.harvested, 3)
+        self.assertIsNotNone(harvest.finished)
+        self.assertEqual(pages[0][1]['10.1093/page0'].status, CREATED)
+
+    def test_interrupted_harvest_resumes(self):
+        for harvest, results in harvest_works('member:286'):
+            break
+
+        self.client.cursors.clear()
+        list(harvest_works('member:286'))
+        self.assertEqual(self.client.cursors[0], '1')
+        self.assertEqual(Work.objects.count(), 3)
+
+        # harvesting again updates the existing works
+        results = list(harvest_works('member:286', restart=True))
+        self.assertEqual(results[0][1]['10.1093/page0'].status, UNCHANGED)
+
+
+class FunderClient:
+
+    def __init__(self, funders):
+        self.funders_data = funders
+
+    def funders(self, rows=None, cursor=None, offset=0):
+        start = 0 if cursor == '*' else int(cursor or offset)
+        items = deepcopy(self.funders_data[start:start + rows])
+        return {'message': {'items': items, 'total-results': len(self.funders_data), 'next-cursor': str(start + rows)}}
+
+
+class TestSyncFunders(TestCase):
+
+    def setUp(self):
+        funders = []
+        for i in range(5):
+            funder = deepcopy(FUNDER)
+            funder['id'] = str(i)
+            funders.append(funder)
+        self.client = FunderClient(funders)
+        patcher = mock.patch('crossref.harvest.get_crossref_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_changes_are_written(self):
+        pages = list(harvest_funders(rows=2))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(Funder.objects.count(), 5)
+        self.assertEqual(Funder.objects.get(id='0').alt_names, FUNDER['alt-names'])
+
+        self.client.funders_data[3]['name'] = 'Renamed'
+        with self.assertNumQueries(6):
+            # one select per page, plus the single update in a savepoint
+            totals = [page['updated'] for page in harvest_funders(rows=2)]
+        self.assertEqual(sum(totals), 1)
+        self.assertEqual(Funder.objects.get(id='3').name, 'Renamed')
+
+    def test_missing_fields_are_blank(self):
+        funder = {'id': '501100000001', 'name': 'Incomplete Foundation'}
+        self.assertEqual(Funder.objects.upsert_from_crossref([funder])['created'], 1)
+        funder = Funder.objects.get()
+        self.assertEqual((funder.location, funder.uri), ('', ''))
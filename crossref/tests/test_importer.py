@@ -0,0 +1,202 @@
+import datetime
+import io
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from crossref.models import Work, Author
+from crossref.importer import BibtexImporter
+from crossref.parsers import bibtex
+from crossref import utils
+from .data import WORK
+from .test_managers import FakeClient
+
+BIBTEX = r"""
+@article{Jennings2019,
+  author = {Jennings, S and Hasterok, D and Payne, J},
+  title = {A new compositionally based thermal conductivity model for plutonic rocks},
+  journal = {Geophysical Journal International},
+  year = {2019},
+  month = aug,
+  pages = {1377--1394},
+}
+@article{Jennings2019,
+  author = {Jennings, S},
+  title = {The same key again},
+  year = {2019},
+}
+@book{Knuth1984, author = {Knuth, Donald E.}, title = {The TeXbook}, year = {1984}}
+@misc{Long2020, author = {Long, A}, title = {%s}, year = {2020}}
+""" % ('x' * 600)
+
+
+def parse(string):
+    return list(bibtex.iparse(io.StringIO(string)))
+
+
+class TestBibtexImporter(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = FakeClient()
+        for target in ('crossref.utils.get_crossref_client', 'crossref.managers.get_crossref_client'):
+            patcher = mock.patch(target, return_value=self.client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_report(self):
+        report = BibtexImporter().run(parse(BIBTEX))
+
+        self.assertEqual([r.label for r in report.created], ['Jennings2019', 'Knuth1984'])
+        self.assertEqual([(r.label, r.reason) for r in report.skipped],
+            [('Jennings2019', 'repeats the citation key Jennings2019')])
+        self.assertEqual([r.label for r in report.failed], ['Long2020'])
+        self.assertIn('at most 512 characters', report.failed[0].reason)
+        self.assertEqual(report.as_dict()['created'], 2)
+        # no authors are created for the skipped and failed entries
+        self.assertEqual(sorted(Author.objects.values_list('family', flat=True)),
+            ['Hasterok', 'Jennings', 'Knuth', 'Payne'])
+
+        work = Work.objects.get(label='Jennings2019')
+        self.assertEqual([a.family for a in work.author.all()], ['Jennings', 'Hasterok', 'Payne'])
+        self.assertEqual(str(work.published), '2019-08-01')
+        self.assertEqual(work.page, '1377-1394')
+
+    def test_reimport_skips_existing_works(self):
+        BibtexImporter().run(parse(BIBTEX))
+        report = BibtexImporter().run(parse(BIBTEX))
+        self.assertEqual(report.created, [])
+        self.assertEqual(len(report.skipped), 3)
+        self.assertEqual(Work.objects.count(), 2)
+
+    def test_dois_are_looked_up_in_bulk(self):
+        source = f"""
+            @article{{Jennings2019, doi = {{{WORK['DOI']}}}, title = {{Ignored}}}}
+            @article{{Missing2020, author = {{Missing, M}}, doi = {{10.0000/missing}}, title = {{From BibTeX}}, year = 2020}}
+        """
+        report = BibtexImporter().run(parse(source))
+        self.assertEqual(len(report.created), 2)
+        self.assertEqual(self.client.queried, [WORK['DOI'].lower(), '10.0000/missing'])
+        self.assertEqual(Work.objects.get(DOI='10.0000/missing').title, 'From BibTeX')
+
+        report = BibtexImporter().run(parse(source))
+        self.assertEqual([r.reason for r in report.skipped], [
+            f"a work with the DOI {WORK['DOI'].lower()} already exists",
+            "a work with the DOI 10.0000/missing already exists"])
+
+    def test_failed_entry_does_not_abort_batch(self):
+        source = """
+            @misc{One2020, author = {One, A}, title = {One}, year = 2020, url = {https://example.com/}}
+            @misc{Two2020, author = {Two, B}, title = {Two}, year = 2020, url = {https://example.com/}}
+            @misc{Three2020, author = {Three, C}, title = {Three}, year = 2020}
+        """
+        report = BibtexImporter().run(parse(source))
+        self.assertEqual([r.label for r in report.created], ['One2020', 'Three2020'])
+        self.assertEqual([r.label for r in report.failed], ['Two2020'])
+        self.assertEqual(list(Work.objects.get(label='Three2020').author.values_list('family', flat=True)), ['Three'])
+
+    def test_labels_are_made_when_missing(self):
+        source = """
+            @misc{, author = {Smith, A}, title = {One}, year = 2020}
+            @misc{, author = {Smith, B}, title = {Two}, year = 2020}
+        """
+        report = BibtexImporter().run(parse(source))
+        self.assertEqual([r.instance.label for r in report.created], ['Smith2020', 'Smith2020a'])
+
+    def test_taken_citation_keys_get_a_new_label(self):
+        Work.objects.create(label='Smith2020', title='Unrelated', published=datetime.date(2020, 1, 1))
+        source = """
+            @misc{Smith2020, author = {Smith, A}, title = {One}, year = 2020}
+            @misc{Smith2020b, title = {No author}, year = 2020}
+        """
+        Work.objects.create(label='Smith2020b', title='Also unrelated')
+        report = BibtexImporter().run(parse(source))
+        self.assertEqual([(r.label, r.instance.label, r.reason) for r in report.created],
+            [('Smith2020', 'Smith2020a', 'the citation key is taken, labelled Smith2020a')])
+        self.assertEqual([r.label for r in report.failed], ['Smith2020b'])
+        self.assertIn('citation key Smith2020b is taken', report.failed[0].reason)
+
+    def test_labels_of_a_batch_are_read_in_one_query(self):
+        Work.objects.create(label='Jones2021', title='Taken', published=datetime.date(2021, 1, 1))
+        source = """
+            @misc{, author = {Smith, A}, title = {One}, year = 2020}
+            @misc{, author = {Jones, B}, title = {Two}, year = 2021}
+            @misc{, author = {Smith, C}, title = {Three}, year = 2020}
+        """
+        importer = BibtexImporter()
+        pending = [importer.validate(entry) for entry in parse(source)]
+        with self.assertNumQueries(1):
+            importer.allocate_labels(pending)
+        self.assertEqual([work.label for entry, work, authors in pending], ['Smith2020', 'Jones2021a', 'Smith2020a'])
+
+
+class TestFingerprints(TestCase):
+
+    source = """
+        @article{Jennings2019, author = {Jennings, S and Payne, J}, title = {A new {Thermal} model}, year = 2019}
+        @article{JenningsEtAl19, author = {Jénnings, S.}, title = {A New Thermal Model.}, year = 2019, volume = 219}
+    """
+
+    def test_fingerprint_follows_first_author(self):
+        work = Work.objects.create(label='Jennings2019', title='A new thermal model', published=datetime.date(2019, 8, 1))
+        self.assertEqual(work.fingerprint, utils.make_work_fingerprint('A new thermal model', '', 2019))
+        work.author.set([Author.objects.create(given='S', family='Jennings')])
+        work.refresh_from_db()
+        self.assertEqual(work.fingerprint, utils.make_work_fingerprint('A New Thermal Model.', 'Jénnings', 2019))
+
+    def test_duplicates_in_file_are_skipped(self):
+        report = BibtexImporter().run(parse(self.source))
+        self.assertEqual([r.label for r in report.created], ['Jennings2019'])
+        self.assertEqual(report.skipped[0].reason, 'duplicate of Jennings2019 earlier in the file')
+
+    def test_existing_duplicates_are_checked_in_one_query(self):
+        BibtexImporter().run(parse(self.source))
+        importer = BibtexImporter()
+        pending = [(entry, Work(title='A new thermal model', published=datetime.date(2019, 1, 1), label=entry['label']), [])
+            for entry in parse(self.source)]
+        for entry, work, authors in pending:
+            work.update_fingerprint('Jennings')
+        with self.assertNumQueries(1):
+            self.assertEqual(importer.skip_duplicates(pending), ([], []))
+        self.assertEqual([r.reason for r in importer.report.skipped], 
+            ['duplicate of the existing work Jennings2019'] * 2)
+
+    def test_duplicates_can_be_merged(self):
+        BibtexImporter().run(parse(self.source.splitlines()[1]))
+        report = BibtexImporter(duplicates='merge').run(parse(self.source.splitlines()[2]))
+        self.assertEqual(report.skipped[0].reason, 'duplicate of the existing work Jennings2019, filled in volume')
+        self.assertEqual(Work.objects.get().volume, '219')
+
+    def test_conflicting_merges_do_not_abort_the_batch(self):
+        BibtexImporter().run(parse("""
+            @misc{One2020, author = {One, A}, title = {One}, year = 2020}
+            @misc{Two2020, author = {Two, B}, title = {Two}, year = 2020}
+        """))
+        report = BibtexImporter(duplicates='merge').run(parse("""
+            @misc{OneAgain, author = {One, A}, title = {One}, year = 2020, url = {https://example.com/}}
+            @misc{TwoAgain, author = {Two, B}, title = {Two}, year = 2020, url = {https://example.com/}}
+            @misc{Three2020, author = {Three, C}, title = {Three}, year = 2020}
+        """))
+        self.assertEqual([r.label for r in report.created], ['Three2020'])
+        self.assertEqual(report.skipped[0].reason, 'duplicate of the existing work One2020, filled in URL')
+        self.assertIn('duplicate of the existing work Two2020, could not fill in URL', report.skipped[1].reason)
+        self.assertEqual(Work.objects.get(label='One2020').URL, 'https://example.com/')
+        self.assertIsNone(Work.objects.get(label='Two2020').URL)
+
+    def test_partial_saves_keep_the_fingerprint(self):
+        BibtexImporter().run(parse(self.source))
+        work = Work.objects.get()
+        with self.assertNumQueries(1):
+            work.volume = '220'
+            work.save(update_fields=['volume'])
+        with self.assertNumQueries(2):
+            # the first author is read to recompute the fingerprint
+            work.title = 'Another title'
+            work.save(update_fields=['title'])
+        self.assertEqual(work.fingerprint, utils.make_work_fingerprint('Another title', 'Jennings', 2019))
+
+    def test_fill_fingerprints(self):
+        BibtexImporter().run(parse(self.source))
+        expected = Work.objects.get().fingerprint
+        Work.objects.update(fingerprint=None)
+        self.assertEqual(Work.objects.fill_fingerprints(), 1)
+        self.assertEqual(Work.objects.get().fingerprint, expected)
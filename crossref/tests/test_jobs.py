@@ -0,0 +1,135 @@
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from crossref.jobs import Heartbeat, claim_job, run_job, run_worker
+from crossref.models import ImportJob, Work
+
+BIBTEX = """
+@comment{exported}
+@article{One2020, author = {One, A}, title = {One}, year = 2020}
+@article{Two2020, author = {Two, B}, title = {Two}, year = 2020}
+@article{One2020, author = {One, A}, title = {One again}, year = 2020}
+@article{Three2020, author = {Three, C}, title = {Three}, year = 2020}
+"""
+
+
+class TestImportJobs(TestCase):
+
+    def test_worker_runs_pending_jobs(self):
+        job = ImportJob.objects.create(name='library.bib', source=BIBTEX)
+        run_worker(once=True, batch_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FINISHED)
+        self.assertEqual((job.total, job.processed), (4, 4))
+        self.assertEqual((job.created_count, job.skipped_count, job.failed_count), (3, 1, 0))
+        self.assertEqual(job.report['skipped'], [{'label': 'One2020', 'reason': 'repeats the citation key One2020'}])
+        self.assertEqual(Work.objects.count(), 3)
+
+    def test_running_jobs_are_not_claimed_twice(self):
+        ImportJob.objects.create(source=BIBTEX)
+        self.assertIsNotNone(claim_job('a'))
+        self.assertIsNone(claim_job('b'))
+
+    def test_abandoned_jobs_resume(self):
+        # a worker imported the first two entries and was stopped
+        Work.objects.create(label='One2020', title='One')
+        Work.objects.create(label='Two2020', title='Two')
+        stale = timezone.now() - timedelta(hours=1)
+        job = ImportJob.objects.create(source=BIBTEX, status=ImportJob.RUNNING, heartbeat=stale,
+            attempts=1, total=4, processed=2, created_count=2)
+
+        claimed = claim_job('b')
+        self.assertEqual((claimed.pk, claimed.worker, claimed.attempts), (job.pk, 'b', 2))
+        run_job(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, ImportJob.FINISHED)
+        self.assertEqual((claimed.processed, claimed.created_count, claimed.skipped_count), (4, 3, 1))
+        self.assertEqual(claimed.report['skipped'][0]['reason'], 'repeats the citation key One2020')
+        self.assertEqual(Work.objects.count(), 3)
+
+    @override_settings(CROSSREF_JOB_MAX_ATTEMPTS=2)
+    def test_jobs_abandoned_too_often_fail(self):
+        stale = timezone.now() - timedelta(hours=1)
+        job = ImportJob.objects.create(source=BIBTEX, status=ImportJob.RUNNING, heartbeat=stale, attempts=2)
+        self.assertIsNone(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.FAILED)
+
+    @override_settings(CROSSREF_JOB_REPORT_LIMIT=2)
+    def test_report_lists_the_first_entries(self):
+        job = ImportJob.objects.create(source=BIBTEX + BIBTEX)
+        run_worker(once=True, batch_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.skipped_count, 5)
+        self.assertEqual([r['label'] for r in job.report['skipped']], ['One2020', 'One2020'])
+        self.assertEqual(job.report_sections()[0], ('skipped', job.report['skipped'], 3))
+
+    def test_lost_job_stops(self):
+        job = ImportJob.objects.create(source=BIBTEX)
+        job = claim_job('a')
+        ImportJob.objects.filter(pk=job.pk).update(attempts=5, worker='b')
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.processed), (ImportJob.RUNNING, 'b', 0))
+
+
+class TestHeartbeat(TransactionTestCase):
+
+    def test_heartbeat_is_sent_during_a_batch(self):
+        ImportJob.objects.create(source=BIBTEX)
+        job = claim_job('a')
+        with Heartbeat(job, interval=0.05):
+            # a slow batch, e.g. DOI lookups waiting on the rate limit
+            time.sleep(0.3)
+        self.assertGreater(ImportJob.objects.get().heartbeat, job.heartbeat)
+
+        # another worker took the job over
+        ImportJob.objects.update(attempts=5)
+        last = ImportJob.objects.get().heartbeat
+        with Heartbeat(job, interval=0.05):
+            time.sleep(0.2)
+        self.assertEqual(ImportJob.objects.get().heartbeat, last)
+
+
+class TestImportJobAdmin(TestCase):
+
+    def setUp(self):
+        get_user_model().objects.create_superuser('admin', 'admin@test.de', 'admin')
+        self.client.login(username='admin', password='admin')
+
+    def test_upload_creates_job(self):
+        upload = SimpleUploadedFile('library.bib', BIBTEX.encode())
+        response = self.client.post(reverse('admin:import_bibtex'), {'file': upload})
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('admin:import_job', args=[job.pk]))
+        self.assertEqual((job.name, job.status, job.source), ('library.bib', ImportJob.PENDING, BIBTEX))
+        self.assertEqual(Work.objects.count(), 0)
+
+        response = self.client.get(reverse('admin:import_job', args=[job.pk]))
+        self.assertContains(response, reverse('admin:import_job_progress', args=[job.pk]))
+
+        run_worker(once=True)
+        response = self.client.get(reverse('admin:import_job_progress', args=[job.pk]))
+        self.assertEqual(response.json()['status'], ImportJob.FINISHED)
+        self.assertEqual(response.json()['created_count'], 3)
+        response = self.client.get(reverse('admin:import_job', args=[job.pk]))
+        self.assertContains(response, 'repeats the citation key One2020')
+        self.assertNotContains(response, 'more</p>')
+
+    def test_job_page_counts_unlisted_entries(self):
+        job = ImportJob.objects.create(source=BIBTEX, status=ImportJob.FINISHED, skipped_count=5,
+            report={'skipped': [{'label': 'One2020', 'reason': 'repeats the citation key One2020'}] * 2})
+        response = self.client.get(reverse('admin:import_job', args=[job.pk]))
+        self.assertContains(response, 'and 3 more')
+
+    @override_settings(CROSSREF_BACKGROUND_IMPORTS=False)
+    def test_upload_imports_in_request(self):
+        upload = SimpleUploadedFile('library.bib', BIBTEX.encode())
+        self.client.post(reverse('admin:import_bibtex'), {'file': upload})
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertEqual(Work.objects.count(), 3)
@@ -0,0 +1,41 @@
+from copy import deepcopy
+from datetime import date
+from django.test import TestCase
+from crossref.forms import WorkForm
+from crossref.labels import LabelAllocator, make_suffix
+from crossref.models import Work
+from .data import WORK
+
+
+class TestLabelAllocator(TestCase):
+
+    def setUp(self):
+        self.allocator = LabelAllocator(Work.objects.all())
+
+    def test_make_suffix(self):
+        self.assertEqual([make_suffix(n) for n in (0, 1, 26, 27, 28, 702, 703)], 
+            ['', 'a', 'z', 'aa', 'ab', 'zz', 'aaa'])
+
+    def test_suffixes_follow_taken_labels(self):
+        Work.objects.create(label='Smith2019', published=date(2019, 1, 1))
+        Work.objects.create(label='Smith2019a', published=date(2019, 1, 1))
+        labels = [self.allocator.allocate('Smith2019') for i in range(30)]
+        self.assertEqual(labels[:2], ['Smith2019b', 'Smith2019c'])
+        self.assertEqual(labels[-1], 'Smith2019ae')
+        self.assertEqual(self.allocator.allocate('Jones2019'), 'Jones2019')
+
+    def test_batch_is_prefetched_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.allocator.prefetch(['Smith2019', 'Jones2020', 'Payne2021'])
+            self.allocator.allocate('Smith2019')
+            self.allocator.allocate('Jones2020')
+            self.allocator.allocate('Jones2020')
+
+    def test_save_retries_when_the_label_is_taken(self):
+        form = WorkForm(deepcopy(WORK))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['label'], 'Jennings2019')
+
+        # another process saves a work with the same label in the meantime
+        Work.objects.create(label='Jennings2019', published=date(2019, 1, 1))
+        self.assertEqual(form.save().label, 'Jennings2019a')
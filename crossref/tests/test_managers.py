@@ -0,0 +1,190 @@
+from copy import deepcopy
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from requests import Response
+from requests.exceptions import HTTPError
+from crossref.models import Work, Author
+from crossref.managers import CREATED, EXISTING, FAILED
+from crossref.cache import responses, projected
+from crossref.exceptions import UnresolvableDOI
+from crossref.utils import aquery_crossref_for_doi
+from .data import WORK
+
+
+class FakeClient:
+    """Stands in for the Crossref client, serving WORK for its own DOI only."""
+
+    def __init__(self):
+        self.queried = []
+
+    def works(self, doi):
+        self.queried.append(doi)
+        if doi != WORK['DOI']:
+            response = Response()
+            response.status_code = 404
+            raise HTTPError(f'404 Client Error: Not Found for url: {doi}', response=response)
+        return {'status': 'ok', 'message': deepcopy(WORK)}
+
+    def filter_works(self, filter, select=None, rows=None):
+        dois = [value for name, value in filter]
+        self.queried.extend(dois)
+        self.selects = select
+        items = [deepcopy(WORK) for doi in dois if doi == WORK['DOI']]
+        return {'status': 'ok', 'message': {'items': items}}
+
+
+class TestBulkGetOrQueryCrossref(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        responses.reset_stats()
+        projected.reset_stats()
+        self.client = FakeClient()
+        for target in ('crossref.utils.get_crossref_client', 'crossref.managers.get_crossref_client'):
+            patcher = mock.patch(target, return_value=self.client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_creates_missing_and_reports_failures(self):
+        results = Work.objects.bulk_get_or_query_crossref([WORK['DOI'], '10.0000/missing'])
+
+        self.assertEqual(results[WORK['DOI']].status, CREATED)
+        self.assertEqual(results[WORK['DOI']].instance.DOI, WORK['DOI'])
+        self.assertEqual(results['10.0000/missing'].status, FAILED)
+        self.assertIn('not found', results['10.0000/missing'].reason)
+        self.assertEqual(Work.objects.count(), 1)
+        self.assertEqual(Author.objects.count(), 3)
+
+    def test_existing_works_are_not_queried(self):
+        Work.objects.bulk_get_or_query_crossref([WORK['DOI']])
+        self.client.queried.clear()
+
+        results = Work.objects.bulk_get_or_query_crossref([WORK['DOI'].upper()])
+
+        self.assertEqual(results[WORK['DOI'].upper()].status, EXISTING)
+        self.assertEqual(self.client.queried, [])
+
+    def test_dois_are_fetched_in_batches(self):
+        with self.settings(CROSSREF_FILTER_BATCH_SIZE=2):
+            results = Work.objects.bulk_get_or_query_crossref(
+                [WORK['DOI'], '10.0000/missing', '10.0000/other'])
+
+        self.assertEqual(results[WORK['DOI']].status, CREATED)
+        self.assertEqual(results['10.0000/other'].status, FAILED)
+        self.assertIn('author', self.client.selects)
+        self.assertNotIn('reference', self.client.selects)
+
+    def test_responses_are_cached(self):
+        Work.objects.bulk_get_or_query_crossref([WORK['DOI']])
+        Work.objects.all().delete()
+
+        results = Work.objects.bulk_get_or_query_crossref([f"https://doi.org/{WORK['DOI']}"])
+
+        self.assertEqual(results[f"https://doi.org/{WORK['DOI']}"].status, CREATED)
+        self.assertIsNotNone(results[f"https://doi.org/{WORK['DOI']}"].instance.last_queried_crossref)
+        self.assertEqual(self.client.queried, [WORK['DOI']])
+        self.assertEqual(projected.stats(), {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_projected_responses_are_not_served_to_single_lookups(self):
+        Work.objects.bulk_get_or_query_crossref([WORK['DOI']])
+        Work.objects.all().delete()
+
+        Work.objects.get_or_query_crossref(WORK['DOI'])
+        self.assertEqual(self.client.queried, [WORK['DOI'], WORK['DOI']])
+        self.assertIsNotNone(responses.get(WORK['DOI']))
+
+    def test_unresolvable_dois_are_not_requeried(self):
+        for i in range(2):
+            with self.assertRaises(UnresolvableDOI):
+                Work.objects.get_or_query_crossref('10.0000/missing')
+        self.assertEqual(self.client.queried, ['10.0000/missing'])
+
+        results = Work.objects.bulk_get_or_query_crossref(['10.0000/missing', 'not-a-doi'])
+        self.assertEqual(results['10.0000/missing'].status, FAILED)
+        self.assertEqual(results['not-a-doi'].reason, 'not-a-doi is not a valid DOI')
+        self.assertEqual(self.client.queried, ['10.0000/missing'])
+
+    def test_expired_responses_are_evicted(self):
+        Work.objects.bulk_get_or_query_crossref([WORK['DOI']])
+        Work.objects.all().delete()
+
+        with self.settings(CROSSREF_CACHE_TTL=0):
+            Work.objects.bulk_get_or_query_crossref([WORK['DOI']])
+
+        self.assertEqual(len(self.client.queried), 2)
+        self.assertEqual(projected.stats()['evictions'], 1)
+
+
+class FakeAsyncClient(FakeClient):
+
+    async def works(self, doi):
+        return super().works(doi)
+
+    async def filter_works(self, filter, select=None, rows=None):
+        return super().filter_works(filter, select, rows)
+
+
+class TestAsyncGetOrQueryCrossref(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = FakeAsyncClient()
+        for target in ('crossref.utils.get_async_crossref_client', 'crossref.managers.get_async_crossref_client'):
+            patcher = mock.patch(target, return_value=self.client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_aget_or_query_crossref(self):
+        work, created = await Work.objects.aget_or_query_crossref(WORK['DOI'])
+        self.assertTrue(created)
+
+        work, created = await Work.objects.aget_or_query_crossref(WORK['DOI'])
+        self.assertFalse(created)
+        self.assertEqual(self.client.queried, [WORK['DOI']])
+
+    async def test_abulk_get_or_query_crossref(self):
+        results = await Work.objects.abulk_get_or_query_crossref(
+            [WORK['DOI'], '10.0000/missing'], concurrency=2)
+
+        self.assertEqual(results[WORK['DOI']].status, CREATED)
+        self.assertEqual(results['10.0000/missing'].status, FAILED)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'crossref': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'crossref_test_cache'},
+    },
+    CROSSREF_CACHE='crossref',
+)
+class TestAsyncDatabaseCache(TestCase):
+    """The async lookups reach sync only cache backends from a thread."""
+
+    def setUp(self):
+        call_command('createcachetable', 'crossref_test_cache')
+        self.client = FakeAsyncClient()
+        for target in ('crossref.utils.get_async_crossref_client', 'crossref.managers.get_async_crossref_client'):
+            patcher = mock.patch(target, return_value=self.client)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_aquery_crossref_for_doi(self):
+        for i in range(2):
+            response = await aquery_crossref_for_doi(WORK['DOI'])
+            self.assertEqual(response['message']['DOI'], WORK['DOI'])
+        for i in range(2):
+            with self.assertRaises(UnresolvableDOI):
+                await aquery_crossref_for_doi('10.0000/missing')
+        self.assertEqual(self.client.queried, [WORK['DOI'], '10.0000/missing'])
+
+    async def test_abulk_get_or_query_crossref(self):
+        await aquery_crossref_for_doi(WORK['DOI'])
+        with self.assertRaises(UnresolvableDOI):
+            await aquery_crossref_for_doi('10.0000/missing')
+
+        results = await Work.objects.abulk_get_or_query_crossref([WORK['DOI'], '10.0000/missing'])
+        self.assertEqual(results[WORK['DOI']].status, CREATED)
+        self.assertEqual(results['10.0000/missing'].status, FAILED)
+        self.assertEqual(self.client.queried, [WORK['DOI'], '10.0000/missing'])
@@ -0,0 +1,87 @@
+import io
+from django.test import SimpleTestCase
+from crossref.parsers import bibtex
+
+BIBTEX = r"""% exported by hand, contact me@example.com
+@comment{ignore me}
+@article{Jennings2019,
+  author = {Jennings, S and Hasterok, D and Payne, J},
+  title = {{A new compositionally based thermal conductivity model for plutonic rocks}},
+  journal = {Geophysical Journal International},
+  year = 2019,
+  volume = "219",
+  pages = {1377--1394},
+  doi = {10.1093/gji/ggz376}
+}
+
+@book{Knuth1984, author = "Donald E. Knuth", title = {The {\TeX}book}, publisher = {Addison-Wesley}, year = {1984}}
+@inproceedings{Mueller2020,
+  author = {M{\"u}ller, J{\"o}rg and van der Berg, J.},
+  booktitle = {Proc. of {IEEE}},
+  year = {2020},
+}
+"""
+
+
+class CountingReader(io.StringIO):
+    """Records how many characters have been read."""
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed = self.tell()
+        return chunk
+
+
+class TestIParse(SimpleTestCase):
+
+    def test_same_entries_as_parse(self):
+        expected = bibtex.parse(BIBTEX)
+        self.assertEqual([e['label'] for e in expected], ['Jennings2019', 'Knuth1984', 'Mueller2020'])
+        for chunk_size in (1, 7, 64, 65536):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(bibtex.iparse(io.StringIO(BIBTEX), chunk_size)), expected)
+
+    def test_entries_are_yielded_as_they_are_read(self):
+        f = CountingReader(BIBTEX)
+        entries = bibtex.iparse(f, chunk_size=32)
+        entry = next(entries)
+        self.assertEqual(entry['label'], 'Jennings2019')
+        self.assertEqual(entry['pages'], '1377-1394')
+        self.assertLess(f.consumed, BIBTEX.index('@book') + 32)
+
+    def test_parenthesised_entries(self):
+        entries = list(bibtex.iparse(io.StringIO('@misc(Smith2001, title = {A (short) title}, year = 2001)')))
+        self.assertEqual(entries, [{'type': 'misc', 'label': 'Smith2001', 'title': 'A (short) title', 'year': '2001'}])
+
+    def test_unterminated_entry_is_ignored(self):
+        entries = list(bibtex.iparse(io.StringIO(BIBTEX + "@article{Broken, title = {never closed")))
+        self.assertEqual([e['label'] for e in entries], ['Jennings2019', 'Knuth1984', 'Mueller2020'])
+
+
+class TestPParse(SimpleTestCase):
+
+    def test_chunks_split_at_entries(self):
+        source = BIBTEX.replace('{1377--1394}', '{1377--1394},\n  note = {see\n@misc{NotAnEntry, below}')
+        chunks = list(bibtex.split_chunks(io.StringIO(source), chunk_size=100))
+        self.assertEqual(''.join(chunks), source)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks[1:]:
+            self.assertRegex(chunk, r'^@(article|book|inproceedings)')
+
+    def test_same_entries_as_iparse(self):
+        source = BIBTEX * 20
+        expected = list(bibtex.iparse(io.StringIO(source)))
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                self.assertEqual(list(bibtex.pparse(io.StringIO(source), workers, chunk_size=200)), expected)
+
+
+class TestSpecialChars(SimpleTestCase):
+
+    def test_every_mapping(self):
+        for key, value in bibtex.special_chars:
+            with self.subTest(key=key):
+                self.assertEqual(bibtex.replace_special_chars(f"x{key}y"), f"x{value}y")
+
+    def test_longest_escape_wins(self):
+        self.assertEqual(bibtex.replace_special_chars(r'M\"{u}ller {\"o} \ss \H{o} \v{z}'), 'Müller ö ß ö z')
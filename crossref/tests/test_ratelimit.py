@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from crossref.ratelimit import Lease, RateLimiter, parse_interval, single_flight, asingle_flight
+
+
+class TestRateLimiter(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.limiter = RateLimiter()
+
+    def test_parse_interval(self):
+        self.assertEqual(parse_interval('1s'), 1)
+        self.assertEqual(parse_interval('500ms'), 0.5)
+        self.assertEqual(parse_interval('2m'), 120)
+
+    @mock.patch('crossref.ratelimit.time.time', return_value=1000.25)
+    def test_tokens_run_out_within_an_interval(self, time):
+        with self.settings(CROSSREF_RATE_LIMIT=2, CROSSREF_RATE_LIMIT_INTERVAL=1):
+            self.assertEqual(self.limiter.take(), 0)
+            self.assertEqual(self.limiter.take(), 0)
+            self.assertAlmostEqual(self.limiter.take(), 0.75)
+
+            # the bucket is refilled in the next interval
+            time.return_value = 1001.1
+            self.assertEqual(self.limiter.take(), 0)
+
+    @mock.patch('crossref.ratelimit.time.time', return_value=1000.25)
+    def test_policy_follows_response_headers(self, time):
+        self.limiter.update({'X-Rate-Limit-Limit': '1', 'X-Rate-Limit-Interval': '1s'})
+        self.assertEqual(self.limiter.get_policy(), (1, 1))
+        self.assertEqual(self.limiter.take(), 0)
+        self.assertGreater(self.limiter.take(), 0)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'crossref': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'crossref_test_cache'},
+    },
+    CROSSREF_RATE_LIMIT_CACHE='crossref',
+)
+class TestAsyncDatabaseCache(TestCase):
+    """The async versions reach sync only cache backends from a thread."""
+
+    def setUp(self):
+        call_command('createcachetable', 'crossref_test_cache')
+
+    async def test_athrottle(self):
+        limiter = RateLimiter()
+        await limiter.aupdate({'X-Rate-Limit-Limit': '3', 'X-Rate-Limit-Interval': '1h'})
+        for i in range(3):
+            await limiter.athrottle()
+        self.assertGreater(await sync_to_async(limiter.take)(), 0)
+
+    async def test_asingle_flight(self):
+        events = []
+
+        async def lookup():
+            async with asingle_flight('10.1093/gji/ggz376') as leader:
+                if leader:
+                    await asyncio.sleep(0.2)
+                events.append('leader' if leader else 'follower')
+
+        await asyncio.gather(lookup(), lookup())
+        self.assertEqual(events, ['leader', 'follower'])
+
+class TestSingleFlight(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_followers_wait_for_the_leader(self):
+        events = []
+
+        def lookup():
+            with single_flight('10.1093/gji/ggz376') as leader:
+                if leader:
+                    time.sleep(0.2)
+                events.append(('leader' if leader else 'follower', time.monotonic()))
+
+        threads = [threading.Thread(target=lookup) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        roles = [role for role, t in events]
+        self.assertEqual(roles, ['leader', 'follower', 'follower'])
+
+    def test_lease_is_released_on_error(self):
+        with self.assertRaises(ValueError):
+            with single_flight('10.1093/gji/ggz376'):
+                raise ValueError
+        with single_flight('10.1093/gji/ggz376') as leader:
+            self.assertTrue(leader)
+
+    def test_followers_give_up_after_timeout(self):
+        with single_flight('10.1093/gji/ggz376') as leader:
+            start = time.monotonic()
+            with single_flight('10.1093/gji/ggz376', timeout=0.2) as follower:
+                self.assertFalse(follower)
+            self.assertLess(time.monotonic() - start, 1)
+
+    def test_lease_outlasts_a_lookup(self):
+        with self.settings(CROSSREF_TIMEOUT=10, CROSSREF_MAX_RETRIES=2, CROSSREF_RETRY_MAX_DELAY=10):
+            # three attempts timing out, two delays and the save
+            self.assertEqual(Lease('10.1093/gji/ggz376').timeout, 60)
+        with self.settings(CROSSREF_LEASE_TIMEOUT=5):
+            self.assertEqual(Lease('10.1093/gji/ggz376').timeout, 5)
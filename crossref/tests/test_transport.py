@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from crossref.client import Crossref, AsyncCrossref
+from crossref.transport import FixtureStore, StandInServer
+from .data import WORK
+
+
+class TestTransport(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fixtures = tempfile.TemporaryDirectory()
+        self.recorded = tempfile.TemporaryDirectory()
+        self.addCleanup(self.fixtures.cleanup)
+        self.addCleanup(self.recorded.cleanup)
+
+        store = FixtureStore(self.fixtures.name)
+        store.save(f"/works/{WORK['DOI']}", '', 200, {'Content-Type': 'application/json'},
+            json.dumps(store.wrap(WORK)).encode())
+        self.server = StandInServer(store)
+        self.server.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_standin_server(self):
+        client = Crossref(self.server.url)
+        self.assertEqual(client.works(WORK['DOI'].upper())['message']['DOI'], WORK['DOI'])
+
+        response = client.filter_works([('doi', WORK['DOI']), ('doi', '10.0000/missing')])
+        self.assertEqual([item['DOI'] for item in response['message']['items']], [WORK['DOI']])
+
+        with self.assertRaises(Exception) as cm:
+            client.works('10.0000/missing')
+        self.assertEqual(cm.exception.response.status_code, 404)
+
+    def test_record_then_replay(self):
+        with override_settings(CROSSREF_TRANSPORT='record', CROSSREF_FIXTURE_DIR=self.recorded.name):
+            Crossref(self.server.url).filter_works([('doi', WORK['DOI'])])
+        # the works in a batch are recorded one by one too
+        self.assertEqual(len(os.listdir(self.recorded.name)), 2)
+
+        self.server.shutdown()
+        with override_settings(CROSSREF_TRANSPORT='replay', CROSSREF_FIXTURE_DIR=self.recorded.name):
+            client = Crossref(self.server.url)
+            self.assertEqual(client.works(WORK['DOI'])['message']['title'], WORK['title'])
+
+            async def lookup():
+                client = AsyncCrossref(self.server.url)
+                response = await client.works(WORK['DOI'])
+                await client.aclose()
+                return response
+
+            self.assertEqual(asyncio.run(lookup())['message']['DOI'], WORK['DOI'])
+
+    def test_synthesized_works(self):
+        self.server.store.synthesize = True
+        response = Crossref(self.server.url).works('10.0000/synthetic')
+        self.assertEqual(response['message']['DOI'], '10.0000/synthetic')
+        self.assertEqual(response['message']['title'], WORK['title'])
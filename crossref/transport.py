@@ -0,0 +1,312 @@
+"""Record and replay Crossref responses so ingestion can be benchmarked and
+load tested without the network.
+
+Set `CROSSREF_TRANSPORT = 'record'` to save every response from Crossref
+into `CROSSREF_FIXTURE_DIR`, then `CROSSREF_TRANSPORT = 'replay'` to serve
+requests from those fixtures with `CROSSREF_REPLAY_LATENCY` seconds of
+artificial latency. The same fixtures can also be served over HTTP by the
+`crossref_standin` command, see `StandInServer`.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from copy import deepcopy
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote, parse_qsl, urlencode
+from django.core.exceptions import ImproperlyConfigured
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from crossref.conf import settings
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+RECORDED_HEADERS = ('content-type', 'x-rate-limit-limit', 'x-rate-limit-interval')
+
+NOT_FOUND = (404, {'Content-Type': 'text/plain'}, b'Resource not found.')
+
+
+def parse_doi_filter(query):
+    """Return the DOIs of a /works query that only filters on DOIs, or None."""
+    params = dict(parse_qsl(query))
+    filters = params.get('filter', '').split(',')
+    if not all(f.startswith('doi:') for f in filters) or set(params) - {'filter', 'select', 'rows'}:
+        return None
+    return [f[4:] for f in filters]
+
+
+class FixtureStore:
+    """A directory of recorded Crossref responses.
+
+    Each response is saved as a JSON file named after its path and query
+    string. DOIs in /works paths are matched case-insensitively and the
+    works returned by a DOI filter are also saved one by one, so a replayed
+    batch lookup can be answered from works recorded individually (and vice
+    versa) whatever the batch size. With `synthesize` a DOI that was never
+    recorded is answered with a copy of a recorded work under that DOI,
+    which allows load tests with any number of distinct works.
+    """
+
+    def __init__(self, path, synthesize=False):
+        if not path:
+            raise ImproperlyConfigured("CROSSREF_FIXTURE_DIR must be set to record or replay Crossref responses")
+        self.path = path
+        self.synthesize = synthesize
+        self._template = None
+
+    def make_key(self, path, query=''):
+        path = unquote(path)
+        if path.lower().startswith('/works/'):
+            path = path.lower()
+        query = urlencode(sorted(parse_qsl(query)))
+        digest = hashlib.md5(f"{path}?{query}".encode()).hexdigest()
+        slug = re.sub(r'[^\w.-]+', '-', path).strip('-')[:80]
+        return os.path.join(self.path, f"{slug}-{digest}.json")
+
+    def load(self, path, query=''):
+        """Return the recorded (status, headers, body) or None."""
+        try:
+            with open(self.make_key(path, query)) as f:
+                fixture = json.load(f)
+        except FileNotFoundError:
+            return None
+        body = fixture['body']
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return fixture['status'], fixture['headers'], body.encode()
+
+    def save(self, path, query, status, headers, body):
+        os.makedirs(self.path, exist_ok=True)
+        headers = {k: v for k, v in headers.items() if k.lower() in RECORDED_HEADERS}
+        try:
+            body = json.loads(body)
+        except ValueError:
+            body = body.decode(errors='replace')
+        fixture = {'path': path, 'query': query, 'status': status, 'headers': headers, 'body': body}
+
+        # write to a temporary file first, concurrent requests may record the same url
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(fixture, f)
+        os.replace(tmp, self.make_key(path, query))
+        return body
+
+    def record(self, path, query, status, headers, body):
+        """Save a response from Crossref. Retryable errors are not recorded."""
+        if status not in (200, 404):
+            return
+        body = self.save(path, query, status, headers, body)
+        if status == 200 and unquote(path) == '/works' and parse_doi_filter(query):
+            for item in body['message']['items']:
+                self.save(f"/works/{item['DOI']}", '', status, headers,
+                    json.dumps(self.wrap(item)).encode())
+
+    def wrap(self, message, message_type='work'):
+        return {'status': 'ok', 'message-type': message_type, 'message-version': '1.0.0', 'message': message}
+
+    def get_work(self, doi):
+        """Return the recorded (or synthesized) work message for doi, or None."""
+        found = self.load(f"/works/{doi}")
+        if found and found[0] == 200:
+            return json.loads(found[2])['message']
+        if not self.synthesize:
+            return None
+        if self._template is None:
+            self._template = self.find_template()
+        work = deepcopy(self._template)
+        work['DOI'] = doi
+        work.pop('URL', None)
+        return work
+
+    def find_template(self):
+        for name in sorted(os.listdir(self.path)):
+            if name.startswith('works-') and name.endswith('.json'):
+                with open(os.path.join(self.path, name)) as f:
+                    fixture = json.load(f)
+                if fixture['status'] == 200 and fixture['path'].lower().startswith('/works/'):
+                    return fixture['body']['message']
+        raise ImproperlyConfigured(f"No recorded work in {self.path} to synthesize works from")
+
+    def respond(self, path, query=''):
+        """Return the (status, headers, body) to answer a request with."""
+        found = self.load(path, query)
+        if found:
+            return found
+
+        path = unquote(path)
+        headers = {'Content-Type': 'application/json'}
+        if path.lower().startswith('/works/'):
+            work = self.get_work(path[len('/works/'):])
+            if work is not None:
+                return 200, headers, json.dumps(self.wrap(work)).encode()
+        elif path == '/works':
+            dois = parse_doi_filter(query)
+            if dois:
+                items = [work for work in map(self.get_work, dois) if work is not None]
+                message = {'items': items, 'total-results': len(items), 'items-per-page': len(items), 'query': {}}
+                return 200, headers, json.dumps(self.wrap(message, 'work-list')).encode()
+        return NOT_FOUND
+
+
+def make_response(request, status, headers, body):
+    response = Response()
+    response.status_code = status
+    response.reason = HTTPStatus(status).phrase
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class RecordingAdapter(HTTPAdapter):
+    """A requests transport adapter that saves each response to a `FixtureStore`."""
+
+    def __init__(self, store, **kwargs):
+        self.store = store
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        url = urlsplit(request.url)
+        self.store.record(url.path, url.query, response.status_code, response.headers, response.content)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """A requests transport adapter that answers from a `FixtureStore`
+    without touching the network."""
+
+    def __init__(self, store, latency=0):
+        self.store = store
+        self.latency = latency
+        super().__init__()
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(request.url)
+        return make_response(request, *self.store.respond(url.path, url.query))
+
+    def close(self):
+        pass
+
+
+if httpx is not None:
+
+    class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+        """Async version of `RecordingAdapter` for httpx."""
+
+        def __init__(self, store, **kwargs):
+            self.store = store
+            self.transport = httpx.AsyncHTTPTransport(**kwargs)
+
+        async def handle_async_request(self, request):
+            response = await self.transport.handle_async_request(request)
+            body = await response.aread()
+            await response.aclose()
+            self.store.record(request.url.path, request.url.query.decode(), response.status_code, response.headers, body)
+            return httpx.Response(response.status_code, headers=response.headers, content=body, request=request)
+
+        async def aclose(self):
+            await self.transport.aclose()
+
+    class AsyncReplayTransport(httpx.AsyncBaseTransport):
+        """Async version of `ReplayAdapter` for httpx."""
+
+        def __init__(self, store, latency=0):
+            self.store = store
+            self.latency = latency
+
+        async def handle_async_request(self, request):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            status, headers, body = self.store.respond(request.url.path, request.url.query.decode())
+            return httpx.Response(status, headers=headers, content=body, request=request)
+
+
+def get_adapter(max_connections=10):
+    """Return the requests transport adapter selected by `CROSSREF_TRANSPORT`."""
+    mode = settings.CROSSREF_TRANSPORT
+    if mode is None:
+        return HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+    store = FixtureStore(settings.CROSSREF_FIXTURE_DIR)
+    if mode == 'record':
+        return RecordingAdapter(store, pool_connections=1, pool_maxsize=max_connections)
+    if mode == 'replay':
+        return ReplayAdapter(store, settings.CROSSREF_REPLAY_LATENCY)
+    raise ImproperlyConfigured(f"Unknown CROSSREF_TRANSPORT: {mode}")
+
+
+def get_async_transport(limits=None):
+    """Return the httpx transport selected by `CROSSREF_TRANSPORT`."""
+    mode = settings.CROSSREF_TRANSPORT
+    if mode is None:
+        return httpx.AsyncHTTPTransport(limits=limits)
+    store = FixtureStore(settings.CROSSREF_FIXTURE_DIR)
+    if mode == 'record':
+        return AsyncRecordingTransport(store, limits=limits)
+    if mode == 'replay':
+        return AsyncReplayTransport(store, settings.CROSSREF_REPLAY_LATENCY)
+    raise ImproperlyConfigured(f"Unknown CROSSREF_TRANSPORT: {mode}")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(0, 2 * server.latency))
+        url = urlsplit(self.path)
+        status, headers, body = server.store.respond(url.path, url.query)
+        self.send_response(status)
+        for name, value in {**server.headers, **headers}.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """A local HTTP server that mimics the /works and /funders endpoints of
+    the Crossref API from a `FixtureStore`. Point `CROSSREF_BASE_URL` at it
+    to load test against a known, repeatable set of responses.
+
+    Each request waits a random time averaging `latency` seconds, and every
+    response advertises `rate_limit` requests per second like Crossref does.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, store, address=('127.0.0.1', 0), latency=0, rate_limit=50, verbose=False):
+        self.store = store
+        self.latency = latency
+        self.verbose = verbose
+        self.headers = {'X-Rate-Limit-Limit': str(rate_limit), 'X-Rate-Limit-Interval': '1s'}
+        super().__init__(address, StandInHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread, for use in tests."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
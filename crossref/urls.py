@@ -4,4 +4,5 @@ from django.urls import path
 app_name = 'crossref'
 urlpatterns = [
     path('', views.WorkList.as_view(), name='work_list'),
+    path('export/<str:format>/', views.WorkExport.as_view(), name='work_export'),
 ]
@@ -1,37 +1,256 @@
+from asgiref.sync import sync_to_async
 from crossref.conf import settings
 from django.apps import apps 
 from django.core.exceptions import ImproperlyConfigured
-from habanero import Crossref
 from crossref.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
+from django.utils import timezone
+from requests.exceptions import HTTPError, RequestException
+from .exceptions import UnresolvableDOI
+from functools import lru_cache
+from itertools import islice
+import hashlib
+import re
+import unicodedata
+
+DOI_PREFIX = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+DOI_PATTERN = re.compile(r'^10\.\d+(?:\.\d+)*/\S+$')
+ORCID_PATTERN = re.compile(r'(\d{4})-?(\d{4})-?(\d{4})-?(\d{3}[\dX])', re.IGNORECASE)
 
 def get_config():
     return apps.get_model('crossref.Settings').get_solo()
 
 
+def normalize_doi(doi):
+    """Strip any resolver prefix from doi and lower case it, as DOIs are case 
+    insensitive."""
+    return DOI_PREFIX.sub('', doi.strip()).lower()
+
+
+def normalize_orcid(orcid):
+    """Return the bare ORCID iD (e.g. 0000-0003-3762-7336) from an ORCID
+    given as an iD or a URL, or None if there isn't one."""
+    match = ORCID_PATTERN.search(orcid or '')
+    if match:
+        return '-'.join(match.groups()).upper()
+
+
+def normalize_name(name):
+    """Case fold name, strip accents and punctuation and collapse whitespace, 
+    so 'Müller,  J.' and 'muller j' compare equal."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[\W_]+', ' ', name.casefold()).split())
+
+
+def make_name_key(given, family):
+    """Return the normalized key authors are matched on, family name first 
+    so keys can be searched by prefix."""
+    return normalize_name(f"{family or ''} {given or ''}")
+
+
+def make_given_key(given, family):
+    """Return the normalized name given name first, so authors can also be 
+    searched by prefix of their given name."""
+    return normalize_name(f"{given or ''} {family or ''}")
+
+
+def make_work_fingerprint(title, family, year):
+    """Return a key identifying a work across sources: a hash of its 
+    normalized title, the family name of its first author and its year. 
+    Returns None without a title, or without both family name and year."""
+    title = normalize_name(title)
+    if not title or not (family or year):
+        return None
+    key = f"{title}|{normalize_name(family)}|{year or ''}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def chunked(iterable, size):
+    """Yield successive lists of at most size items from iterable."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@lru_cache()
+def get_work_selects():
+    """Return the Crossref fields used by `WorkForm` that Crossref allows in 
+    a `select` query."""
+    from .forms import WorkForm
+    from .fields import CROSSREF_WORK_SELECTS
+    return [name for name in CROSSREF_WORK_SELECTS if name.replace('-', '_') in WorkForm.base_fields]
+
+
+def get_crossref_client():
+    """Return the shared Crossref client for the current settings."""
+    from .client import registry
+    return registry.get()
+
+
+def get_cached_responses(dois, projected=False):
+    """Return {doi: (response, error)} for each doi that can be answered 
+    without querying Crossref, either from the response cache or because the 
+    DOI is malformed or recently failed to resolve. With projected, works 
+    cached by bulk lookups with only the fields `WorkForm` uses are 
+    returned too."""
+    from . import cache
+    found = {}
+    for doi in dois:
+        if not DOI_PATTERN.match(normalize_doi(doi)):
+            found[doi] = (None, f"{doi} is not a valid DOI")
+    caches = [cache.responses, cache.projected] if projected else [cache.responses]
+    remaining = [doi for doi in dois if doi not in found]
+    found.update((doi, (None, entry['message'])) for doi, entry in cache.unresolvable.get_many(remaining).items())
+    for responses in caches:
+        remaining = [doi for doi in remaining if doi not in found]
+        found.update((doi, (entry, None)) for doi, entry in responses.get_many(remaining).items())
+    return found
+
+
+def get_cached_response(doi):
+    """Return the cached response for doi or None if it needs to be fetched. 
+    Raises UnresolvableDOI for malformed DOIs and DOIs that recently failed to 
+    resolve."""
+    response, error = get_cached_responses([doi]).get(doi, (None, None))
+    if error is not None:
+        raise UnresolvableDOI(error)
+    return response
+
+
+def record_unresolvable(doi, error):
+    """Remember doi in the negative cache if Crossref rejected it and return 
+    the exception that should be raised."""
+    from .cache import unresolvable
+    if error.response is not None and error.response.status_code in (400, 404):
+        unresolvable.set(doi, str(error))
+        return UnresolvableDOI(str(error), response=error.response)
+    return error
+
+
+def fetch_work(client, doi):
+    """Query Crossref for doi and cache the outcome."""
+    from .cache import responses
+    try:
+        response = client.works(doi)
+    except HTTPError as e:
+        raise record_unresolvable(doi, e) from e
+    return responses.set(doi, response['message'])
+
+
+async def afetch_work(client, doi):
+    """Async version of `fetch_work`. The cache is written from a thread, as
+    cache backends such as the database are sync only."""
+    from .cache import responses
+    try:
+        response = await client.works(doi)
+    except HTTPError as e:
+        raise await sync_to_async(record_unresolvable)(doi, e) from e
+    return await sync_to_async(responses.set)(doi, response['message'])
+
+
+def split_filtered_works(dois, response):
+    """Split the response to a `doi:` filter query into {doi: (response, error)}, 
+    caching each work apart from full records, see `crossref.cache.projected`. 
+    Requested DOIs missing from the response are recorded as unresolvable."""
+    from .cache import projected, unresolvable
+    items = {}
+    for item in response['message']['items']:
+        items.setdefault(normalize_doi(item['DOI']), item)
+
+    found = {}
+    for doi in dois:
+        message = items.get(normalize_doi(doi))
+        if message is not None:
+            found[doi] = (projected.set(doi, message), None)
+        else:
+            error = f"{doi} was not found in Crossref"
+            unresolvable.set(doi, error)
+            found[doi] = (None, error)
+    return found
+
+
+def fetch_works(client, dois):
+    """Fetch several DOIs with a single filtered /works query, requesting only 
+    the fields used by `WorkForm`. Returns {doi: (response, error)}. DOIs 
+    containing a comma cannot be filtered on and are fetched one by one."""
+    found = {}
+    for doi in [doi for doi in dois if ',' in doi]:
+        try:
+            found[doi] = (fetch_work(client, doi), None)
+        except RequestException as e:
+            found[doi] = (None, str(e))
+
+    filterable = [doi for doi in dois if doi not in found]
+    if filterable:
+        try:
+            response = client.filter_works([('doi', doi) for doi in filterable], 
+                select=get_work_selects(), rows=len(filterable))
+        except RequestException as e:
+            found.update((doi, (None, str(e))) for doi in filterable)
+        else:
+            found.update(split_filtered_works(filterable, response))
+    return found
+
+
+async def afetch_works(client, dois):
+    """Async version of `fetch_works`."""
+    found = {}
+    for doi in [doi for doi in dois if ',' in doi]:
+        try:
+            found[doi] = (await afetch_work(client, doi), None)
+        except RequestException as e:
+            found[doi] = (None, str(e))
+
+    filterable = [doi for doi in dois if doi not in found]
+    if filterable:
+        try:
+            response = await client.filter_works([('doi', doi) for doi in filterable], 
+                select=get_work_selects(), rows=len(filterable))
+        except RequestException as e:
+            found.update((doi, (None, str(e))) for doi in filterable)
+        else:
+            found.update(await sync_to_async(split_filtered_works)(filterable, response))
+    return found
+
+
 def query_crossref_for_doi(doi, request=None):
     if not doi:
         return None
-    config = get_config().get_solo()
     if request is not None:
         site = get_current_site(request)
-    
-    cr = Crossref(
-            base_url = settings.CROSSREF_BASE_URL,
-            api_key = config.api_key,
-            mailto = settings.CROSSREF_MAILTO,
-            ua_string = config.ua_string,
-        )
-    
-    return cr.works(doi)
 
-def query_and_clean_crossref(doi, request=None):
+    cached = get_cached_response(doi)
+    if cached is not None:
+        return cached
+    return fetch_work(get_crossref_client(), doi)
+
+async def get_async_crossref_client():
+    """Return the shared async Crossref client for the running event loop."""
+    from .client import registry
+    return await registry.aget()
+
+
+async def aquery_crossref_for_doi(doi):
+    if not doi:
+        return None
+    cached = await sync_to_async(get_cached_response)(doi)
+    if cached is not None:
+        return cached
+    return await afetch_work(await get_async_crossref_client(), doi)
+
+
+def clean_crossref_response(response, label_allocator=None):
     from .forms import WorkForm
-    response = query_crossref_for_doi(doi, request)
     if response:
-        form = WorkForm(response['message'])
+        form = WorkForm(response['message'], label_allocator=label_allocator)
+        form.instance.last_queried_crossref = response.get('queried') or timezone.now()
         form.is_valid()
         return form
+
+
+def query_and_clean_crossref(doi, request=None):
+    return clean_crossref_response(query_crossref_for_doi(doi, request))
     
 
 def get_model(model_str, model):
@@ -1,7 +1,10 @@
-from django.views.generic import ListView
+from django.views.generic import ListView, View
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from django.core.paginator import InvalidPage
 from .paginators import YearPaginator
-from .utils import get_work_model
+from .utils import get_work_model, get_author_model
+from .export import FORMATS, export_response
 
 Work = get_work_model()
 
@@ -44,3 +47,24 @@ class WorksByYearMixin(ListView):
 
 class WorkList(WorksByYearMixin):
     model = Work
+
+
+class WorkExport(View):
+    """Streams all works, or those of the author given as ?author=<id>, in 
+    one of the export formats."""
+
+    def get(self, request, format):
+        if format not in FORMATS:
+            raise Http404(f"Unknown export format: {format}")
+        queryset = Work.objects.all()
+        context = {'url': request.build_absolute_uri()}
+        author = request.GET.get('author')
+        if author:
+            try:
+                author = int(author)
+            except (ValueError, TypeError):
+                raise Http404(f"Invalid author: {author}")
+            author = get_object_or_404(get_author_model(), pk=author)
+            queryset = queryset.filter(author=author)
+            context['author'] = author
+        return export_response(queryset, format, context=context)
@@ -26,6 +26,9 @@ setup(
         "django-sortedm2m", 
 
         ],
+    extras_require={
+        "async": ["httpx"],
+    },
     keywords='scientific django publications citations crossref',
     classifiers=[
         'Development Status :: 1 - Development',